@@ -0,0 +1,43 @@
+""" Measure per-hit cost of converting ES hits with `dict2obj`.
+
+Usage:
+    $ python benchmarks/dict2obj.py [number_of_hits]
+"""
+import sys
+import timeit
+
+from nefertari.utils import dict2obj
+
+
+def make_hit(n):
+    return {
+        '_type': 'Story',
+        '_pk': str(n),
+        'id': n,
+        'name': 'Story {}'.format(n),
+        'tags': ['foo', 'bar'],
+        'author': {'_type': 'User', '_pk': 'user1', 'username': 'user1'},
+        'comments': [
+            {'_type': 'Comment', '_pk': str(i), 'body': 'Comment'}
+            for i in range(3)],
+    }
+
+
+def main(argv=sys.argv):
+    hits_count = int(argv[1]) if len(argv) > 1 else 1000
+    hits = [make_hit(n) for n in range(hits_count)]
+    runs = 20
+    cases = [
+        ('dict2obj', lambda: [dict2obj(hit) for hit in hits]),
+        ('dict2obj + to_dict',
+         lambda: [dict2obj(hit).to_dict() for hit in hits]),
+    ]
+    for name, func in cases:
+        total = timeit.timeit(func, number=runs)
+        per_hit = total / (runs * hits_count) * 1e6
+        print('{}: {:.2f} us per hit ({} hits x {} runs)'.format(
+            name, per_hit, hits_count, runs))
+
+
+if __name__ == '__main__':
+    main()
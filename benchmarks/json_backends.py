@@ -0,0 +1,52 @@
+""" Compare rendering of a collection response with available JSON
+backends.
+
+Usage:
+    $ python benchmarks/json_backends.py [number_of_items]
+"""
+import sys
+import timeit
+from datetime import datetime
+
+from nefertari.renderers import JSON_BACKENDS, _JSONEncoder
+
+
+def make_response(items_count):
+    now = datetime.utcnow()
+    data = [{
+        '_type': 'Story',
+        '_pk': str(n),
+        '_self': 'http://localhost:6543/api/stories/{}'.format(n),
+        'id': n,
+        'name': 'Story {}'.format(n),
+        'created_at': now,
+        'tags': ['foo', 'bar'],
+        'author': {'_type': 'User', '_pk': 'user1', 'username': 'user1'},
+    } for n in range(items_count)]
+    return {
+        'data': data,
+        'count': items_count,
+        'total': items_count,
+        'start': 0,
+        'took': 3,
+    }
+
+
+def main(argv=sys.argv):
+    items_count = int(argv[1]) if len(argv) > 1 else 1000
+    response = make_response(items_count)
+    runs = 20
+    for name, backend in sorted(JSON_BACKENDS.items()):
+        try:
+            dumps = backend()
+        except ImportError:
+            print('{}: not installed'.format(name))
+            continue
+        total = timeit.timeit(
+            lambda: dumps(response, _JSONEncoder), number=runs)
+        print('{}: {:.2f} ms per response ({} items x {} runs)'.format(
+            name, total / runs * 1e3, items_count, runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,7 @@ RESERVED_PARAMS = [
     '_sort',
     '_search_fields',
     '_refresh_index',
+    '_cursor',
 ]
 
 
@@ -55,3 +56,6 @@ def includeme(config):
     Settings = dictset(config.registry.settings)
     root = config.get_root_resource()
     root.auth = Settings.asbool('auth')
+
+    if Settings.asbool('metrics.enabled'):
+        config.include('nefertari.metrics')
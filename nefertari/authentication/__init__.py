@@ -1,10 +1,14 @@
 def includeme(config):
-    """ Set up event subscribers. """
+    """ Set up event subscribers and users cache. """
+    from nefertari import events
+    from nefertari.utils import dictset
     from .models import (
         AuthUserMixin,
         random_uuid,
         lower_strip,
         encrypt_password,
+        auth_cache,
+        invalidate_auth_cache,
     )
     add_proc = config.add_field_processors
     add_proc(
@@ -12,3 +16,12 @@ def includeme(config):
         model=AuthUserMixin, field='username')
     add_proc([lower_strip], model=AuthUserMixin, field='email')
     add_proc([encrypt_password], model=AuthUserMixin, field='password')
+
+    settings = dictset(config.registry.settings)
+    auth_cache.ttl = settings.asfloat('auth_cache_ttl', 0)
+    auth_cache.max_size = settings.asint('auth_cache_size', 1000)
+    config.subscribe_to_events(
+        invalidate_auth_cache,
+        [events.AfterUpdate, events.AfterReplace, events.AfterDelete,
+         events.AfterUpdateMany, events.AfterDeleteMany],
+        model=AuthUserMixin)
@@ -5,12 +5,16 @@ import cryptacular.bcrypt
 from pyramid.security import authenticated_userid, forget
 
 from nefertari.json_httpexceptions import JHTTPBadRequest
-from nefertari import engine
-from nefertari.utils import dictset
+from nefertari import engine, metrics
+from nefertari.utils import dictset, TTLCache
 
 log = logging.getLogger(__name__)
 crypt = cryptacular.bcrypt.BCRYPTPasswordManager()
 
+# Cache of {username: (api key token, groups)} shared across requests.
+# Is disabled unless `auth_cache_ttl` setting is set.
+auth_cache = TTLCache(max_size=1000, ttl=0)
+
 
 class AuthModelMethodsMixin(object):
     """ Mixin that implements all methods required for Ticket and Token
@@ -38,6 +42,25 @@ class AuthModelMethodsMixin(object):
         """
         return 'admin' in user.groups
 
+    @classmethod
+    def get_auth_credentials(cls, username, request):
+        """ Get tuple of (api key token, groups) of user with username
+        of :username:
+
+        Credentials are cached across requests in `auth_cache`.
+        Returns None if user does not exist.
+        """
+        credentials = auth_cache.get(username)
+        metrics.inc('auth_lookups_total',
+                    cache='miss' if credentials is None else 'hit')
+        if credentials is None:
+            user = get_request_user_by_name(cls, request, username)
+            if not user:
+                return None
+            credentials = (user.api_key.token, user.groups)
+            auth_cache.set(username, credentials)
+        return credentials
+
     @classmethod
     def get_token_credentials(cls, username, request):
         """ Get api token for user with username of :username:
@@ -45,13 +68,13 @@ class AuthModelMethodsMixin(object):
         Used by Token-based auth as `credentials_callback` kwarg.
         """
         try:
-            user = cls.get_item(username=username)
+            credentials = cls.get_auth_credentials(username, request)
         except Exception as ex:
             log.error(str(ex))
             forget(request)
         else:
-            if user:
-                return user.api_key.token
+            if credentials:
+                return credentials[0]
 
     @classmethod
     def get_groups_by_token(cls, username, token, request):
@@ -61,14 +84,14 @@ class AuthModelMethodsMixin(object):
         Used by Token-based authentication as `check` kwarg.
         """
         try:
-            user = cls.get_item(username=username)
+            credentials = cls.get_auth_credentials(username, request)
         except Exception as ex:
             log.error(str(ex))
             forget(request)
             return
         else:
-            if user and user.api_key.token == token:
-                return ['g:%s' % g for g in user.groups]
+            if credentials and credentials[0] == token:
+                return ['g:%s' % g for g in credentials[1]]
 
     @classmethod
     def authenticate_by_password(cls, params):
@@ -145,7 +168,7 @@ class AuthModelMethodsMixin(object):
         """
         username = authenticated_userid(request)
         if username:
-            return cls.get_item(username=username)
+            return get_request_user_by_name(cls, request, username)
 
 
 def lower_strip(**kwargs):
@@ -235,6 +258,7 @@ def create_apikey_model(user_model):
 
         def reset_token(self):
             self.update({'token': create_apikey_token()})
+            auth_cache.delete(self.user.username)
             return self.token
 
     # Setup ApiKey autogeneration on :user_model: creation
@@ -258,3 +282,32 @@ def cache_request_user(user_cls, request, user_id):
     user = getattr(request, '_user', None)
     if user is None or getattr(user, pk_field, None) != user_id:
         request._user = user_cls.get_item(**{pk_field: user_id})
+
+
+def get_request_user_by_name(user_cls, request, username):
+    """ Helper function to get and cache user by username.
+
+    User is cached at `request._user`, so it is queried only once per
+    request.
+
+    :param user_cls: User model class to use for user lookup.
+    :param request: Pyramid Request instance.
+    :param username: Username of user.
+    """
+    user = getattr(request, '_user', None)
+    if user is None or getattr(user, 'username', None) != username:
+        user = user_cls.get_item(username=username)
+        request._user = user
+    return user
+
+
+def invalidate_auth_cache(event):
+    """ Drop credentials of changed users from `auth_cache`.
+
+    Is subscribed to user update and delete events.
+    """
+    username = getattr(event.instance, 'username', None)
+    if username is None or 'username' in (event.fields or {}):
+        auth_cache.clear()
+    else:
+        auth_cache.delete(username)
@@ -0,0 +1,165 @@
+import copy
+import json
+import atexit
+import logging
+import threading
+
+from six.moves import queue
+
+from nefertari import metrics
+from nefertari.utils import FieldData, json_dumps
+
+
+log = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    if value is None:
+        return None
+    return json.loads(json_dumps(value))
+
+
+def freeze_event(event):
+    """ Make snapshot of :event: which is safe to use off request thread.
+
+    Snapshot is a copy of event which `instance`, `response`, fields'
+    values and affected `objects` of batch events are converted to their
+    JSON representation. Its `view` is None, as view and request must
+    not be used after request is processed. Affected objects are only
+    included if they were loaded while processing request, otherwise
+    snapshot `objects` is None.
+    """
+    snapshot = copy.copy(event)
+    snapshot._deferred_snapshot = None
+    if hasattr(type(event), 'objects'):
+        objects = event._objects
+        if objects is None and event.view is not None:
+            objects = event.view._affected_objects
+        snapshot.objects = _freeze(objects)
+    snapshot.view = None
+    snapshot.field = None
+    snapshot.instance = _freeze(event.instance)
+    snapshot.response = _freeze(event.response)
+    fields = dict(
+        (name, _freeze(field.new_value))
+        for name, field in (event.fields or {}).items())
+    snapshot.fields = FieldData.from_dict(fields, event.model)
+    return snapshot
+
+
+class DeferredSubscribersPool(object):
+    """ Bounded pool of threads which run deferred event subscribers.
+
+    Subscribers are queued with snapshots of events they are called
+    with. When `queue_size` subscribers are queued, subscribers are
+    called synchronously. Workers are started when first subscriber is
+    queued. Queue depth, overflows and subscribers failures are recorded
+    as metrics.
+    """
+    def __init__(self, workers=2, queue_size=1000):
+        """
+        :param workers: Number of worker threads.
+        :param queue_size: Max number of queued subscribers.
+        """
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.stop)
+
+    def stop(self):
+        """ Run queued subscribers and stop worker threads. """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def join(self):
+        """ Block until all queued subscribers are called. """
+        self._queue.join()
+
+    def submit(self, subscriber, event):
+        """ Queue call of :subscriber: with :event: snapshot. """
+        if not self._threads:
+            self.start()
+        try:
+            self._queue.put_nowait((subscriber, event))
+        except queue.Full:
+            metrics.inc('deferred_queue_overflows_total')
+            log.warning('Deferred subscribers queue is full, calling %s '
+                        'synchronously', subscriber)
+            self._call(subscriber, event)
+        metrics.set_gauge('deferred_queue_depth', len(self))
+
+    def _call(self, subscriber, event):
+        try:
+            subscriber(event)
+        except Exception:
+            metrics.inc('deferred_subscriber_calls_total', result='failure')
+            log.exception('Deferred subscriber %s failed', subscriber)
+        else:
+            metrics.inc('deferred_subscriber_calls_total', result='success')
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                self._call(*task)
+            finally:
+                self._queue.task_done()
+                metrics.set_gauge('deferred_queue_depth', len(self))
+
+
+def get_deferred_pool(registry):
+    """ Get pool of deferred subscribers of :registry:.
+
+    Pool is configured with `events.deferred_workers` and
+    `events.deferred_queue_size` settings.
+    """
+    pool = getattr(registry, '_deferred_pool', None)
+    if pool is None:
+        settings = registry.settings or {}
+        pool = registry._deferred_pool = DeferredSubscribersPool(
+            workers=int(settings.get('events.deferred_workers', 2)),
+            queue_size=int(settings.get('events.deferred_queue_size', 1000)))
+    return pool
+
+
+def get_event_snapshot(event):
+    """ Get snapshot of :event: shared by all its deferred subscribers.
+
+    Event is frozen once, when its first deferred subscriber is
+    notified, so subscribers must not modify the snapshot.
+    """
+    snapshot = getattr(event, '_deferred_snapshot', None)
+    if snapshot is None:
+        snapshot = event._deferred_snapshot = freeze_event(event)
+    return snapshot
+
+
+def defer_subscriber(registry, subscriber):
+    """ Wrap :subscriber: to be called by pool of deferred subscribers. """
+    pool = get_deferred_pool(registry)
+
+    def deferred_subscriber(event):
+        pool.submit(subscriber, get_event_snapshot(event))
+
+    deferred_subscriber.subscriber = subscriber
+    return deferred_subscriber
@@ -1,18 +1,27 @@
 from __future__ import absolute_import
+import io
+import os
+import re
+import gzip
 import json
+import time
+import base64
 import logging
+import threading
 from functools import partial
 from collections import defaultdict
 
 import elasticsearch
 from elasticsearch import helpers
 import six
+from six.moves import queue
 
 from nefertari.utils import (
     dictset, dict2obj, process_limit, split_strip, to_dicts)
 from nefertari.json_httpexceptions import (
     JHTTPBadRequest, JHTTPNotFound, exception_response)
-from nefertari import engine, RESERVED_PARAMS
+from nefertari import engine, metrics, RESERVED_PARAMS
+from nefertari.timing import timed
 
 log = logging.getLogger(__name__)
 
@@ -21,13 +30,91 @@ class IndexNotFoundException(Exception):
     pass
 
 
+class _TruncatedRepr(object):
+    """ Lazy string representation of :value: truncated to 512 chars.
+
+    Is passed to logging calls so :value: is only formatted if message
+    is actually emitted.
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        msg = str(self.value)
+        if len(msg) > 512:
+            msg = msg[:300] + '...TRUNCATED...' + msg[-212:]
+        return msg
+
+
+class _RequestCall(object):
+    """ Arguments of `ESHttpConnection.perform_request` call. """
+    def __init__(self, args, kw):
+        names = ('method', 'url', 'params', 'body')
+        values = dict(zip(names, args))
+        values.update(kw)
+        self.method = values.get('method')
+        self.url = values.get('url')
+        self.params = values.get('params')
+        self.body = values.get('body')
+
+
+# "errors" key follows "took" at the beginning of bulk API responses
+_BULK_ERRORS = re.compile(r'"errors"\s*:\s*true')
+
+
+def _gzip(data):
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as compressed:
+        compressed.write(data)
+    return buf.getvalue()
+
+
 class ESHttpConnection(elasticsearch.Urllib3HttpConnection):
+    def __init__(self, *args, **kwargs):
+        """ Accepts all params of `Urllib3HttpConnection` and:
+
+        :param http_compress: Boolean indicating whether request bodies
+            should be gzip-compressed and compressed responses accepted.
+        :param pool_block: Boolean indicating whether threads should
+            wait for a free connection when all `maxsize` connections
+            of pool are in use, instead of opening extra connections
+            which are discarded after use.
+        """
+        self.http_compress = kwargs.pop('http_compress', False)
+        pool_block = kwargs.pop('pool_block', False)
+        super(ESHttpConnection, self).__init__(*args, **kwargs)
+        self.pool.block = pool_block
+        if self.http_compress:
+            self.headers['accept-encoding'] = 'gzip,deflate'
+            self.headers['content-encoding'] = 'gzip'
+
+    def get_pool_stats(self):
+        """ Get utilization stats of connections pool. """
+        pool = self.pool
+        # Queue of idle connections, `None` once pool is closed
+        idle_queue = pool.pool
+        maxsize = idle_queue.maxsize if idle_queue is not None else 0
+        idle = idle_queue.qsize() if idle_queue is not None else 0
+        return {
+            'host': self.host,
+            'maxsize': maxsize,
+            'in_use': maxsize - idle,
+            'connections_created': pool.num_connections,
+            'requests': pool.num_requests,
+        }
+
     def _catch_index_error(self, response):
         """ Catch and raise index errors which are not critical and thus
         not raised by elasticsearch-py.
+
+        Only called for bulk API responses. Response is parsed only if
+        its beginning reports errors, so successful responses are not
+        parsed here in addition to parsing by elasticsearch-py.
         """
         code, headers, raw_data = response
-        if not raw_data:
+        if not raw_data or not _BULK_ERRORS.search(raw_data[:256]):
             return
         data = json.loads(raw_data)
         if not data or not data.get('errors'):
@@ -40,13 +127,20 @@ class ESHttpConnection(elasticsearch.Urllib3HttpConnection):
         raise exception_response(400, detail=message)
 
     def perform_request(self, *args, **kw):
+        tracer = ES.tracer
+        if tracer is not None:
+            call = _RequestCall(args, kw)
+        if self.http_compress:
+            args, kw = self._compress_body(args, kw)
+        start = time.time()
+        status_code = None
         try:
-            if log.level == logging.DEBUG:
-                msg = str(args)
-                if len(msg) > 512:
-                    msg = msg[:300] + '...TRUNCATED...' + msg[-212:]
-                log.debug(msg)
-            resp = super(ESHttpConnection, self).perform_request(*args, **kw)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('%s', _TruncatedRepr(args))
+            with timed('es'):
+                resp = super(ESHttpConnection, self).perform_request(
+                    *args, **kw)
+            status_code = resp[0]
         except Exception as e:
             log.error(e.error)
             status_code = e.status_code
@@ -59,19 +153,55 @@ class ESHttpConnection(elasticsearch.Urllib3HttpConnection):
                 explanation=six.b(e.error),
                 extra=dict(data=e))
         else:
-            self._catch_index_error(resp)
+            if self._is_bulk_request(*args, **kw):
+                self._catch_index_error(resp)
             return resp
+        finally:
+            if tracer is not None:
+                tracer.record(
+                    call.method, call.url, call.params, call.body,
+                    time.time() - start, status_code)
+
+    @staticmethod
+    def _is_bulk_request(method, url, *args, **kwargs):
+        return url.rstrip('/').endswith('_bulk')
+
+    @staticmethod
+    def _compress_body(args, kw):
+        """ Compress `body` from `perform_request` :args: or :kw:. """
+        # body is the fourth positional argument of perform_request
+        if len(args) > 3:
+            if args[3]:
+                args = args[:3] + (_gzip(args[3]),) + args[4:]
+        elif kw.get('body'):
+            kw = dict(kw, body=_gzip(kw['body']))
+        return args, kw
 
 
 def includeme(config):
     Settings = dictset(config.registry.settings)
     ES.setup(Settings)
     ES.create_index()
+    metrics.add_collector(ES.publish_pool_stats)
+    if ES.settings.asbool('async_indexing'):
+        ES.setup_index_queue()
+    if ES.settings.get('cache_backend'):
+        ES.setup_search_cache()
+    if ES.settings.get('slow_request_threshold'):
+        ES.setup_tracer()
+        config.include('nefertari.tracing')
 
     if ES.settings.asbool('enable_polymorphic_query'):
         config.include('nefertari.polymorphic')
 
 
+def _refresh_requested(request):
+    """ Determine whether :request: asks for ES index refresh. """
+    if request is None or not ES.settings.asbool('enable_refresh_query'):
+        return False
+    return '_refresh_index' in request.params
+
+
 def _bulk_body(documents_actions, request):
     kwargs = {
         'client': ES.api,
@@ -86,15 +216,39 @@ def _bulk_body(documents_actions, request):
     refresh_enabled = ES.settings.asbool('enable_refresh_query')
     if '_refresh_index' in query_params and refresh_enabled:
         kwargs['refresh'] = query_params.asbool('_refresh_index')
-
-    executed_num, errors = helpers.bulk(**kwargs)
-    log.info('Successfully executed {} Elasticsearch action(s)'.format(
-        executed_num))
+    if 'bulk_timeout' in ES.settings:
+        kwargs['request_timeout'] = ES.settings.asfloat('bulk_timeout')
+
+    metrics.inc('es_bulk_requests_total')
+    metrics.observe('es_bulk_actions', len(documents_actions))
+    try:
+        with metrics.timer('es_bulk_duration_seconds'):
+            executed_num, errors = helpers.bulk(**kwargs)
+    except Exception:
+        metrics.inc('es_bulk_errors_total')
+        raise
+    finally:
+        if ES.search_cache is not None:
+            _invalidate_search_cache(documents_actions)
+        ES.publish_pool_stats()
+    log.info('Successfully executed %s Elasticsearch action(s)',
+             executed_num)
     if errors:
         raise Exception('Errors happened when executing Elasticsearch '
                         'actions'.format('; '.join(errors)))
 
 
+def _invalidate_search_cache(documents_actions):
+    """ Invalidate cached search responses of doc types :documents_actions:
+    were performed on.
+    """
+    doc_types = defaultdict(set)
+    for action in documents_actions:
+        doc_types[action['_index']].add(action['_type'])
+    for index_name, types in doc_types.items():
+        ES.search_cache.invalidate(index_name, types)
+
+
 def process_fields_param(fields):
     """ Process 'fields' ES param.
 
@@ -129,6 +283,29 @@ def apply_sort(_sort):
     return ','.join(_sort_param)
 
 
+def encode_cursor(sort_values):
+    """ Encode hit `sort_values` into an opaque pagination cursor. """
+    data = json.dumps(sort_values).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """ Decode pagination `cursor` into `search_after` sort values.
+
+    Empty cursor means first page and is decoded into None.
+    """
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(str(cursor))
+        sort_values = json.loads(data.decode('utf-8'))
+    except (TypeError, ValueError):
+        raise JHTTPBadRequest('Bad _cursor param')
+    if not isinstance(sort_values, list):
+        raise JHTTPBadRequest('Bad _cursor param')
+    return sort_values
+
+
 def build_terms(name, values, operator='OR'):
     return (' %s ' % operator).join(['%s:%s' % (name, v) for v in values])
 
@@ -155,6 +332,184 @@ def build_qs(params, _raw_terms='', operator='AND'):
     return _terms
 
 
+_EXACT_VALUE = re.compile(r'^(-?\d+(\.\d+)?|true|false)$')
+_WORD_VALUE = re.compile(r'^[\w.@-]+$', re.UNICODE)
+_RANGE_VALUE = re.compile(r'^([\[{])\s*(\S+)\s+TO\s+(\S+)\s*([\]}])$')
+_NEGATED_VALUE = re.compile(r'^\(!(.+)\)$')
+
+
+def _value_filter(name, value):
+    """ Build a non-scoring filter clause which matches field `name`
+    against single query param `value`.
+
+    Numbers and booleans are matched with `term`, Lucene ranges are
+    converted to `range` and single words are matched with `match` so
+    they are analyzed the same way `query_string` analyzes them.
+    Returns None if value has to be parsed by `query_string`.
+    """
+    value = six.text_type(value).strip()
+    if _EXACT_VALUE.match(value):
+        return {'term': {name: value}}
+    match = _RANGE_VALUE.match(value)
+    if match:
+        start_bracket, start, end, end_bracket = match.groups()
+        bounds = {}
+        if start != '*':
+            bounds['gte' if start_bracket == '[' else 'gt'] = start
+        if end != '*':
+            bounds['lte' if end_bracket == ']' else 'lt'] = end
+        return {'range': {name: bounds}}
+    if _WORD_VALUE.match(value):
+        return {'match': {name: value}}
+    return None
+
+
+def build_query(params, _raw_terms=''):
+    """ Compile query `params` into a `bool` query.
+
+    Field params become `filter` (or `must_not` for negated `(!value)`
+    values) clauses, which are not scored and are cached by ES.
+    Values that can't be expressed with `term`, `terms`, `range` or
+    `match` queries are filtered with `query_string` as before.
+    `_raw_terms` (the `q` param) is used as scoring `query_string`
+    clause.
+    """
+    # if param is _all then remove it
+    params.pop_by_values('_all')
+
+    filters = []
+    must_not = []
+    for name, value in sorted(params.items()):
+        if name.startswith('__'):
+            continue
+        if isinstance(value, list):
+            if all(_EXACT_VALUE.match(six.text_type(v)) for v in value):
+                filters.append({'terms': {
+                    name: [six.text_type(v) for v in value]}})
+                continue
+            clauses = [_value_filter(name, v) for v in value]
+            if all(clauses):
+                filters.append({'bool': {
+                    'should': clauses, 'minimum_should_match': 1}})
+            else:
+                filters.append({'query_string': {
+                    'query': build_terms(name, value)}})
+            continue
+
+        negated = _NEGATED_VALUE.match(six.text_type(value).strip())
+        clause = _value_filter(name, negated.group(1) if negated else value)
+        if clause is None:
+            filters.append({'query_string': {
+                'query': '%s:%s' % (name, value)}})
+        elif negated:
+            must_not.append(clause)
+        else:
+            filters.append(clause)
+
+    if not (filters or must_not or _raw_terms):
+        return {'match_all': {}}
+
+    query = {}
+    if filters:
+        query['filter'] = filters
+    if must_not:
+        query['must_not'] = must_not
+    if _raw_terms:
+        query['must'] = [{'query_string': {'query': _raw_terms}}]
+    return {'bool': query}
+
+
+class _BulkBatch(object):
+    """ Chunks of one `process_chunks_parallel` call. """
+    def __init__(self, operation):
+        self.operation = operation
+        self.errors = []
+        self._pending = 0
+        self._done = threading.Condition()
+
+    def add(self):
+        with self._done:
+            self._pending += 1
+
+    def run(self, number, bulk):
+        try:
+            self.operation(documents_actions=bulk)
+        except Exception as ex:
+            log.error('Elasticsearch bulk chunk #{} ({} actions) '
+                      'failed: {}'.format(number, len(bulk), ex))
+            self.errors.append(ex)
+        finally:
+            with self._done:
+                self._pending -= 1
+                if not self._pending:
+                    self._done.notify_all()
+
+    def wait(self):
+        """ Block until all added chunks are processed. """
+        with self._done:
+            while self._pending:
+                self._done.wait()
+
+
+class _BulkWorkers(object):
+    """ Pool of threads which process bulk chunks.
+
+    Threads are started once per process and are shared by all calls
+    of `ES.process_chunks_parallel` with the same number of workers and
+    queue size. Threads are started again in forked processes, which
+    don't inherit threads of their parent.
+    """
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._tasks = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        # ID of process which started the threads
+        self._pid = None
+
+    def submit(self, batch, number, bulk):
+        """ Queue :bulk: chunk of :batch:. Blocks while queue is full. """
+        if self._pid != os.getpid():
+            self.start()
+        batch.add()
+        self._tasks.put((batch, number, bulk))
+
+    def start(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Threads and queued chunks of parent process are gone
+                self._tasks = queue.Queue(maxsize=self.queue_size)
+                self._threads = []
+            self._pid = pid
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            batch, number, bulk = self._tasks.get()
+            batch.run(number, bulk)
+
+
+_bulk_workers = {}
+_bulk_workers_lock = threading.Lock()
+
+
+def _get_bulk_workers(workers, queue_size):
+    """ Get shared pool of :workers: threads with queue of :queue_size:. """
+    key = (workers, queue_size)
+    with _bulk_workers_lock:
+        if key not in _bulk_workers:
+            _bulk_workers[key] = _BulkWorkers(workers, queue_size)
+        return _bulk_workers[key]
+
+
 class _ESDocs(list):
     def __init__(self, *args, **kw):
         self._total = 0
@@ -165,6 +520,9 @@ class _ESDocs(list):
 class ES(object):
     api = None
     settings = None
+    index_queue = None
+    search_cache = None
+    tracer = None
 
     @classmethod
     def src2type(cls, source):
@@ -175,6 +533,7 @@ class ES(object):
     def setup(cls, settings):
         cls.settings = settings.mget('elasticsearch')
         cls.settings.setdefault('chunk_size', 500)
+        cls.settings.setdefault('bulk_workers', 1)
 
         try:
             _hosts = cls.settings.hosts
@@ -189,6 +548,7 @@ class ES(object):
                     sniff_on_start=True,
                     sniff_on_connection_fail=True
                 )
+            params.update(cls._get_transport_params())
 
             cls.api = elasticsearch.Elasticsearch(
                 hosts=hosts, serializer=engine.ESJSONSerializer(),
@@ -199,12 +559,159 @@ class ES(object):
             raise Exception(
                 'Bad or missing settings for elasticsearch. %s' % e)
 
-    def __init__(self, source='', index_name=None, chunk_size=None):
+    @classmethod
+    def _get_transport_params(cls):
+        """ Get params of ES transport and connections from settings.
+
+        Only params present in settings are returned, so library
+        defaults are used for the rest. Supported settings are:
+            * maxsize: Max number of connections kept per host.
+            * pool_block: Wait for free connection when all connections
+              are in use instead of opening throwaway ones.
+            * timeout: Default request timeout in seconds.
+            * http_compress: Gzip request bodies and accept gzipped
+              responses.
+            * max_retries, retry_on_timeout, retry_on_status: Retries
+              policy. `retry_on_status` is a list of HTTP status codes.
+            * dead_timeout, timeout_cutoff: Backoff of failed nodes.
+            * sniffer_timeout, sniff_timeout: Sniffing intervals.
+        """
+        settings = cls.settings
+        converters = {
+            'maxsize': settings.asint,
+            'pool_block': settings.asbool,
+            'timeout': settings.asfloat,
+            'http_compress': settings.asbool,
+            'max_retries': settings.asint,
+            'retry_on_timeout': settings.asbool,
+            'retry_on_status': settings.aslist,
+            'dead_timeout': settings.asfloat,
+            'timeout_cutoff': settings.asint,
+            'sniffer_timeout': settings.asfloat,
+            'sniff_timeout': settings.asfloat,
+        }
+        params = {}
+        for name, converter in converters.items():
+            if name in settings:
+                params[name] = converter(name)
+        if 'retry_on_status' in params:
+            params['retry_on_status'] = tuple(
+                int(code) for code in params['retry_on_status'])
+        return params
+
+    @classmethod
+    def get_pool_stats(cls):
+        """ Get utilization stats of connection pools of all ES nodes.
+
+        Returns a list of dicts with `host`, `maxsize`, `in_use`,
+        `connections_created` and `requests` keys. `dead` key
+        holds number of nodes marked as dead.
+        """
+        connection_pool = cls.api.transport.connection_pool
+        connections = [
+            conn.get_pool_stats() for conn in connection_pool.connections
+            if hasattr(conn, 'get_pool_stats')]
+        dead = getattr(connection_pool, 'dead', None)
+        return {
+            'connections': connections,
+            'dead': dead.qsize() if dead is not None else 0,
+        }
+
+    @classmethod
+    def publish_pool_stats(cls):
+        """ Record stats of `get_pool_stats` as metrics gauges.
+
+        Called after each bulk request and when metrics are exposed.
+        """
+        if not metrics.registry.enabled or cls.api is None:
+            return
+        stats = cls.get_pool_stats()
+        for conn in stats['connections']:
+            for key in ('maxsize', 'in_use', 'connections_created',
+                        'requests'):
+                metrics.set_gauge(
+                    'es_pool_' + key, conn[key], host=conn['host'])
+        metrics.set_gauge('es_dead_nodes', stats['dead'])
+
+    @classmethod
+    def setup_index_queue(cls):
+        """ Setup queue to perform ES writes in background.
+
+        Writes of requests that ask for index refresh are still performed
+        synchronously after all queued actions are flushed. Queue is
+        started by the first write of each process.
+        """
+        from nefertari.indexing_queue import IndexingQueue
+        cls.index_queue = IndexingQueue(
+            operation=cls._flush_queued_actions,
+            flush_size=cls.settings.asint('async_flush_size', 500),
+            flush_interval=cls.settings.asfloat('async_flush_interval', 1),
+            journal_path=cls.settings.get('async_journal'))
+        log.info('Elasticsearch writes are queued')
+
+    @classmethod
+    def setup_search_cache(cls):
+        """ Setup cache of search responses.
+
+        Backend is chosen by `elasticsearch.cache_backend` setting, which
+        is either 'memory' or 'redis'. Entries live for
+        `elasticsearch.cache_ttl` seconds. Memory backend holds up to
+        `elasticsearch.cache_size` entries and is only suitable for
+        single-process servers. Redis backend connects to
+        `elasticsearch.cache_redis_url`. Responses are not cached for
+        `elasticsearch.cache_refresh_interval` seconds (defaults to 1,
+        same as default ES index refresh interval) after doc types are
+        written to.
+        """
+        from nefertari.search_cache import SearchCache, get_cache_backend
+        backend = get_cache_backend(cls.settings['cache_backend'],
+                                    cls.settings)
+        cls.search_cache = SearchCache(
+            backend, refresh_interval=cls.settings.asfloat(
+                'cache_refresh_interval', 1))
+        if cls.settings['cache_backend'] == 'memory':
+            log.warning('`memory` search cache backend is not shared '
+                        'between processes. Use `redis` backend when '
+                        'running multiple worker processes')
+        log.info('Elasticsearch search responses are cached using '
+                 '`{}` backend'.format(cls.settings['cache_backend']))
+
+    @classmethod
+    def setup_tracer(cls):
+        """ Setup tracing of slow ES requests.
+
+        Requests which take at least `elasticsearch.slow_request_threshold`
+        seconds are kept in a buffer of last
+        `elasticsearch.slow_request_buffer` slow requests. Bodies of
+        `elasticsearch.slow_request_sample_rate` fraction of them are
+        captured, truncated to `elasticsearch.slow_request_body_size`
+        characters. See `nefertari.tracing`.
+        """
+        from nefertari.tracing import ESRequestTracer
+        cls.tracer = ESRequestTracer(
+            slow_threshold=cls.settings.asfloat('slow_request_threshold'),
+            buffer_size=cls.settings.asint('slow_request_buffer', 100),
+            sample_rate=cls.settings.asfloat('slow_request_sample_rate', 0),
+            max_body_size=cls.settings.asint('slow_request_body_size', 2048))
+        log.info('Tracing Elasticsearch requests slower than %s seconds',
+                 cls.tracer.slow_threshold)
+
+    @classmethod
+    def _flush_queued_actions(cls, actions):
+        operation = partial(_bulk_body, request=None)
+        cls().process_chunks(documents=actions, operation=operation)
+
+    def __init__(self, source='', index_name=None, chunk_size=None,
+                 bulk_workers=None):
         self.doc_type = self.src2type(source)
         self.index_name = index_name or self.settings.index_name
         if chunk_size is None:
             chunk_size = self.settings.asint('chunk_size')
         self.chunk_size = chunk_size
+        if bulk_workers is None:
+            bulk_workers = (self.settings or dictset()).asint(
+                'bulk_workers', 1)
+        self.bulk_workers = bulk_workers
 
     @classmethod
     def create_index(cls, index_name=None):
@@ -260,7 +767,18 @@ class ES(object):
         """ Apply `operation` to chunks of `documents` of size
         `self.chunk_size`.
 
+        If `self.bulk_workers` is greater than 1 and there is more than
+        one chunk, chunks are processed in parallel. See
+        `process_chunks_parallel`.
         """
+        chunks = self._split_chunks(documents)
+        if self.bulk_workers > 1 and len(documents) > self.chunk_size:
+            return self.process_chunks_parallel(chunks, operation)
+        for bulk in chunks:
+            operation(documents_actions=bulk)
+
+    def _split_chunks(self, documents):
+        """ Generate chunks of `documents` of size `self.chunk_size`. """
         chunk_size = self.chunk_size
         start = end = 0
         count = len(documents)
@@ -270,12 +788,34 @@ class ES(object):
                 chunk_size = count
             end += chunk_size
 
-            bulk = documents[start:end]
-            operation(documents_actions=bulk)
+            yield documents[start:end]
 
             start += chunk_size
             count -= chunk_size
 
+    def process_chunks_parallel(self, chunks, operation):
+        """ Apply `operation` to `chunks` using a pool of worker threads.
+
+        Number of threads is `self.bulk_workers`. Threads are shared by
+        all calls and are started by the first one. Chunks are passed to
+        workers through a queue of size `elasticsearch.bulk_queue_size`
+        (defaults to twice the number of workers), so chunks are not
+        produced faster than they are sent to ES. Errors are logged per
+        chunk and the first one is raised after all chunks are processed.
+        """
+        queue_size = self.settings.asint(
+            'bulk_queue_size', self.bulk_workers * 2)
+        workers = _get_bulk_workers(self.bulk_workers, queue_size)
+        batch = _BulkBatch(operation)
+        try:
+            for number, bulk in enumerate(chunks):
+                workers.submit(batch, number, bulk)
+        finally:
+            batch.wait()
+
+        if batch.errors:
+            raise batch.errors[0]
+
     def prep_bulk_documents(self, action, documents):
         if not isinstance(documents, list):
             documents = [documents]
@@ -306,12 +846,17 @@ class ES(object):
 
     def _bulk(self, action, documents, request=None):
         if not documents:
-            log.debug('Empty documents: %s' % self.doc_type)
+            log.debug('Empty documents: %s', self.doc_type)
             return
 
         documents_actions = self.prep_bulk_documents(action, documents)
 
         if documents_actions:
+            if self.index_queue is not None:
+                if not _refresh_requested(request):
+                    self.index_queue.put(documents_actions)
+                    return
+                self.index_queue.flush()
             operation = partial(_bulk_body, request=request)
             self.process_chunks(
                 documents=documents_actions,
@@ -364,6 +909,7 @@ class ES(object):
         documents = [{'_pk': _id, '_type': self.doc_type} for _id in ids]
         self._bulk('delete', documents, request=request)
 
+    @metrics.timed('es_query_duration_seconds', method='get_by_ids')
     def get_by_ids(self, ids, **params):
         if not ids:
             return _ESDocs()
@@ -440,29 +986,37 @@ class ES(object):
         _raw_terms = params.pop('q', '')
 
         if 'body' not in params:
-            query_string = build_qs(params.remove(RESERVED_PARAMS), _raw_terms)
-            if query_string:
-                _params['body'] = {
-                    'query': {
-                        'query_string': {
-                            'query': query_string
-                        }
-                    }
-                }
-            else:
-                _params['body'] = {"query": {"match_all": {}}}
+            _params['body'] = {
+                'query': build_query(
+                    params.remove(RESERVED_PARAMS), _raw_terms)
+            }
         else:
             _params['body'] = params['body']
 
-        if '_limit' not in params:
-            params['_limit'] = self.api.count()['count']
-
-        _params['from_'], _params['size'] = process_limit(
-            params.get('_start', None),
-            params.get('_page', None),
-            params['_limit'])
-
-        if '_sort' in params:
+        # Cursor pagination uses `search_after` with `_uid` as a sort
+        # tiebreaker, so `from_` is always 0.
+        # Without `_limit` query is unbounded: `size` is not set and
+        # results are read with the scroll API. Scroll always starts at
+        # the first hit, so `_start` and `_page` require `_limit`.
+        if '_cursor' in params:
+            search_after = decode_cursor(params['_cursor'])
+            if search_after is not None:
+                _params['body'] = dict(
+                    _params['body'], search_after=search_after)
+            _params['from_'], _params['size'] = process_limit(
+                None, None, params.get('_limit', self.chunk_size))
+            _params['sort'] = ','.join(filter(None, [
+                apply_sort(params.get('_sort')), '_uid:asc']))
+        elif '_limit' in params:
+            _params['from_'], _params['size'] = process_limit(
+                params.get('_start', None),
+                params.get('_page', None),
+                params['_limit'])
+        elif '_start' in params or '_page' in params:
+            raise JHTTPBadRequest(
+                "'_start' and '_page' can't be used without '_limit'")
+
+        if '_sort' in params and '_cursor' not in params:
             _params['sort'] = apply_sort(params['_sort'])
 
         if '_fields' in params:
@@ -473,10 +1027,21 @@ class ES(object):
             search_fields.reverse()
             search_fields = [s + '^' + str(i) for i, s in
                              enumerate(search_fields, 1)]
-            current_qs = _params['body']['query']['query_string']
-            if isinstance(current_qs, str):
-                _params['body']['query']['query_string'] = {'query': current_qs}
-            _params['body']['query']['query_string']['fields'] = search_fields
+            query = _params['body']['query']
+            if 'bool' in query:
+                # Like in a single `query_string` query, search fields
+                # apply to terms of `q` and of field values which are
+                # not prefixed with a field name.
+                compiled = query['bool']
+                for clause in (compiled.get('must', []) +
+                               compiled.get('filter', [])):
+                    if 'query_string' in clause:
+                        clause['query_string']['fields'] = search_fields
+            else:
+                current_qs = query['query_string']
+                if isinstance(current_qs, str):
+                    query['query_string'] = {'query': current_qs}
+                query['query_string']['fields'] = search_fields
 
         return _params
 
@@ -490,6 +1055,7 @@ class ES(object):
         except IndexNotFoundException:
             return 0
 
+    @metrics.timed('es_query_duration_seconds', method='aggregate')
     def aggregate(self, **params):
         """ Perform aggreration
 
@@ -515,7 +1081,7 @@ class ES(object):
 
         search_params['body']['aggregations'] = _aggregations_params
 
-        log.debug('Performing aggregation: {}'.format(_aggregations_params))
+        log.debug('Performing aggregation: %s', _aggregations_params)
         try:
             response = self.api.search(**search_params)
         except IndexNotFoundException:
@@ -529,8 +1095,121 @@ class ES(object):
         except KeyError:
             raise JHTTPNotFound('No aggregations returned from ES')
 
+    def _scroll(self, search_params, scroll='1m'):
+        """ Generate pages of search responses using the scroll API.
+
+        Pages hold up to `self.chunk_size` hits each. First page is
+        always generated, even if it has no hits, so its total and took
+        values are available to the caller.
+        """
+        search_params = dict(search_params)
+        search_params.pop('from_', None)
+        search_params['size'] = self.chunk_size
+        data = self.api.search(scroll=scroll, **search_params)
+        scroll_id = data.get('_scroll_id')
+        try:
+            yield data
+            while scroll_id and data['hits']['hits']:
+                data = self.api.scroll(scroll_id=scroll_id, scroll=scroll)
+                scroll_id = data.get('_scroll_id', scroll_id)
+                if not data['hits']['hits']:
+                    break
+                yield data
+        finally:
+            if scroll_id:
+                try:
+                    self.api.clear_scroll(scroll_id=scroll_id)
+                except Exception as ex:
+                    log.debug('Failed to clear scroll: %s', ex)
+
+    def _cached_request(self, method, params, cache_role=None):
+        """ Call ES API `method` with `params` using search cache.
+
+        Cache is only used if it is set up and `cache_role` is not None.
+        """
+        cache = self.search_cache
+        if cache is None or cache_role is None:
+            return getattr(self.api, method)(**params)
+        doc_type = params.get('doc_type', self.doc_type)
+        key = cache.make_key(
+            self.index_name, doc_type, [method, params], cache_role)
+        response = cache.get(key)
+        if response is None:
+            response = getattr(self.api, method)(**params)
+            # Response may not include writes which are not refreshed yet
+            if cache.is_refreshed(self.index_name, doc_type):
+                cache.set(key, response)
+        return response
+
+    def _search_pages(self, search_params, cache_role=None):
+        """ Generate pages of search responses for `search_params`.
+
+        Single search request is performed for queries with `size`.
+        Its response is cached if `cache_role` is provided. Unbounded
+        queries are scrolled through.
+        """
+        if 'size' in search_params:
+            yield self._cached_request('search', search_params, cache_role)
+            return
+
+        for data in self._scroll(search_params):
+            yield data
+
+    @staticmethod
+    def _hits_to_docs(hits, _as_dicts=False):
+        for found_doc in hits:
+            output_doc = found_doc['_source']
+            output_doc['_score'] = found_doc['_score']
+            output_doc['_type'] = found_doc['_type']
+            if not _as_dicts:
+                output_doc = dict2obj(output_doc)
+            yield output_doc
+
+    def iter_collection(self, **params):
+        """ Generate documents matching query `params`.
+
+        Accepts the same params as `get_collection`. When `_limit` is
+        not provided, all matching documents are read lazily using the
+        scroll API in chunks of `self.chunk_size` without counting them
+        upfront, so only one chunk is held in memory at a time. Use this
+        instead of `get_collection` to process large result sets.
+        """
+        _as_dicts = params.pop('_as_dicts', False)
+        _params = self.build_search_params(params)
+        fields = _params.pop('fields', '')
+        if fields:
+            _params.update(process_fields_param(fields))
+        try:
+            for data in self._search_pages(_params):
+                for doc in self._hits_to_docs(data['hits']['hits'], _as_dicts):
+                    yield doc
+        except IndexNotFoundException:
+            return
+
+    @metrics.timed('es_query_duration_seconds', method='get_collection')
     def get_collection(self, **params):
+        """ Query ES collection.
+
+        Found documents are returned as DataProxy instances. Pass
+        `_as_dicts=True` to get `_source` dicts of found documents
+        as is, with only `_type` and `_score` keys added.
+
+        When `_limit` is not provided, all matching documents are
+        fetched using the scroll API and are loaded into memory at once.
+        Use `iter_collection` to process them in chunks instead.
+
+        Pass `_cache_role` to use search cache (see `setup_search_cache`).
+        Its value is a role of the user who performs the query, so users
+        with different roles don't share cached responses.
+
+        Pass `_cursor` to paginate with `search_after`: empty cursor
+        returns the first page and `next_cursor` key of
+        `_nefertari_meta` holds the cursor of the next page, or None
+        when there are no more pages.
+        """
         _raise_on_empty = params.pop('_raise_on_empty', False)
+        _as_dicts = params.pop('_as_dicts', False)
+        _cache_role = params.pop('_cache_role', None)
         _params = self.build_search_params(params)
 
         if '_count' in params:
@@ -546,8 +1225,18 @@ class ES(object):
             start=_params.get('from_', 0),
             fields=fields)
 
+        total = took = 0
+        last_hit = None
         try:
-            data = self.api.search(**_params)
+            pages = self._search_pages(_params, _cache_role)
+            for page, data in enumerate(pages):
+                if not page:
+                    total = data['hits']['total']
+                took += data['took']
+                hits = data['hits']['hits']
+                if hits:
+                    last_hit = hits[-1]
+                documents.extend(self._hits_to_docs(hits, _as_dicts))
         except IndexNotFoundException:
             if _raise_on_empty:
                 raise JHTTPNotFound(
@@ -557,23 +1246,25 @@ class ES(object):
                 total=0, took=0)
             return documents
 
-        for found_doc in data['hits']['hits']:
-            output_doc = found_doc['_source']
-            output_doc['_score'] = found_doc['_score']
-            output_doc['_type'] = found_doc['_type']
-            documents.append(dict2obj(output_doc))
-
         documents._nefertari_meta.update(
-            total=data['hits']['total'],
-            took=data['took'],
+            total=total,
+            took=took,
         )
+        metrics.observe('es_query_took_seconds', took / 1000.0,
+                        method='get_collection')
+        if '_cursor' in params:
+            # Full page means there may be more documents to fetch
+            full_page = len(documents) == _params['size']
+            documents._nefertari_meta['next_cursor'] = (
+                encode_cursor(last_hit['sort'])
+                if full_page and last_hit else None)
 
         if not documents:
-            msg = "%s(%s) resource not found" % (self.doc_type, params)
+            msg = "%s(%s) resource not found"
             if _raise_on_empty:
-                raise JHTTPNotFound(msg)
+                raise JHTTPNotFound(msg % (self.doc_type, params))
             else:
-                log.debug(msg)
+                log.debug(msg, self.doc_type, params)
 
         return documents
 
@@ -585,24 +1276,23 @@ class ES(object):
             doc_type=self.doc_type
         )
         params.update(kw)
-        not_found_msg = "'{}({})' resource not found".format(
-            self.doc_type, params)
+        not_found_msg = "'%s(%s)' resource not found"
 
         try:
             data = self.api.get_source(**params)
         except IndexNotFoundException:
             if _raise_on_empty:
                 raise JHTTPNotFound("{} (Index does not exist)".format(
-                    not_found_msg, self.doc_type, params))
+                    not_found_msg % (self.doc_type, params)))
             data = {}
         except JHTTPNotFound:
             data = {}
 
         if not data:
             if _raise_on_empty:
-                raise JHTTPNotFound(not_found_msg)
+                raise JHTTPNotFound(not_found_msg % (self.doc_type, params))
             else:
-                log.debug(not_found_msg)
+                log.debug(not_found_msg, self.doc_type, params)
 
         if '_type' not in data:
             data['_type'] = self.doc_type
@@ -1,3 +1,8 @@
+from zope.interface import implementedBy, providedBy
+from zope.interface.interfaces import IInterface
+
+from nefertari import metrics
+from nefertari.deferred import defer_subscriber
 from nefertari.utils import FieldData, DataProxy
 
 
@@ -68,6 +73,28 @@ class BeforeEvent(RequestEvent):
         self.fields.update(fields)
 
 
+class BatchEventMixin(object):
+    """ Mixin of events fired by views which affect a set of objects.
+
+    Objects affected by request are available at `event.objects`. They
+    are loaded in one query by `view.get_affected_objects` when accessed
+    for the first time and are shared with view and other subscribers.
+    Objects of `delete_many` requests are loaded before they are deleted
+    if `AfterDeleteMany` has subscribers.
+    """
+    _objects = None
+
+    @property
+    def objects(self):
+        if self._objects is None and self.view is not None:
+            self._objects = self.view.get_affected_objects()
+        return self._objects
+
+    @objects.setter
+    def objects(self, value):
+        self._objects = value
+
+
 class AfterEvent(RequestEvent):
     """ Base class for events fired after a request is processed.
 
@@ -124,11 +151,33 @@ class BeforeDelete(BeforeEvent):
     pass
 
 
-class BeforeUpdateMany(BeforeEvent):
-    pass
+class BeforeUpdateMany(BatchEventMixin, BeforeEvent):
+    def set_items_field_value(self, field_name, values):
+        """ Set value of field named `field_name` per affected object.
+
+        Values are only applied if view's `update_many` method updates
+        objects with `view.update_affected_objects()`, which updates
+        objects that get the same values in one call. `update_many`
+        methods that update objects in any other way ignore them. Values
+        are passed to the engine as is: field processors are not run for
+        them and privacy of fields is not checked.
+
+        :param field_name: Name of field value of which should be set.
+        :param values: Dict of {object primary key: value} or a callable
+            which is called with each object of `self.objects` and
+            returns its value.
+        """
+        if callable(values):
+            pk_field = self.model.pk_field()
+            values = dict(
+                (getattr(obj, pk_field), values(obj))
+                for obj in self.objects)
+        items_params = self.view._items_json_params
+        for pk, value in values.items():
+            items_params.setdefault(pk, {})[field_name] = value
 
 
-class BeforeDeleteMany(BeforeEvent):
+class BeforeDeleteMany(BatchEventMixin, BeforeEvent):
     pass
 
 
@@ -178,11 +227,11 @@ class AfterDelete(AfterEvent):
     pass
 
 
-class AfterUpdateMany(AfterEvent):
+class AfterUpdateMany(BatchEventMixin, AfterEvent):
     pass
 
 
-class AfterDeleteMany(AfterEvent):
+class AfterDeleteMany(BatchEventMixin, AfterEvent):
     pass
 
 
@@ -302,6 +351,82 @@ class FieldIsChanged(object):
         return False
 
 
+class SubscriberIndex(object):
+    """ Index of whether subscribers of event class and model exist.
+
+    Subscribers registered with `subscribe_to_events` and
+    `add_field_processors` are indexed with their model predicate when
+    configuration is committed. Other subscribers are assumed to
+    subscribe to events of all models. Lookup results are cached per
+    (event class, model).
+    """
+    def __init__(self, registry):
+        self.registry = registry
+        self.entries = []
+        self._cache = {}
+
+    def add(self, event, model=None):
+        """ Index subscriber of `event` with `model` predicate.
+
+        :param model: Model class, collection of model classes or None
+            if subscriber handles events of all models.
+        """
+        if not IInterface.providedBy(event):
+            event = implementedBy(event)
+        if isinstance(model, type):
+            model = (model,)
+        self.entries.append((event, model))
+        self.reset()
+
+    def reset(self):
+        self._cache.clear()
+
+    def has_subscribers(self, event_cls, model):
+        key = (event_cls, model)
+        try:
+            return self._cache[key]
+        except KeyError:
+            result = self._cache[key] = self._lookup(event_cls, model)
+            return result
+
+    def _lookup(self, event_cls, model):
+        spec = implementedBy(event_cls)
+        handlers = self.registry.adapters.subscriptions([spec], None)
+        if not handlers:
+            return False
+        models = [entry_models for event, entry_models in self.entries
+                  if spec.isOrExtends(event)]
+        if len(handlers) > len(models):
+            return True
+        return any(
+            entry_models is None or
+            (model is not None and issubclass(model, tuple(entry_models)))
+            for entry_models in models)
+
+
+def get_subscriber_index(registry):
+    index = getattr(registry, '_subscriber_index', None)
+    if index is None:
+        index = registry._subscriber_index = SubscriberIndex(registry)
+    return index
+
+
+def _index_subscriber(config, event, model=None):
+    """ Add subscriber of `event` to index when config is committed. """
+    index = get_subscriber_index(config.registry)
+    config.action(None, index.add, args=(event, model))
+
+
+def _is_silent(view, action):
+    """ Check whether `view` or its `action` method is silent.
+
+    :param view: View class or instance.
+    """
+    view_method = getattr(view, action)
+    return (getattr(view_method, '_silent', False) or
+            getattr(view, '_silent', False))
+
+
 def _get_event_kwargs(view_obj):
     """ Helper function to get event kwargs.
 
@@ -309,14 +434,7 @@ def _get_event_kwargs(view_obj):
     :returns dict: Containing event kwargs or None if events shouldn't
         be fired.
     """
-    request = view_obj.request
-
-    view_method = getattr(view_obj, request.action)
-    do_trigger = not (
-        getattr(view_method, '_silent', False) or
-        getattr(view_obj, '_silent', False))
-
-    if do_trigger:
+    if not _is_silent(view_obj, view_obj.request.action):
         event_kwargs = {
             'view': view_obj,
             'model': view_obj.Model,
@@ -330,15 +448,17 @@ def _get_event_kwargs(view_obj):
         return event_kwargs
 
 
-def _get_event_cls(view_obj, events_map):
+def _get_event_cls(view_obj, events_map, request=None):
     """ Helper function to get event class.
 
-    :param view_obj: Instance of View that processes the request.
+    :param view_obj: Instance of View that processes the request. May
+        also be a view class, in which case :request: must be provided.
     :param events_map: Map of events from which event class should be
         picked.
     :returns: Found event class.
     """
-    request = view_obj.request
+    if request is None:
+        request = view_obj.request
     view_method = getattr(view_obj, request.action)
     event_action = (
         getattr(view_method, '_event_action', None) or
@@ -346,25 +466,56 @@ def _get_event_cls(view_obj, events_map):
     return events_map[event_action]
 
 
+def get_triggered_event_cls(view, request, events_map):
+    """ Get class of event `view` triggers when processing `request`.
+
+    Returns None if view is silent or event has no subscribers, in which
+    case event does not need to be triggered.
+
+    :param view: View class or instance.
+    """
+    if _is_silent(view, request.action):
+        return None
+    event_cls = _get_event_cls(view, events_map, request)
+    index = get_subscriber_index(request.registry)
+    if not index.has_subscribers(event_cls, view.Model):
+        return None
+    return event_cls
+
+
 def _trigger_events(view_obj, events_map, additional_kw=None):
     """ Common logic to trigger before/after events.
 
+    Event is not instantiated if it has no subscribers.
+
     :param view_obj: Instance of View that processes the request.
     :param events_map: Map of events from which event class should be
         picked.
-    :returns: Instance if triggered event.
+    :returns: Instance if triggered event or None.
     """
     if additional_kw is None:
         additional_kw = {}
 
-    event_kwargs = _get_event_kwargs(view_obj)
-    if event_kwargs is None:
+    request = view_obj.request
+    event_cls = get_triggered_event_cls(view_obj, request, events_map)
+    if event_cls is None:
         return
 
+    event_kwargs = _get_event_kwargs(view_obj)
     event_kwargs.update(additional_kw)
-    event_cls = _get_event_cls(view_obj, events_map)
     event = event_cls(**event_kwargs)
-    view_obj.request.registry.notify(event)
+    registry = request.registry
+    if not metrics.registry.enabled:
+        registry.notify(event)
+        return event
+
+    event_name = event_cls.__name__
+    metrics.inc('events_triggered_total', event=event_name)
+    subscribers = registry.adapters.subscriptions(
+        [providedBy(event)], None)
+    metrics.observe('event_subscribers', len(subscribers), event=event_name)
+    with metrics.timer('event_duration_seconds', event=event_name):
+        registry.notify(event)
     return event
 
 
@@ -373,8 +524,15 @@ def trigger_before_events(view_obj):
 
     :param view_obj: Instance of nefertari.view.BaseView subclass created
         by nefertari.view.ViewMapper.
-    :returns: Instance if triggered event.
+    :returns: Instance if triggered event or None if event was not
+        triggered.
     """
+    request = view_obj.request
+    if request.action == 'delete_many':
+        # Objects no longer exist by the time AfterDeleteMany is
+        # triggered, so load them for its subscribers beforehand.
+        if get_triggered_event_cls(view_obj, request, AFTER_EVENTS):
+            view_obj.get_affected_objects()
     return _trigger_events(view_obj, BEFORE_EVENTS)
 
 
@@ -383,34 +541,133 @@ def trigger_after_events(view_obj):
 
     :param view_obj: Instance of nefertari.view.BaseView subclass created
         by nefertari.view.ViewMapper.
-    :returns: Instance if triggered event.
+    :returns: Instance if triggered event or None if event was not
+        triggered.
     """
     return _trigger_events(
         view_obj, AFTER_EVENTS,
         {'response': view_obj._response})
 
 
-def subscribe_to_events(config, subscriber, events, model=None):
+def subscribe_to_events(config, subscriber, events, model=None,
+                        deferred=False):
     """ Helper function to subscribe to group of events.
 
     :param config: Pyramid contig instance.
     :param subscriber: Event subscriber function.
     :param events: Sequence of events to subscribe to.
     :param model: Model predicate value.
+    :param deferred: Boolean indicating whether subscriber should be
+        called in background thread with a snapshot of event. Only
+        subscribers of "after" events may be deferred. See
+        `nefertari.deferred`.
     """
     kwargs = {}
     if model is not None:
         kwargs['model'] = model
 
+    if deferred:
+        for evt in events:
+            if not (isinstance(evt, type) and issubclass(evt, AfterEvent)):
+                raise ValueError(
+                    'Only subscribers of after events may be deferred. '
+                    'Got {}'.format(evt))
+        subscriber = defer_subscriber(config.registry, subscriber)
+
     for evt in events:
         config.add_subscriber(subscriber, evt, **kwargs)
+        _index_subscriber(config, evt, model)
+
+
+class FieldProcessors(object):
+    """ Dispatcher of field processors.
+
+    Keeps index of {model: {field: [(order, processors)]}}. Is subscribed
+    once to each of BEFORE_CHANGE_EVENTS and runs processors of fields
+    present in `event.fields` only. Processors of model's base classes
+    are run as well, in order they were added. Processors resolved for
+    each model are cached.
+    """
+    def __init__(self):
+        self.processors = {}
+        self._counter = 0
+        self._cache = {}
+
+    def add(self, model, field, processors):
+        self._counter += 1
+        fields = self.processors.setdefault(model, {})
+        fields.setdefault(field, []).append(
+            (self._counter, tuple(processors)))
+        self._cache.clear()
+
+    def get_processors(self, model):
+        """ Get {field: [processors]} of `model` and its base classes. """
+        try:
+            return self._cache[model]
+        except KeyError:
+            pass
+        chains = {}
+        for cls in getattr(model, '__mro__', ()):
+            for field, entries in self.processors.get(cls, {}).items():
+                chains.setdefault(field, []).extend(entries)
+        resolved = self._cache[model] = {
+            field: [processors for order, processors in sorted(entries)]
+            for field, entries in chains.items()}
+        return resolved
+
+    def __call__(self, event):
+        chains = self.get_processors(event.model)
+        if not chains or not event.fields:
+            return
+        # Processors may set values of fields not present in request
+        processed = set()
+        while True:
+            pending = [name for name in event.fields
+                       if name in chains and name not in processed]
+            if not pending:
+                return
+            for name in pending:
+                processed.add(name)
+                for processors in chains[name]:
+                    self._run_processors(event, name, processors)
+
+    def _run_processors(self, event, field_name, processors):
+        event.field = field = event.fields[field_name]
+        proc_kw = {
+            'new_value': field.new_value,
+            'instance': event.instance,
+            'field': field,
+            'request': event.view.request,
+            'model': event.model,
+            'event': event,
+        }
+        for proc_func in processors:
+            proc_kw['new_value'] = proc_func(**proc_kw)
+
+        field.new_value = proc_kw['new_value']
+        event.set_field_value(field_name, proc_kw['new_value'])
+
+
+""" Events field processors are run on. """
+BEFORE_CHANGE_EVENTS = (
+    BeforeCreate,
+    BeforeUpdate,
+    BeforeReplace,
+    BeforeUpdateMany,
+    BeforeRegister,
+)
+
+
+def get_field_processors(registry):
+    return getattr(registry, '_field_processors', None)
 
 
 def add_field_processors(config, processors, model, field):
     """ Add processors for model field.
 
-    Under the hood, regular nefertari event subscribed is created which
-    calls field processors in order passed to this function.
+    Under the hood, processors are added to FieldProcessors dispatcher
+    which is subscribed to BEFORE_CHANGE_EVENTS and calls field
+    processors in order passed to this function.
 
     Processors are passed following params:
 
@@ -432,31 +689,19 @@ def add_field_processors(config, processors, model, field):
         registered.
     :param field: Field name for which processors are registered.
     """
-    before_change_events = (
-        BeforeCreate,
-        BeforeUpdate,
-        BeforeReplace,
-        BeforeUpdateMany,
-        BeforeRegister,
-    )
-
-    def wrapper(event, _processors=processors, _field=field):
-        proc_kw = {
-            'new_value': event.field.new_value,
-            'instance': event.instance,
-            'field': event.field,
-            'request': event.view.request,
-            'model': event.model,
-            'event': event,
-        }
-        for proc_func in _processors:
-            proc_kw['new_value'] = proc_func(**proc_kw)
-
-        event.field.new_value = proc_kw['new_value']
-        event.set_field_value(_field, proc_kw['new_value'])
-
-    for evt in before_change_events:
-        config.add_subscriber(wrapper, evt, model=model, field=field)
+    registry = config.registry
+    dispatcher = get_field_processors(registry)
+    if dispatcher is None:
+        dispatcher = registry._field_processors = FieldProcessors()
+        for evt in BEFORE_CHANGE_EVENTS:
+            config.add_subscriber(dispatcher, evt)
+            _index_subscriber(config, evt, dispatcher.processors)
+
+    def register():
+        dispatcher.add(model, field, processors)
+        get_subscriber_index(registry).reset()
+
+    config.action(None, register)
 
 
 def silent(obj):
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+from nefertari.utils import json_dumps, pid_exists
+
+
+log = logging.getLogger(__name__)
+
+
+class IndexingQueue(object):
+    """ Queue of Elasticsearch bulk actions processed in background.
+
+    Actions are coalesced by (index, type, id), so only the latest
+    action for each document is sent. Queued actions are flushed by a
+    background thread when `flush_size` actions are pending or every
+    `flush_interval` seconds, whichever happens first.
+
+    Background thread is started by the first `put` in each process,
+    so queue may be created before a pre-forking server forks workers.
+    Actions queued by parent process are not sent by its children.
+
+    If `journal_path` is provided, queued actions are appended to a
+    journal file which is replayed on start. Journal is compacted to the
+    actions that are still pending after each successful flush. Each
+    process writes its own journal at `<journal_path>.<pid>`, so queues
+    of multiple worker processes may share `journal_path`. Journals of
+    processes which are no longer running are replayed on start.
+    Process is considered running if a process with its ID exists on
+    current host, so journals must not be shared between hosts or
+    containers, and journal of a process whose ID was reused is only
+    replayed once the new process exits.
+    """
+    def __init__(self, operation, flush_size=500, flush_interval=1.0,
+                 journal_path=None):
+        """
+        :param operation: Callable that accepts a list of bulk actions
+            and sends them to Elasticsearch.
+        :param flush_size: Number of pending actions that triggers flush.
+        :param flush_interval: Max number of seconds actions stay queued.
+        :param journal_path: Path to journal file. Optional.
+        """
+        self.operation = operation
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        # ID of process which started the thread
+        self._pid = None
+        self._atexit_registered = False
+
+    @property
+    def _journal_file(self):
+        """ Path to journal of current process. """
+        return '{}.{}'.format(self.journal_path, os.getpid())
+
+    @staticmethod
+    def _action_key(action):
+        return (action['_index'], action['_type'], str(action['_id']))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        """ Replay journal and start background flushing thread.
+
+        Does nothing if thread was started by current process. When
+        called in a forked child, state inherited from parent process
+        is reset first.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                self._reset_after_fork()
+            self._pid = pid
+            self._stopped = False
+            self._replay_journal()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+            if not self._atexit_registered:
+                self._atexit_registered = True
+                atexit.register(self.stop)
+
+    def _reset_after_fork(self):
+        """ Drop state inherited from parent process.
+
+        Parent's thread does not exist in child and its pending actions
+        are sent by parent. Locks are recreated as they may have been
+        held by parent's threads when process was forked.
+        """
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def stop(self):
+        """ Stop background thread and flush pending actions. """
+        if self._pid != os.getpid():
+            return
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._pid = None
+        self.flush()
+
+    def put(self, actions):
+        """ Queue bulk :actions:. """
+        self.start()
+        with self._lock:
+            for action in actions:
+                self._pending[self._action_key(action)] = action
+            self._append_journal(actions)
+            size = len(self._pending)
+        if size >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """ Send all pending actions to Elasticsearch.
+
+        May be called from request thread to flush synchronously.
+        Actions of failed flush are queued back unless newer actions
+        for the same documents were queued in the meantime.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            actions = list(pending.values())
+            try:
+                self.operation(actions)
+            except Exception as ex:
+                log.error('Failed to flush {} queued Elasticsearch '
+                          'action(s): {}'.format(len(actions), ex))
+                with self._lock:
+                    for key, action in pending.items():
+                        self._pending.setdefault(key, action)
+                return
+            with self._lock:
+                self._rewrite_journal()
+            log.debug('Flushed {} queued Elasticsearch action(s)'.format(
+                len(actions)))
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            started = time.time()
+            self.flush()
+            log.debug('Indexing queue flush took {:.3f} seconds'.format(
+                time.time() - started))
+
+    def _append_journal(self, actions):
+        if not self.journal_path:
+            return
+        with open(self._journal_file, 'a') as journal:
+            for action in actions:
+                journal.write(json_dumps(action) + '\n')
+
+    def _rewrite_journal(self):
+        if not self.journal_path:
+            return
+        journal_file = self._journal_file
+        tmp_path = journal_file + '.tmp'
+        with open(tmp_path, 'w') as journal:
+            for action in self._pending.values():
+                journal.write(json_dumps(action) + '\n')
+        os.rename(tmp_path, journal_file)
+
+    def _orphaned_journals(self):
+        """ Get paths of journals of processes which are not running.
+
+        Includes journals at `journal_path` itself, which were written
+        by versions that did not suffix journals with process ID.
+        """
+        dirname, basename = os.path.split(os.path.abspath(self.journal_path))
+        if not os.path.isdir(dirname):
+            return []
+        paths = []
+        for filename in sorted(os.listdir(dirname)):
+            if filename != basename:
+                if not filename.startswith(basename + '.'):
+                    continue
+                suffix = filename[len(basename) + 1:].split('.')
+                if (not suffix[0].isdigit() or
+                        suffix[1:] not in ([], ['replay'])):
+                    continue
+                pid = int(suffix[0])
+                if pid != os.getpid() and pid_exists(pid):
+                    continue
+            paths.append(os.path.join(dirname, filename))
+        return paths
+
+    def _replay_journal(self):
+        """ Replay orphaned journals into journal of current process.
+
+        Each orphaned journal is claimed by renaming it, so it is only
+        replayed by one of the processes that start at the same time.
+        """
+        if not self.journal_path:
+            return
+        claimed = self._journal_file + '.replay'
+        for path in self._orphaned_journals():
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed) as journal:
+                actions = [
+                    json.loads(line) for line in journal if line.strip()]
+            with self._lock:
+                for action in actions:
+                    self._pending[self._action_key(action)] = action
+                self._rewrite_journal()
+            os.remove(claimed)
+            log.info('Replayed {} queued Elasticsearch action(s) from '
+                     '{}'.format(len(actions), path))
@@ -0,0 +1,364 @@
+"""
+Prometheus-style metrics of nefertari internals.
+
+Metrics are recorded by calling `inc`, `set_gauge`, `observe` or `timer`
+with a name of one of the metrics defined in METRICS and label values.
+Recording does nothing unless metrics are enabled, which happens when
+this module is included with `metrics.enabled` setting set to true.
+
+Metrics are exposed in Prometheus text format at `metrics.route`
+(defaults to '/metrics'). If `metrics.multiprocess_dir` setting is set,
+each process dumps its metrics to a file in that directory at most
+every `metrics.flush_interval` seconds and on exit. Metrics of all
+processes are then summed up when exposed, so any worker of a
+multi-process server (e.g. gunicorn) exposes metrics of all of them.
+Gauges of processes which are no longer running are not exposed.
+"""
+import os
+import json
+import time
+import atexit
+import tempfile
+import bisect
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+import six
+from pyramid.response import Response
+from pyramid.settings import asbool
+
+from nefertari.utils import pid_exists
+
+
+log = logging.getLogger(__name__)
+
+PREFIX = 'nefertari_'
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                    2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50)
+
+""" Map of {name: (type, help, buckets)} of available metrics. """
+METRICS = {
+    'es_bulk_requests_total': (
+        'counter', 'Elasticsearch bulk requests.', None),
+    'es_bulk_errors_total': (
+        'counter', 'Failed Elasticsearch bulk requests.', None),
+    'es_bulk_actions': (
+        'histogram', 'Number of actions per Elasticsearch bulk request.',
+        SIZE_BUCKETS),
+    'es_bulk_duration_seconds': (
+        'histogram', 'Duration of Elasticsearch bulk requests.',
+        DURATION_BUCKETS),
+    'es_query_duration_seconds': (
+        'histogram', 'Wall time of Elasticsearch queries.',
+        DURATION_BUCKETS),
+    'es_query_took_seconds': (
+        'histogram', 'Time Elasticsearch reported queries took.',
+        DURATION_BUCKETS),
+    'render_duration_seconds': (
+        'histogram', 'Duration of wrappers, after events and rendering '
+        'of responses.', DURATION_BUCKETS),
+    'events_triggered_total': (
+        'counter', 'Triggered nefertari events.', None),
+    'event_subscribers': (
+        'histogram', 'Number of subscribers registered for event.',
+        COUNT_BUCKETS),
+    'event_duration_seconds': (
+        'histogram', 'Duration of notifying subscribers of event.',
+        DURATION_BUCKETS),
+    'auth_lookups_total': (
+        'counter', 'Lookups of authenticated users credentials.', None),
+    'request_phase_duration_seconds': (
+        'histogram', 'Duration of request processing phases.',
+        DURATION_BUCKETS),
+    'deferred_queue_depth': (
+        'gauge', 'Number of queued deferred event subscribers.', None),
+    'deferred_queue_overflows_total': (
+        'counter', 'Deferred event subscribers called synchronously '
+        'because queue was full.', None),
+    'deferred_subscriber_calls_total': (
+        'counter', 'Calls of deferred event subscribers.', None),
+    'es_pool_maxsize': (
+        'gauge', 'Max number of idle connections to Elasticsearch node.',
+        None),
+    'es_pool_in_use': (
+        'gauge', 'Connections to Elasticsearch node in use.', None),
+    'es_pool_connections_created': (
+        'gauge', 'Connections to Elasticsearch node opened so far.', None),
+    'es_pool_requests': (
+        'gauge', 'Requests sent to Elasticsearch node so far.', None),
+    'es_dead_nodes': (
+        'gauge', 'Elasticsearch nodes marked as dead.', None),
+}
+
+
+def _labels_key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+class MetricsRegistry(object):
+    """ Storage of metrics values of current process. """
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self.enabled = False
+        self.multiprocess_dir = None
+        self.flush_interval = 1.0
+        self._values = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """ Add callable which records metrics before they are exposed.
+
+        Used for values which are read on demand, e.g. gauges of
+        connection pools utilization.
+        """
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def run_collectors(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                log.exception('Metrics collector %s failed', collector)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = _labels_key(labels)
+        with self._lock:
+            values = self._values.setdefault(name, {})
+            values[key] = values.get(key, 0) + amount
+        self._maybe_flush()
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = _labels_key(labels)
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        buckets = self.metrics[name][2]
+        index = bisect.bisect_left(buckets, value)
+        key = _labels_key(labels)
+        with self._lock:
+            values = self._values.setdefault(name, {})
+            if key not in values:
+                values[key] = {'counts': [0] * (len(buckets) + 1), 'sum': 0}
+            values[key]['counts'][index] += 1
+            values[key]['sum'] += value
+        self._maybe_flush()
+
+    def snapshot(self):
+        """ Get copy of values as {name: {labels_key: value}}. """
+        with self._lock:
+            return json.loads(json.dumps(self._values))
+
+    def _dump_path(self):
+        filename = 'nefertari_metrics_{}.json'.format(os.getpid())
+        return os.path.join(self.multiprocess_dir, filename)
+
+    def _maybe_flush(self):
+        if self.multiprocess_dir is None:
+            return
+        if time.time() - self._last_flush < self.flush_interval:
+            return
+        # Skip flush if another thread is flushing already
+        if not self._flush_lock.acquire(False):
+            return
+        try:
+            now = time.time()
+            if now - self._last_flush >= self.flush_interval:
+                self._last_flush = now
+                self._dump()
+        finally:
+            self._flush_lock.release()
+
+    def dump(self):
+        """ Dump values of current process to multiprocess dir.
+
+        Errors are logged and are not raised, so recording metrics never
+        fails the code that records them.
+        """
+        if self.multiprocess_dir is None:
+            return
+        with self._flush_lock:
+            self._dump()
+
+    def _dump(self):
+        path = self._dump_path()
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.multiprocess_dir,
+                prefix=os.path.basename(path) + '.', suffix='.tmp')
+            with os.fdopen(fd, 'w') as dump:
+                json.dump(self.snapshot(), dump)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as ex:
+            log.error('Failed to dump metrics to %s: %s', path, ex)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def collect(self):
+        """ Get values summed across all processes. """
+        snapshots = [self.snapshot()]
+        if self.multiprocess_dir is not None:
+            own_path = self._dump_path()
+            for filename in sorted(os.listdir(self.multiprocess_dir)):
+                path = os.path.join(self.multiprocess_dir, filename)
+                pid = filename[len('nefertari_metrics_'):-len('.json')]
+                if (path == own_path or not filename.endswith('.json') or
+                        not filename.startswith('nefertari_metrics_') or
+                        not pid.isdigit()):
+                    continue
+                try:
+                    with open(path) as dump:
+                        snapshot = json.load(dump)
+                except (IOError, ValueError) as ex:
+                    log.error('Failed to read metrics from %s: %s', path, ex)
+                    continue
+                if not pid_exists(int(pid)):
+                    # Gauges hold current values of running processes
+                    snapshot = dict(
+                        (name, values) for name, values in snapshot.items()
+                        if self.metrics[name][0] != 'gauge')
+                snapshots.append(snapshot)
+
+        collected = {}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                merged = collected.setdefault(name, {})
+                for key, value in values.items():
+                    if isinstance(value, dict):
+                        if key not in merged:
+                            merged[key] = {
+                                'counts': [0] * len(value['counts']),
+                                'sum': 0}
+                        merged[key]['counts'] = [
+                            a + b for a, b in zip(
+                                merged[key]['counts'], value['counts'])]
+                        merged[key]['sum'] += value['sum']
+                    else:
+                        merged[key] = merged.get(key, 0) + value
+        return collected
+
+    def render(self):
+        """ Render collected metrics in Prometheus text format. """
+        lines = []
+        self.run_collectors()
+        collected = self.collect()
+        for name in sorted(collected):
+            metric_type, help_text, buckets = self.metrics[name]
+            full_name = PREFIX + name
+            lines.append('# HELP {} {}'.format(full_name, help_text))
+            lines.append('# TYPE {} {}'.format(full_name, metric_type))
+            for key, value in sorted(collected[name].items()):
+                labels = json.loads(key)
+                if metric_type in ('counter', 'gauge'):
+                    lines.append('{}{} {}'.format(
+                        full_name, _format_labels(labels), value))
+                    continue
+                cumulative = 0
+                bounds = [str(b) for b in buckets] + ['+Inf']
+                for bound, count in zip(bounds, value['counts']):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(
+                        full_name, _format_labels(labels + [['le', bound]]),
+                        cumulative))
+                lines.append('{}_sum{} {}'.format(
+                    full_name, _format_labels(labels), value['sum']))
+                lines.append('{}_count{} {}'.format(
+                    full_name, _format_labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, six.text_type(value).replace('"', '\\"'))
+        for name, value in labels) + '}'
+
+
+registry = MetricsRegistry()
+
+
+def inc(name, amount=1, **labels):
+    """ Increment counter `name` by `amount`. """
+    registry.inc(name, amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    """ Set value of gauge `name`. """
+    registry.set(name, value, **labels)
+
+
+def add_collector(collector):
+    """ Add callable which is called when metrics are exposed. """
+    registry.add_collector(collector)
+
+
+def observe(name, value, **labels):
+    """ Add `value` to histogram `name`. """
+    registry.observe(name, value, **labels)
+
+
+@contextmanager
+def timer(name, **labels):
+    """ Add duration of block to histogram `name`. """
+    if not registry.enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.time() - start, **labels)
+
+
+def timed(name, **labels):
+    """ Decorator that adds duration of calls to histogram `name`. """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def metrics_view(request):
+    return Response(
+        registry.render(),
+        content_type='text/plain; version=0.0.4', charset='utf-8')
+
+
+def includeme(config):
+    settings = config.registry.settings
+    registry.enabled = asbool(settings.get('metrics.enabled', True))
+    registry.multiprocess_dir = settings.get('metrics.multiprocess_dir')
+    registry.flush_interval = float(settings.get(
+        'metrics.flush_interval', 1))
+    if registry.multiprocess_dir is not None:
+        atexit.register(registry.dump)
+    route = settings.get('metrics.route', '/metrics')
+    config.add_route('nef_metrics', route)
+    config.add_view(metrics_view, route_name='nef_metrics',
+                    request_method='GET')
+    log.info('Metrics are exposed at %s', route)
@@ -1,11 +1,16 @@
 import json
+import hashlib
 import logging
 from datetime import date, datetime
 
-from nefertari import wrappers
+from pyramid.settings import asbool
+
+from nefertari import metrics, wrappers
 from nefertari.utils import get_json_encoder
 from nefertari.json_httpexceptions import JHTTPOk, JHTTPCreated
-from nefertari.events import trigger_after_events
+from nefertari.events import (
+    AFTER_EVENTS, get_triggered_event_cls, trigger_after_events)
+from nefertari.timing import timed
 
 log = logging.getLogger(__name__)
 
@@ -21,6 +26,81 @@ class _JSONEncoder(json.JSONEncoder):
             return str(obj)  # fallback to str
 
 
+def _stdlib_backend():
+    def dumps(value, encoder):
+        return json.dumps(value, cls=encoder)
+    return dumps
+
+
+def _orjson_backend():
+    import orjson
+    # Datetimes are passed to encoder so they are formatted as by
+    # stdlib backend
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(value, encoder):
+        return orjson.dumps(
+            value, default=encoder().default, option=option).decode('utf-8')
+    return dumps
+
+
+def _ujson_backend():
+    import ujson
+
+    def dumps(value, encoder):
+        return ujson.dumps(
+            value, default=encoder().default,
+            escape_forward_slashes=False)
+    return dumps
+
+
+def _rapidjson_backend():
+    import rapidjson
+
+    def dumps(value, encoder):
+        return rapidjson.dumps(value, default=encoder().default)
+    return dumps
+
+
+""" Map of {name: backend factory} of JSON backends that may be used
+to render responses. Backend factory returns a function which accepts
+value to render and JSON encoder class. Encoder's `default` method is
+used by all backends to serialize values that can't be serialized
+natively. Note that `ujson` serializes Decimal values as numbers.
+"""
+JSON_BACKENDS = {
+    'json':         _stdlib_backend,
+    'orjson':       _orjson_backend,
+    'ujson':        _ujson_backend,
+    'rapidjson':    _rapidjson_backend,
+}
+
+
+def get_json_backend(name):
+    """ Get dumps function of JSON backend named :name:.
+
+    Stdlib backend is used if library required by backend is not
+    installed.
+    """
+    try:
+        backend = JSON_BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown JSON backend `{}`. Available backends '
+                         'are: {}'.format(name, ', '.join(JSON_BACKENDS)))
+    try:
+        return backend()
+    except ImportError as ex:
+        log.warning('JSON backend `{}` is not available, falling back '
+                    'to `json`: {}'.format(name, ex))
+        return _stdlib_backend()
+
+
+""" Response meta keys which are ignored when computing ETags as their
+values differ between identical responses.
+"""
+VOLATILE_META_KEYS = frozenset(['took'])
+
+
 class JsonRendererFactory(object):
 
     def __init__(self, info):
@@ -29,8 +109,19 @@ class JsonRendererFactory(object):
         (the package that was 'current' at the time the
         renderer was registered), type (the renderer type
         name), registry (the current application registry) and
-        settings (the deployment settings dictionary). """
-        pass
+        settings (the deployment settings dictionary).
+
+        JSON backend used to render responses is picked using
+        `nefertari.json_backend` setting. Collection responses are
+        streamed if `nefertari.stream_responses` setting is true.
+        ETags are added to item and collection GET responses if
+        `nefertari.etags` setting is true. """
+        settings = getattr(info, 'settings', None) or {}
+        self.json_dumps = get_json_backend(
+            settings.get('nefertari.json_backend', 'json'))
+        self.stream_responses = asbool(
+            settings.get('nefertari.stream_responses', False))
+        self.etags = asbool(settings.get('nefertari.etags', False))
 
     def _set_content_type(self, system):
         """ Set response content type """
@@ -47,7 +138,51 @@ class JsonRendererFactory(object):
         enc_class = getattr(view, '_json_encoder', None)
         if enc_class is None:
             enc_class = get_json_encoder()
-        return json.dumps(value, cls=enc_class)
+        if self._is_streamed(value, system):
+            response = system['request'].response
+            response.app_iter = self._iter_response(value, enc_class)
+            response.content_length = None
+            return
+        return self.json_dumps(value, enc_class)
+
+    def _is_streamed(self, value, system):
+        """ Determine whether response should be streamed.
+
+        Only responses of collection GET requests are streamed.
+        """
+        if not self.stream_responses:
+            return False
+        request = system.get('request')
+        if getattr(request, 'action', None) != 'index':
+            return False
+        return isinstance(value, dict) and isinstance(
+            value.get('data'), list)
+
+    def _iter_response(self, value, encoder, batch_size=100):
+        """ Generate JSON of collection response :value: in chunks.
+
+        Items of `value['data']` are serialized in batches of
+        :batch_size: items. Other keys of :value: (count, total, etc.)
+        are written after all the items.
+        """
+        meta = value.copy()
+        data = meta.pop('data')
+        yield b'{"data": ['
+        batch = []
+        for ix, item in enumerate(data):
+            batch.append(self.json_dumps(item, encoder))
+            if len(batch) == batch_size:
+                prefix = ',' if ix >= batch_size else ''
+                yield (prefix + ','.join(batch)).encode('utf-8')
+                batch = []
+        if batch:
+            prefix = ',' if len(data) > len(batch) else ''
+            yield (prefix + ','.join(batch)).encode('utf-8')
+        meta = self.json_dumps(meta, encoder)
+        if meta.strip() == '{}':
+            yield b']}'
+        else:
+            yield (']' + ', ' + meta.lstrip()[1:]).encode('utf-8')
 
     def __call__(self, value, system):
         """ Call the renderer implementation with the value
@@ -59,12 +194,84 @@ class JsonRendererFactory(object):
         """
         self._set_content_type(system)
         # run after_calls on the value before jsonifying
-        value = self.run_after_calls(value, system)
-        value = self._trigger_events(value, system)
+        with timed('after_calls'):
+            value = self.run_after_calls(value, system)
+        with timed('events'):
+            value = self._trigger_events(value, system)
+        with timed('render'):
+            return self._render(value, system)
+
+    def _render(self, value, system):
+        """ Render :value: adding ETag if enabled.
+
+        ETag is a hash of rendered body, so it changes whenever response
+        does, including changes made by after calls and events. If
+        :value: has meta keys listed in VOLATILE_META_KEYS, ETag is a
+        hash of :value: rendered without them. Streamed responses have
+        no ETags.
+        """
+        if (not self._etags_enabled(system) or
+                self._is_streamed(value, system)):
+            return self._render_response(value, system)
+
+        hashed_value = value
+        if isinstance(value, dict) and VOLATILE_META_KEYS & set(value):
+            hashed_value = dict(
+                (key, val) for key, val in value.items()
+                if key not in VOLATILE_META_KEYS)
+        hashed = self._render_response(hashed_value, system)
+        if hashed is None:
+            return hashed
+        if self._not_modified(self._hash(hashed), system):
+            return
+        if hashed_value is value:
+            return hashed
         return self._render_response(value, system)
 
+    @staticmethod
+    def _hash(body):
+        return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+    def _etags_enabled(self, system):
+        request = system.get('request')
+        return (self.etags and request is not None and
+                getattr(request, 'action', None) in ('index', 'show'))
+
+    def _not_modified(self, etag, system):
+        """ Set response ETag to :etag: and make it a '304 Not Modified'
+        response if :etag: matches request's `If-None-Match` header.
+
+        Returns True if response was not modified.
+        """
+        request = system['request']
+        response = request.response
+        response.etag = etag
+        if etag not in request.if_none_match:
+            return False
+        response.status_int = 304
+        response.app_iter = []
+        response.content_length = None
+        return True
+
+    def _get_view_obj(self, system):
+        """ Get view instance which processed the request.
+
+        Instance created by ViewMapper is reused when available to
+        avoid instantiating the view again.
+        """
+        request = system['request']
+        view_cls = system['view']
+        view_obj = getattr(request, 'view_obj', None)
+        if isinstance(view_cls, type) and isinstance(view_obj, view_cls):
+            return view_obj
+        return view_cls(system['context'], request)
+
     def _trigger_events(self, value, system):
-        view_obj = system['view'](system['context'], system['request'])
+        request = system['request']
+        view_cls = system['view']
+        if get_triggered_event_cls(view_cls, request, AFTER_EVENTS) is None:
+            return value
+        view_obj = self._get_view_obj(system)
         view_obj._response = value
         evt = trigger_after_events(view_obj)
         return evt.response
@@ -160,6 +367,13 @@ class NefertariJsonRendererFactory(DefaultResponseRendererMixin,
     """ Special json renderer which will apply all after_calls(filters)
     to the result.
     """
+    def __call__(self, value, system):
+        request = system.get('request')
+        action = getattr(request, 'action', None) or 'unknown'
+        with metrics.timer('render_duration_seconds', action=action):
+            return super(NefertariJsonRendererFactory, self).__call__(
+                value, system)
+
     def run_after_calls(self, value, system):
         request = system.get('request')
         if request and hasattr(request, 'action'):
@@ -1,5 +1,8 @@
 from argparse import ArgumentParser
+import os
 import sys
+import json
+import time
 import logging
 
 from pyramid.paster import bootstrap
@@ -46,6 +49,17 @@ class ESCommand(object):
             help=('Index chunk size. If chunk size not provided '
                   '`elasticsearch.chunk_size` setting is used'),
             type=int)
+        parser.add_argument(
+            '--stream',
+            help=('Page through models in primary key order and index '
+                  'each page as it is fetched'),
+            action='store_true',
+            default=False)
+        parser.add_argument(
+            '--checkpoint',
+            help=('Path to a file used to store number of indexed '
+                  'documents of each model. If file exists, indexing '
+                  'resumes from stored position'))
 
         group = parser.add_mutually_exclusive_group(required=True)
         group.add_argument(
@@ -88,6 +102,9 @@ class ESCommand(object):
         params = dict([
             [k, v[0]] for k, v in urllib.parse.parse_qs(params).items()
         ])
+        if self.options.stream:
+            return self.stream_models(model_names, params)
+
         params.setdefault('_limit', params.get('_limit', 10000))
         chunk_size = self.options.chunk or params['_limit']
 
@@ -102,6 +119,72 @@ class ESCommand(object):
                 model_name))
             es.index_missing_documents(documents)
 
+    def load_checkpoint(self):
+        path = self.options.checkpoint
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def save_checkpoint(self, checkpoint):
+        path = self.options.checkpoint
+        if not path:
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.rename(tmp_path, path)
+
+    def stream_models(self, model_names, params):
+        """ Index models page by page.
+
+        Only one page of documents is held in memory at a time, so memory
+        usage does not depend on the size of the table. Pages are fetched
+        with `_start` and `_limit` in primary key order, which is
+        supported by all engines, and number of processed documents of
+        each model is stored in checkpoint file after each page. Objects
+        deleted while indexing shift the following pages, so some
+        objects may be skipped; indexing the model again picks them up.
+        """
+        self.log.info('Streaming models documents')
+        chunk_size = self.options.chunk or ES.settings.asint('chunk_size')
+        checkpoint = self.load_checkpoint()
+
+        for model_name in model_names:
+            self.log.info('Processing model `{}`'.format(model_name))
+            model = engine.get_document_cls(model_name)
+            es = ES(source=model_name, index_name=self.options.index,
+                    chunk_size=chunk_size)
+            page_params = params.copy()
+            page_params['_sort'] = model.pk_field()
+            page_params['_limit'] = chunk_size
+            start = checkpoint.get(model_name, 0)
+            if start:
+                self.log.info('Resuming `{}` from document {}'.format(
+                    model_name, start))
+
+            processed = 0
+            started_at = time.time()
+            while True:
+                page_params['_start'] = start
+                documents = to_dicts(model.get_collection(**page_params))
+                if not documents:
+                    break
+                es.index_missing_documents(documents)
+                start += len(documents)
+                processed += len(documents)
+                checkpoint[model_name] = start
+                self.save_checkpoint(checkpoint)
+
+                elapsed = time.time() - started_at
+                rate = processed / elapsed if elapsed else processed
+                self.log.info(
+                    'Processed {} `{}` documents ({:.1f} docs/sec). '
+                    'Checkpoint: {}'.format(
+                        processed, model_name, rate, start))
+                if len(documents) < chunk_size:
+                    break
+
     def recreate_index(self):
         self.log.info('Deleting index')
         ES.delete_index()
@@ -0,0 +1,175 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+
+import six
+
+from nefertari.utils import TTLCache, split_strip
+
+
+log = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend(object):
+    """ In-process LRU cache backend.
+
+    Generations are kept in process memory, so writes only invalidate
+    responses cached by the process which performed them. Only use this
+    backend with single-process servers; use RedisCacheBackend with
+    multi-process (e.g. gunicorn or uwsgi) deployments.
+    """
+    def __init__(self, max_size=1000, ttl=60):
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._generations = {}
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    def get_generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def incr_generation(self, namespace):
+        with self._lock:
+            self._generations[namespace] = (
+                self._generations.get(namespace, 0) + 1)
+            self._invalidated_at[namespace] = time.time()
+
+    def get_invalidated_at(self, namespace):
+        return self._invalidated_at.get(namespace)
+
+
+class RedisCacheBackend(object):
+    """ Cache backend which stores entries in Redis.
+
+    Works with any server which speaks Redis protocol. Requires `redis`
+    package to be installed.
+    """
+    def __init__(self, url='redis://localhost:6379/0', ttl=60,
+                 prefix='nefertari:'):
+        import redis
+        self.client = redis.StrictRedis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is not None and not isinstance(value, six.text_type):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value):
+        if self.ttl:
+            self.client.setex(self.prefix + key, self.ttl, value)
+
+    def get_generation(self, namespace):
+        return int(self.client.get(self.prefix + 'gen:' + namespace) or 0)
+
+    def incr_generation(self, namespace):
+        self.client.incr(self.prefix + 'gen:' + namespace)
+        self.client.set(self.prefix + 'inv:' + namespace, repr(time.time()))
+
+    def get_invalidated_at(self, namespace):
+        value = self.client.get(self.prefix + 'inv:' + namespace)
+        return float(value) if value is not None else None
+
+
+CACHE_BACKENDS = {
+    'memory': MemoryCacheBackend,
+    'redis': RedisCacheBackend,
+}
+
+
+class SearchCache(object):
+    """ Cache of Elasticsearch search responses.
+
+    Responses are stored as JSON strings under keys built from
+    canonicalized search params and user role. Each doc type has a
+    generation number which is part of the key. Incrementing it on
+    writes to doc type invalidates all cached responses of that type,
+    which are then evicted by the backend.
+
+    Writes only become visible to searches after Elasticsearch refreshes
+    the index. Responses of doc types invalidated less than
+    `refresh_interval` seconds ago are therefore not cached, as they may
+    not include the latest writes.
+    """
+    def __init__(self, backend, refresh_interval=1.0):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+
+    @staticmethod
+    def _namespace(index_name, doc_type):
+        return '{}/{}'.format(index_name, doc_type)
+
+    def make_key(self, index_name, doc_type, params, role=''):
+        """ Build cache key of search `params` performed by user with
+        `role`.
+
+        `doc_type` may be a comma-separated list of doc types, in which
+        case key is invalidated by writes to any of them.
+        """
+        generations = [
+            self.backend.get_generation(self._namespace(index_name, name))
+            for name in sorted(split_strip(doc_type))]
+        canonical = json.dumps(
+            [params, role], sort_keys=True, default=six.text_type)
+        digest = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+        return '{}/{}:{}:{}'.format(
+            index_name, doc_type,
+            '.'.join(str(gen) for gen in generations), digest)
+
+    def is_refreshed(self, index_name, doc_type):
+        """ Check whether writes to `doc_type` are visible to searches.
+
+        `doc_type` may be a comma-separated list of doc types.
+        """
+        now = time.time()
+        for name in split_strip(doc_type):
+            invalidated_at = self.backend.get_invalidated_at(
+                self._namespace(index_name, name))
+            if (invalidated_at is not None and
+                    now - invalidated_at < self.refresh_interval):
+                return False
+        return True
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is not None:
+            return json.loads(value)
+
+    def set(self, key, response):
+        self.backend.set(key, json.dumps(response))
+
+    def invalidate(self, index_name, doc_types):
+        """ Invalidate cached responses of `doc_types` in `index_name`. """
+        for doc_type in set(doc_types):
+            self.backend.incr_generation(
+                self._namespace(index_name, doc_type))
+            log.debug('Invalidated cached responses of `{}`'.format(doc_type))
+
+
+def get_cache_backend(name, settings):
+    """ Instantiate cache backend `name` configured with `settings`.
+
+    :param name: Name of backend. One of CACHE_BACKENDS keys.
+    :param settings: dictset of `elasticsearch` settings.
+    """
+    try:
+        backend_cls = CACHE_BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown cache backend `{}`. Supported '
+                         'backends: {}'.format(
+                             name, ', '.join(sorted(CACHE_BACKENDS))))
+    ttl = settings.asint('cache_ttl', 60)
+    if backend_cls is RedisCacheBackend:
+        return backend_cls(
+            url=settings.get('cache_redis_url', 'redis://localhost:6379/0'),
+            ttl=ttl)
+    return backend_cls(max_size=settings.asint('cache_size', 1000), ttl=ttl)
@@ -0,0 +1,84 @@
+"""
+Per-request timing of request processing phases.
+
+`request_timing` tween starts a RequestTimer for each request. Code
+that performs a phase of request processing wraps it with
+`timed(phase_name)`, which adds time spent in the phase to the timer of
+the current request. Phases may be nested and may repeat, e.g. all ES
+requests performed while processing a request are added up to 'es'
+phase. When there is no current timer, `timed` does nothing.
+
+Phases timed by nefertari are:
+    * before_calls: View before calls (validators).
+    * action: View method call, including DB and ES queries.
+    * es: Elasticsearch requests.
+    * after_calls: View after calls (wrappers).
+    * events: Before and after event subscribers.
+    * render: Rendering of response body.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+_local = threading.local()
+
+
+class RequestTimer(object):
+    """ Accumulates time spent in phases of request processing. """
+    def __init__(self):
+        self.started = time.time()
+        self.phases = OrderedDict()
+
+    def add(self, phase, duration):
+        self.phases[phase] = self.phases.get(phase, 0) + duration
+
+    def total(self):
+        return time.time() - self.started
+
+    def as_dict(self):
+        """ Get {phase: milliseconds} of all timed phases. """
+        return OrderedDict(
+            (phase, round(duration * 1000, 3))
+            for phase, duration in self.phases.items())
+
+    def server_timing(self, total=None):
+        """ Get value of `Server-Timing` header.
+
+        :param total: Total request time in seconds. Optional.
+        """
+        metrics = ['{};dur={}'.format(phase, duration)
+                   for phase, duration in self.as_dict().items()]
+        if total is not None:
+            metrics.append('total;dur={}'.format(round(total * 1000, 3)))
+        return ', '.join(metrics)
+
+
+def start_timer():
+    """ Start timer of current request. """
+    _local.timer = RequestTimer()
+    return _local.timer
+
+
+def stop_timer():
+    _local.timer = None
+
+
+def get_timer():
+    """ Get timer of current request or None. """
+    return getattr(_local, 'timer', None)
+
+
+@contextmanager
+def timed(phase):
+    """ Add time spent in the block to `phase` of current request. """
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        timer.add(phase, time.time() - start)
@@ -0,0 +1,105 @@
+"""
+Tracing of slow Elasticsearch requests.
+
+ESRequestTracer keeps the last `buffer_size` ES requests which took at
+least `slow_threshold` seconds. Bodies of a `sample_rate` fraction of
+slow requests are captured too. Requests' bodies are only formatted
+when they are captured.
+
+Tracer is set up by 'nefertari.elasticsearch' when
+`elasticsearch.slow_request_threshold` setting is set. Slow requests
+are then listed to admin users at '/_es/slow_requests' endpoint.
+"""
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+import six
+from pyramid.response import Response
+
+from nefertari import wrappers
+from nefertari.json_httpexceptions import JHTTPForbidden
+
+
+log = logging.getLogger(__name__)
+
+
+class ESRequestTracer(object):
+    """ Ring buffer of slow Elasticsearch requests. """
+    def __init__(self, slow_threshold=1.0, buffer_size=100,
+                 sample_rate=0.0, max_body_size=2048):
+        """
+        :param slow_threshold: Min number of seconds request must take
+            to be traced.
+        :param buffer_size: Number of last slow requests to keep.
+        :param sample_rate: Fraction of slow requests which bodies are
+            captured. From 0 to 1.
+        :param max_body_size: Number of characters captured bodies are
+            truncated to.
+        """
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self.max_body_size = max_body_size
+        self._requests = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+
+    def _format_body(self, body):
+        if isinstance(body, six.binary_type):
+            body = body.decode('utf-8', 'replace')
+        elif not isinstance(body, six.string_types):
+            body = six.text_type(body)
+        if len(body) > self.max_body_size:
+            body = body[:self.max_body_size] + '...TRUNCATED...'
+        return body
+
+    def record(self, method, url, params, body, duration, status):
+        """ Record request if it took at least `slow_threshold` seconds.
+        """
+        if duration < self.slow_threshold:
+            return
+        entry = {
+            'method': method,
+            'url': url,
+            'params': dict(params or {}),
+            'status': status,
+            'duration': duration,
+            'timestamp': time.time(),
+        }
+        if body and self.sample_rate and random.random() < self.sample_rate:
+            entry['body'] = self._format_body(body)
+        with self._lock:
+            self._requests.append(entry)
+        log.warning('Elasticsearch request %s %s took %.3f seconds',
+                    method, url, duration)
+
+    def get_slow_requests(self):
+        """ Get traced requests, most recent first. """
+        with self._lock:
+            return list(reversed(self._requests))
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+
+
+def slow_requests_view(request):
+    """ List slow ES requests. Only available to admin users. """
+    from nefertari.elasticsearch import ES
+    if wrappers.get_user_role(request) != 'admin':
+        raise JHTTPForbidden('Only admins may view slow requests')
+    requests = ES.tracer.get_slow_requests() if ES.tracer else []
+    response = Response(content_type='application/json')
+    response.json_body = {
+        'slow_threshold': ES.tracer.slow_threshold if ES.tracer else None,
+        'count': len(requests),
+        'data': requests,
+    }
+    return response
+
+
+def includeme(config):
+    config.add_route('nef_es_slow_requests', '/_es/slow_requests')
+    config.add_view(slow_requests_view, route_name='nef_es_slow_requests',
+                    request_method='GET')
@@ -10,23 +10,51 @@ log = logging.getLogger(__name__)
 
 
 def request_timing(handler, registry):
-    threshold = float(registry.settings.get(
+    """ Log request time and time spent in phases of request processing.
+
+    Phases timings are logged as `timings` field of log records and are
+    set as `Server-Timing` response header if
+    `request_timing.server_timing` setting is true. See
+    `nefertari.timing`. Timings are also recorded as
+    `request_phase_duration_seconds` metric when metrics are enabled.
+    See `nefertari.metrics`.
+    """
+    from nefertari import metrics
+    from nefertari.timing import start_timer, stop_timer
+    settings = registry.settings
+    threshold = float(settings.get(
         'request_timing.slow_request_threshold', 2))
+    server_timing = asbool(settings.get(
+        'request_timing.server_timing', False))
     log.info('request_timing enabled: slow_request_threshold = %s' % threshold)
 
     def timing(request):
-
+        timer = start_timer()
+        response = None
         start = time.time()
         try:
-            return handler(request)
+            response = handler(request)
+            return response
         finally:
             delta = time.time() - start
-            msg = '%s (%s) request took %s seconds' % (
-                request.method, request.url, delta)
+            stop_timer()
+            extra = {'timings': timer.as_dict(), 'duration': delta}
+            msg = '%s (%s) request took %s seconds'
             if delta > threshold:
-                log.warning(msg)
+                log.warning(msg, request.method, request.url, delta,
+                            extra=extra)
             else:
-                log.debug(msg)
+                log.debug(msg, request.method, request.url, delta,
+                          extra=extra)
+            if server_timing and response is not None:
+                response.headers['Server-Timing'] = timer.server_timing(
+                    delta)
+            if metrics.registry.enabled:
+                for phase, duration in timer.phases.items():
+                    metrics.observe('request_phase_duration_seconds',
+                                    duration, phase=phase)
+                metrics.observe('request_phase_duration_seconds', delta,
+                                phase='total')
 
     return timing
 
@@ -1,5 +1,6 @@
 from nefertari.utils.data import *
 from nefertari.utils.dictset import *
 from nefertari.utils.utils import *
+from nefertari.utils.cache import *
 
 _split = split_strip
@@ -0,0 +1,47 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """ Thread-safe LRU cache which entries expire after `ttl` seconds.
+
+    Least recently used entries are dropped when cache holds more than
+    `max_size` entries. Cache with `ttl` of 0 does not store anything.
+    """
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires_at < time.time():
+                return default
+            self._data[key] = (expires_at, value)
+            return value
+
+    def set(self, key, value):
+        if not self.ttl:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + self.ttl, value)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -4,9 +4,30 @@ from nefertari.utils.utils import issequence
 
 
 class DataProxy(object):
+    """ Object representation of document data.
+
+    Data values are accessible as attributes. Nested dicts and lists of
+    dicts are converted to proxies on first access and then cached on
+    the instance.
+    """
     def __init__(self, data={}):
         self._data = dictset(data)
 
+    def __getattr__(self, name):
+        if name == '_data':
+            raise AttributeError(name)
+        try:
+            val = self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+        if isinstance(val, dict):
+            val = dict2obj(val)
+        elif isinstance(val, list):
+            val = [dict2obj(sj) if isinstance(sj, dict) else sj
+                   for sj in val]
+        self.__dict__[name] = val
+        return val
+
     def to_dict(self, **kwargs):
         _dict = dictset()
         _keys = kwargs.pop('_keys', [])
@@ -29,25 +50,28 @@ class DataProxy(object):
         return _dict
 
 
+# Map of {_type: DataProxy subclass}
+_proxy_classes = {}
+
+
+def get_proxy_cls(_type):
+    """ Get DataProxy subclass named :_type:.
+
+    Classes are created once per document type and cached.
+    """
+    try:
+        return _proxy_classes[_type]
+    except KeyError:
+        proxy_cls = type(_type, (DataProxy,), {})
+        return _proxy_classes.setdefault(_type, proxy_cls)
+
+
 def dict2obj(data):
     if not data:
         return data
 
     _type = str(data.get('_type'))
-    top = type(_type, (DataProxy,), {})(data)
-
-    for key, val in top._data.items():
-        key = str(key)
-        if isinstance(val, dict):
-            setattr(top, key, dict2obj(val))
-        elif isinstance(val, list):
-            setattr(
-                top, key,
-                [dict2obj(sj) if isinstance(sj, dict) else sj for sj in val])
-        else:
-            setattr(top, key, val)
-
-    return top
+    return get_proxy_cls(_type)(data)
 
 
 def to_objs(collection):
@@ -101,20 +125,35 @@ class FieldData(object):
 
     Is passed to field processors.
     """
-    def __init__(self, name, new_value, params=None):
+    def __init__(self, name, new_value, params=None, model=None):
         """
         :param name: Name of field.
         :param new_value: New value of field.
         :param params: Dict containing DB field init params.
             E.g. min_length, required.
+        :param model: Model class field belongs to. If provided and
+            :params: is not, params are loaded from model when accessed
+            for the first time.
         """
         self.name = name
         self.new_value = new_value
-        self.params = params
+        self._params = params
+        self._model = model
 
     def __repr__(self):
         return '<FieldData: {}>'.format(self.name)
 
+    @property
+    def params(self):
+        if self._params is None and self._model is not None:
+            self._params = self._model.get_field_params(self.name)
+            self._model = None
+        return self._params
+
+    @params.setter
+    def params(self, value):
+        self._params = value
+
     @classmethod
     def from_dict(cls, data, model):
         """ Generate map of `fieldName: clsInstance` from dict.
@@ -123,14 +162,7 @@ class FieldData(object):
             new values of field.
         :param model: Model class to which fields from :data: belong.
         """
-        model_provided = model is not None
         result = {}
         for name, new_value in data.items():
-            kwargs = {
-                'name': name,
-                'new_value': new_value,
-            }
-            if model_provided:
-                kwargs['params'] = model.get_field_params(name)
-            result[name] = cls(**kwargs)
+            result[name] = cls(name=name, new_value=new_value, model=model)
         return result
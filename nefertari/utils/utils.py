@@ -1,4 +1,5 @@
 import os
+import errno
 import logging
 import json
 from contextlib import contextmanager
@@ -208,3 +209,12 @@ def is_document(data):
         * Have '_type' key in it
     """
     return isinstance(data, dict) and '_type' in data
+
+
+def pid_exists(pid):
+    """ Check whether process with ID :pid: runs on current host. """
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        return ex.errno == errno.EPERM
+    return True
@@ -1,7 +1,7 @@
 import json
 import logging
 import simplejson
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 import six
 from six.moves import urllib
@@ -9,11 +9,12 @@ from pyramid.request import Request
 
 from nefertari.json_httpexceptions import (
     JHTTPBadRequest, JHTTPNotFound, JHTTPMethodNotAllowed)
-from nefertari.utils import dictset, merge_dicts, str2dict
+from nefertari.utils import dictset, merge_dicts, str2dict, dict2obj
 from nefertari import wrappers, engine
 from nefertari.resource import ACTIONS
 from nefertari.view_helpers import OptionsViewMixin, ESAggregator
 from nefertari.events import trigger_before_events
+from nefertari.timing import timed
 
 
 log = logging.getLogger(__name__)
@@ -38,6 +39,8 @@ class ViewMapper(object):
             view_obj = view(context, request)
             action = getattr(view_obj, action_name)
             request.action = action_name
+            # renderer reuses view instance to trigger after events
+            request.view_obj = view_obj
 
             # Tunneled collection PATCH/PUT doesn't support query params
             tunneled = getattr(request, '_tunneled_get', False)
@@ -50,8 +53,9 @@ class ViewMapper(object):
 
             try:
                 # run before_calls (validators) before running the action
-                for call in view_obj._before_calls.get(action_name, []):
-                    call(request=request)
+                with timed('before_calls'):
+                    for call in view_obj._before_calls.get(action_name, []):
+                        call(request=request)
 
             except wrappers.ValidationError as e:
                 log.error('validation error: %s', e)
@@ -61,8 +65,10 @@ class ViewMapper(object):
                 log.error('resource not found: %s', e)
                 raise JHTTPNotFound()
 
-            trigger_before_events(view_obj)
-            return action(**matchdict)
+            with timed('events'):
+                trigger_before_events(view_obj)
+            with timed('action'):
+                return action(**matchdict)
 
         return view_mapper_wrapper
 
@@ -108,6 +114,9 @@ class BaseView(OptionsViewMixin):
         """
         self.context = context
         self.request = request
+        self._affected_objects = None
+        # {pk: {field: value}} set by update_many events
+        self._items_json_params = {}
 
         self.prepare_request_params(_query_params, _json_params)
 
@@ -193,9 +202,86 @@ class BaseView(OptionsViewMixin):
         This is default implementation of querying ES collection with
         `self._query_params`. It must return found ES collection
         results for default response renderers to work properly.
+
+        If `elasticsearch.passthrough_source` setting is true, documents
+        are returned as plain dicts for `index` action, so they are
+        rendered without intermediate conversions.
+
+        If ES search cache is set up, responses of `index` and `show`
+        actions are cached per role of the current user. Other actions,
+        e.g. `update_many`, always query ES so they don't act on stale
+        results. See `ES.setup_search_cache`.
+        """
+        from nefertari.elasticsearch import ES
+        params = self._query_params.copy()
+        action = getattr(self.request, 'action', None)
+        if action == 'index':
+            if ES.settings and ES.settings.asbool('passthrough_source'):
+                params['_as_dicts'] = True
+        if ES.search_cache is not None and action in ('index', 'show'):
+            params['_cache_role'] = self._get_cache_role()
+        return ES(self.Model.__name__).get_collection(**params)
+
+    def iter_collection_es(self):
+        """ Generate ES documents matching `self._query_params`.
+
+        Unlike `get_collection_es`, documents are read from ES in chunks
+        and are not kept in memory, so this is the way to process all
+        documents matched by queries without `_limit`, e.g. in
+        `update_many` and `delete_many`.
         """
         from nefertari.elasticsearch import ES
-        return ES(self.Model.__name__).get_collection(**self._query_params)
+        params = self._query_params.copy()
+        return ES(self.Model.__name__).iter_collection(**params)
+
+    def get_affected_objects(self):
+        """ Get objects affected by `update_many` and `delete_many`.
+
+        Objects are loaded from DB in one query by IDs of ES documents
+        matching the request query, which are iterated over with
+        `iter_collection_es`. Loaded objects are kept on view, so
+        events subscribers and view method share them.
+        """
+        if self._affected_objects is None:
+            es_objects = self.iter_collection_es()
+            self._affected_objects = list(
+                self.Model.filter_objects(es_objects))
+        return self._affected_objects
+
+    def update_affected_objects(self):
+        """ Update objects affected by `update_many` with request params.
+
+        Per-object values set by events with `set_items_field_value`
+        are applied too. Objects that are updated with the same params
+        are updated in one call of `Model._update_many`.
+        """
+        objects = self.get_affected_objects()
+        if not self._items_json_params:
+            return self.Model._update_many(
+                objects, self._json_params, self.request)
+
+        pk_field = self.Model.pk_field()
+        groups = OrderedDict()
+        for obj in objects:
+            params = self._items_json_params.get(getattr(obj, pk_field))
+            key = json.dumps(params, sort_keys=True, default=str)
+            groups.setdefault(key, (params, []))[1].append(obj)
+        updated = 0
+        for params, group in groups.values():
+            group_params = self._json_params.copy()
+            group_params.update(params or {})
+            updated += self.Model._update_many(
+                group, group_params, self.request)
+        return updated
+
+    def delete_affected_objects(self):
+        """ Delete objects affected by `delete_many`. """
+        return self.Model._delete_many(
+            self.get_affected_objects(), self.request)
+
+    def _get_cache_role(self):
+        """ Get role of current user used in ES search cache keys. """
+        return wrappers.get_user_role(self.request)
 
     def fill_null_values(self):
         """ Fill missing model fields in JSON with {key: null value}.
@@ -341,12 +427,7 @@ class BaseView(OptionsViewMixin):
         if pk_field is None:
             pk_field = model.pk_field()
 
-        def _get_object(id_):
-            if hasattr(id_, 'pk_field'):
-                return id_
-
-            obj = model.get_item(
-                **{pk_field: id_, '_raise_on_empty': False})
+        def _check_object(id_, obj):
             if setdefault:
                 return obj or setdefault
             else:
@@ -354,17 +435,54 @@ class BaseView(OptionsViewMixin):
                     raise JHTTPBadRequest('id2obj: Object %s not found' % id_)
                 return obj
 
+        def _get_object(id_):
+            if hasattr(id_, 'pk_field'):
+                return id_
+
+            obj = model.get_item(
+                **{pk_field: id_, '_raise_on_empty': False})
+            return _check_object(id_, obj)
+
         ids = self._json_params[name]
         if not ids:
             return
         if isinstance(ids, list):
+            objects = self._get_objects_by_ids(model, pk_field, ids)
             self._json_params[name] = []
             for _id in ids:
-                obj = _id if _id is None else _get_object(_id)
+                if _id is None or hasattr(_id, 'pk_field'):
+                    obj = _id
+                elif objects is None:
+                    obj = _get_object(_id)
+                else:
+                    obj = _check_object(_id, objects.get(str(_id)))
                 self._json_params[name].append(obj)
         else:
             self._json_params[name] = ids if ids is None else _get_object(ids)
 
+    def _get_objects_by_ids(self, model, pk_field, ids):
+        """ Get objects of :model: with :pk_field: values from :ids: using
+        a single query of engine's `Model.filter_objects`.
+
+        Returns map of {str(pk): object} or None if objects should be
+        queried one by one: when there are less than two IDs to query,
+        :pk_field: is not the primary key of :model: or :model: does
+        not implement `filter_objects`.
+        """
+        ids = [_id for _id in ids
+               if _id is not None and not hasattr(_id, 'pk_field')]
+        if len(ids) < 2:
+            return None
+        filter_objects = getattr(model, 'filter_objects', None)
+        if filter_objects is None or pk_field != model.pk_field():
+            return None
+        try:
+            objects = filter_objects(
+                [dict2obj({pk_field: _id}) for _id in ids])
+        except NotImplementedError:
+            return None
+        return {str(getattr(obj, pk_field)): obj for obj in objects}
+
 
 def key_error_view(context, request):
     return JHTTPBadRequest("Bad or missing param '%s'" % context.args[0])
@@ -91,6 +91,8 @@ class obj2dict(object):
             # make sure its mutable, i.e list
             result = list(result)
             for ix, each in enumerate(result):
+                if isinstance(each, dict):
+                    continue
                 result[ix] = obj2dict(self.request)(
                     _fields=_fields, result=each)
 
@@ -127,6 +129,63 @@ class apply_request_privacy(object):
                 'Not enough permissions to update fields: {}'.format(ex))
 
 
+def get_user_role(request):
+    """ Get role of :request: user which determines fields visible to
+    the user: 'anonymous', 'authenticated' or 'admin'.
+    """
+    user = getattr(request, 'user', None)
+    if user is None:
+        return 'anonymous'
+    if type(user).is_admin(user):
+        return 'admin'
+    return 'authenticated'
+
+
+# Map of {(model_cls, authenticated, is_admin, drop_hidden): fields}
+_privacy_masks = {}
+
+ALWAYS_VISIBLE_FIELDS = frozenset(['_type', '_pk', '_self'])
+
+
+def get_privacy_mask(model_cls, authenticated, is_admin, drop_hidden):
+    """ Get set of fields of :model_cls: visible to a user.
+
+    Masks are computed once per combination of arguments and cached.
+    None is returned if all fields are visible.
+
+    :param model_cls: Model class.
+    :param authenticated: Boolean indicating whether user is
+        authenticated.
+    :param is_admin: Boolean indicating whether user is admin.
+    :param drop_hidden: Boolean indicating whether `_hidden_fields`
+        should be hidden.
+    """
+    key = (model_cls, authenticated, is_admin, drop_hidden)
+    try:
+        return _privacy_masks[key]
+    except KeyError:
+        pass
+
+    public_fields = set(getattr(model_cls, '_public_fields', None) or [])
+    auth_fields = set(getattr(model_cls, '_auth_fields', None) or [])
+    hidden_fields = set(getattr(model_cls, '_hidden_fields', None) or [])
+
+    if authenticated:
+        fields = None if is_admin else auth_fields
+    else:
+        fields = public_fields
+
+    if fields is not None:
+        if not drop_hidden:
+            fields |= hidden_fields
+        elif not is_admin:
+            fields -= hidden_fields
+        fields = frozenset(fields | ALWAYS_VISIBLE_FIELDS)
+
+    _privacy_masks[key] = fields
+    return fields
+
+
 class apply_privacy(object):
     """ Apply privacy rules to a JSON response.
 
@@ -145,6 +204,9 @@ class apply_privacy(object):
 
     If this wrapper is called without request, no filtering is performed.
     Fields visible to all types of users: '_self', '_type'.
+
+    Sets of visible fields are cached per model, user role and
+    `drop_hidden` value. See `get_privacy_mask`.
     """
     def __init__(self, request):
         self.request = request
@@ -158,33 +220,17 @@ class apply_privacy(object):
             log.error(str(ex))
             return data
 
-        public_fields = set(getattr(model_cls, '_public_fields', None) or [])
-        auth_fields = set(getattr(model_cls, '_auth_fields', None) or [])
-        hidden_fields = set(getattr(model_cls, '_hidden_fields', None) or [])
-        fields = set(data.keys())
-
-        user = getattr(self.request, 'user', None)
+        fields = None
         if self.request:
-            # User authenticated
-            if user:
-                # User not admin
-                if not self.is_admin:
-                    fields &= auth_fields
-
-            # User not authenticated
-            else:
-                fields &= public_fields
-
-            if self.drop_hidden:
-                if not self.is_admin:
-                    fields -= hidden_fields
-            else:
-                fields.update(hidden_fields)
-
-        fields.update(['_type', '_pk', '_self'])
-        if not isinstance(data, dictset):
+            authenticated = bool(getattr(self.request, 'user', None))
+            fields = get_privacy_mask(
+                model_cls, authenticated, bool(self.is_admin),
+                self.drop_hidden)
+
+        if fields is not None:
+            data = dictset([(k, v) for k, v in data.items() if k in fields])
+        elif not isinstance(data, dictset):
             data = dictset(data)
-        data = data.subset(fields)
 
         return self._apply_nested_privacy(data)
 
@@ -193,16 +239,11 @@ class apply_privacy(object):
 
         :param data: Dict of data to which privacy is already applied.
         """
-        kw = {
-            'is_admin': self.is_admin,
-            'drop_hidden': self.drop_hidden,
-        }
         for key, val in data.items():
             if is_document(val):
-                data[key] = apply_privacy(self.request)(result=val, **kw)
+                data[key] = self._filter_fields(val)
             elif isinstance(val, list) and val and is_document(val[0]):
-                data[key] = [apply_privacy(self.request)(result=doc, **kw)
-                             for doc in val]
+                data[key] = [self._filter_fields(doc) for doc in val]
         return data
 
     def __call__(self, **kwargs):
@@ -220,11 +261,8 @@ class apply_privacy(object):
                 user = getattr(self.request, 'user', None)
                 self.is_admin = user is not None and type(user).is_admin(user)
             if issequence(data) and not isinstance(data, dict):
-                kw = {
-                    'is_admin': self.is_admin,
-                    'drop_hidden': self.drop_hidden
-                }
-                data = [apply_privacy(self.request)(result=d, **kw)
+                data = [self._filter_fields(d)
+                        if isinstance(d, dict) and d else d
                         for d in data]
             else:
                 data = self._filter_fields(data)
@@ -81,18 +81,22 @@ class TestAuthModelMethodsMixin(object):
     @patch(mixin_path + 'get_item')
     def test_get_token_credentials(self, mock_res, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         user = Mock()
         user.api_key.token = 'foo-token'
         mock_res.return_value = user
-        token = models.AuthModelMethodsMixin.get_token_credentials('user1', 1)
+        token = models.AuthModelMethodsMixin.get_token_credentials(
+            'user1', request)
         assert token == 'foo-token'
         mock_res.assert_called_once_with(username='user1')
 
     @patch(mixin_path + 'get_item')
     def test_get_token_credentials_user_not_found(self, mock_res, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         mock_res.return_value = None
-        token = models.AuthModelMethodsMixin.get_token_credentials('user1', 1)
+        token = models.AuthModelMethodsMixin.get_token_credentials(
+            'user1', request)
         assert token is None
         mock_res.assert_called_once_with(username='user1')
 
@@ -101,40 +105,45 @@ class TestAuthModelMethodsMixin(object):
     def test_get_token_credentials_query_error(
             self, mock_res, mock_forg, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         mock_res.side_effect = Exception
-        token = models.AuthModelMethodsMixin.get_token_credentials('user1', 1)
+        token = models.AuthModelMethodsMixin.get_token_credentials(
+            'user1', request)
         assert token is None
         mock_res.assert_called_once_with(username='user1')
-        mock_forg.assert_called_once_with(1)
+        mock_forg.assert_called_once_with(request)
 
     @patch(mixin_path + 'get_item')
     def test_get_groups_by_token(self, mock_res, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         user = Mock(groups=['admin', 'user'])
         user.api_key.token = 'token'
         mock_res.return_value = user
         groups = models.AuthModelMethodsMixin.get_groups_by_token(
-            'user1', 'token', 1)
+            'user1', 'token', request)
         assert groups == ['g:admin', 'g:user']
         mock_res.assert_called_once_with(username='user1')
 
     @patch(mixin_path + 'get_item')
     def test_get_groups_by_token_user_not_found(self, mock_res, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         mock_res.return_value = None
         groups = models.AuthModelMethodsMixin.get_groups_by_token(
-            'user1', 'token', 1)
+            'user1', 'token', request)
         assert groups is None
         mock_res.assert_called_once_with(username='user1')
 
     @patch(mixin_path + 'get_item')
     def test_get_groups_by_token_wrong_token(self, mock_res, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         user = Mock(groups=['admin', 'user'])
         user.api_key.token = 'dasdasd'
         mock_res.return_value = user
         groups = models.AuthModelMethodsMixin.get_groups_by_token(
-            'user1', 'token', 1)
+            'user1', 'token', request)
         assert groups is None
         mock_res.assert_called_once_with(username='user1')
 
@@ -143,12 +152,13 @@ class TestAuthModelMethodsMixin(object):
     def test_get_groups_by_token_query_error(
             self, mock_res, mock_forg, engine_mock):
         from nefertari.authentication import models
+        request = Mock(_user=None)
         mock_res.side_effect = Exception
         groups = models.AuthModelMethodsMixin.get_groups_by_token(
-            'user1', 'token', 1)
+            'user1', 'token', request)
         assert groups is None
         mock_res.assert_called_once_with(username='user1')
-        mock_forg.assert_called_once_with(1)
+        mock_forg.assert_called_once_with(request)
 
     @patch(mixin_path + 'get_item')
     def test_authenticate_by_password(self, mock_res, engine_mock):
@@ -282,9 +292,50 @@ class TestAuthModelMethodsMixin(object):
             self, mock_res, mock_auth, engine_mock):
         from nefertari.authentication import models
         mock_auth.return_value = 'user1'
-        models.AuthModelMethodsMixin.get_authuser_by_name(1)
-        mock_auth.assert_called_once_with(1)
+        request = Mock(_user=None)
+        user = models.AuthModelMethodsMixin.get_authuser_by_name(request)
+        mock_auth.assert_called_once_with(request)
         mock_res.assert_called_once_with(username='user1')
+        assert user == request._user == mock_res()
+
+    @patch('nefertari.authentication.models.authenticated_userid')
+    @patch(mixin_path + 'get_item')
+    def test_get_authuser_by_name_cached(
+            self, mock_res, mock_auth, engine_mock):
+        from nefertari.authentication import models
+        mock_auth.return_value = 'user1'
+        request = Mock(_user=Mock(username='user1'))
+        user = models.AuthModelMethodsMixin.get_authuser_by_name(request)
+        assert user == request._user
+        assert not mock_res.called
+
+    @patch(mixin_path + 'get_item')
+    def test_get_groups_by_token_cached(self, mock_res, engine_mock):
+        from nefertari.authentication import models
+        user = Mock(groups=['admin', 'user'])
+        user.api_key.token = 'token'
+        mock_res.return_value = user
+        mixin = models.AuthModelMethodsMixin
+        with patch.object(models, 'auth_cache', models.TTLCache(ttl=10)):
+            groups = mixin.get_groups_by_token(
+                'user1', 'token', Mock(_user=None))
+            token = mixin.get_token_credentials('user1', Mock(_user=None))
+        assert groups == ['g:admin', 'g:user']
+        assert token == 'token'
+        mock_res.assert_called_once_with(username='user1')
+
+    def test_invalidate_auth_cache(self, engine_mock):
+        from nefertari.authentication import models
+        cache = models.TTLCache(ttl=10)
+        cache.set('user1', 1)
+        cache.set('user2', 2)
+        with patch.object(models, 'auth_cache', cache):
+            models.invalidate_auth_cache(
+                Mock(instance=Mock(username='user1'), fields={}))
+            assert cache.get('user1') is None
+            assert cache.get('user2') == 2
+            models.invalidate_auth_cache(Mock(instance=None, fields={}))
+            assert cache.get('user2') is None
 
     @patch('nefertari.authentication.models.authenticated_userid')
     @patch(mixin_path + 'get_item')
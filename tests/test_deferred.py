@@ -0,0 +1,143 @@
+import pytest
+from mock import Mock, patch, call
+
+from nefertari import deferred, events
+from nefertari.utils import FieldData
+
+
+class TestFreezeEvent(object):
+
+    def test_freeze_event(self):
+        view = Mock()
+        response = {'data': [{'id': 1}]}
+        event = events.AfterCreate(
+            model=None, view=view, response=response,
+            fields={'name': FieldData('name', ['a'])})
+        snapshot = deferred.freeze_event(event)
+        assert isinstance(snapshot, events.AfterCreate)
+        assert snapshot.view is None
+        assert snapshot.instance is None
+        assert snapshot.response == response
+        assert snapshot.response is not response
+        assert snapshot.fields['name'].new_value == ['a']
+        event.fields['name'].new_value.append('b')
+        assert snapshot.fields['name'].new_value == ['a']
+        assert event.view is view
+        assert snapshot._deferred_snapshot is None
+
+    def test_freeze_batch_event(self):
+        event = events.AfterUpdateMany(model=None, view=Mock(), fields={})
+        event.objects = [{'id': 1}]
+        snapshot = deferred.freeze_event(event)
+        assert snapshot.objects == [{'id': 1}]
+        assert snapshot.objects is not event.objects
+
+    def test_freeze_batch_event_objects_not_loaded(self):
+        view = Mock(_affected_objects=None)
+        event = events.AfterUpdateMany(model=None, view=view, fields={})
+        snapshot = deferred.freeze_event(event)
+        assert snapshot.objects is None
+        assert not view.get_affected_objects.called
+
+    def test_freeze_batch_event_objects_loaded_by_view(self):
+        view = Mock(_affected_objects=[{'id': 1}])
+        event = events.AfterDeleteMany(model=None, view=view, fields={})
+        snapshot = deferred.freeze_event(event)
+        assert snapshot.objects == [{'id': 1}]
+        assert not view.get_affected_objects.called
+
+
+class TestDeferredSubscribersPool(object):
+
+    def test_submit(self):
+        pool = deferred.DeferredSubscribersPool(workers=2)
+        subscriber = Mock()
+        pool.submit(subscriber, 1)
+        pool.submit(subscriber, 2)
+        pool.join()
+        assert sorted(c[0][0] for c in subscriber.call_args_list) == [1, 2]
+        assert len(pool._threads) == 2
+        pool.stop()
+        assert pool._threads == []
+
+    @patch('nefertari.deferred.metrics')
+    def test_submit_failure(self, mock_metrics):
+        pool = deferred.DeferredSubscribersPool(workers=1)
+        pool.submit(Mock(side_effect=ValueError), 1)
+        pool.join()
+        pool.stop()
+        mock_metrics.inc.assert_called_once_with(
+            'deferred_subscriber_calls_total', result='failure')
+
+    @patch('nefertari.deferred.metrics')
+    def test_submit_queue_full(self, mock_metrics):
+        pool = deferred.DeferredSubscribersPool(workers=1, queue_size=1)
+        pool._threads = [Mock()]
+        subscriber = Mock()
+        pool.submit(subscriber, 1)
+        assert not subscriber.called
+        pool.submit(subscriber, 2)
+        subscriber.assert_called_once_with(2)
+        mock_metrics.inc.assert_any_call('deferred_queue_overflows_total')
+        mock_metrics.set_gauge.assert_called_with('deferred_queue_depth', 1)
+
+
+class TestDeferSubscriber(object):
+
+    def test_get_deferred_pool(self):
+        registry = Mock(settings={
+            'events.deferred_workers': '3',
+            'events.deferred_queue_size': '10'})
+        registry._deferred_pool = None
+        pool = deferred.get_deferred_pool(registry)
+        assert pool.workers == 3
+        assert pool._queue.maxsize == 10
+        assert deferred.get_deferred_pool(registry) is pool
+
+    @patch('nefertari.deferred.freeze_event')
+    @patch('nefertari.deferred.get_deferred_pool')
+    def test_defer_subscriber(self, mock_pool, mock_freeze):
+        subscriber = Mock()
+        event = Mock(_deferred_snapshot=None)
+        wrapper = deferred.defer_subscriber(1, subscriber)
+        mock_pool.assert_called_once_with(1)
+        wrapper(event)
+        mock_freeze.assert_called_once_with(event)
+        mock_pool().submit.assert_called_once_with(
+            subscriber, mock_freeze())
+
+    @patch('nefertari.deferred.freeze_event')
+    @patch('nefertari.deferred.get_deferred_pool')
+    def test_defer_subscriber_freezes_event_once(
+            self, mock_pool, mock_freeze):
+        first, second = Mock(), Mock()
+        event = events.AfterIndex(
+            model=None, view=Mock(), response={'data': []}, fields={})
+        deferred.defer_subscriber(1, first)(event)
+        deferred.defer_subscriber(1, second)(event)
+        mock_freeze.assert_called_once_with(event)
+        mock_pool().submit.assert_has_calls([
+            call(first, mock_freeze()), call(second, mock_freeze())])
+
+    def test_subscribe_to_events_deferred(self):
+        from pyramid.config import Configurator
+        config = Configurator()
+        subscriber = Mock()
+        events.subscribe_to_events(
+            config, subscriber, [events.AfterCreate], deferred=True)
+        config.commit()
+        event = events.AfterCreate(
+            model=None, view=Mock(), response={'id': 1}, fields={})
+        config.registry.notify(event)
+        config.registry._deferred_pool.join()
+        config.registry._deferred_pool.stop()
+        snapshot = subscriber.call_args[0][0]
+        assert snapshot is not event
+        assert snapshot.response == {'id': 1}
+
+    def test_subscribe_to_events_deferred_before_event(self):
+        config = Mock()
+        with pytest.raises(ValueError):
+            events.subscribe_to_events(
+                config, Mock(), [events.BeforeCreate], deferred=True)
+        assert not config.add_subscriber.called
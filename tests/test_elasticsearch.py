@@ -15,18 +15,98 @@ class TestESHttpConnection(object):
     @patch('nefertari.elasticsearch.ESHttpConnection._catch_index_error')
     @patch('nefertari.elasticsearch.log')
     def test_perform_request_debug(self, mock_log, mock_catch):
-        mock_log.level = logging.DEBUG
+        mock_log.isEnabledFor.return_value = True
         conn = es.ESHttpConnection()
         conn.pool = Mock()
         conn.pool.urlopen.return_value = Mock(
             data=six.b('foo'), status=200)
         conn.perform_request('POST', 'http://localhost:9200')
-        mock_log.debug.assert_called_once_with(
-            "('POST', 'http://localhost:9200')")
+        mock_log.isEnabledFor.assert_called_once_with(logging.DEBUG)
+        fmt, msg = mock_log.debug.call_args[0]
+        assert fmt % msg == "('POST', 'http://localhost:9200')"
         conn.perform_request('POST', 'http://localhost:9200'*200)
-        assert mock_catch.called
+        fmt, msg = mock_log.debug.call_args[0]
+        assert '...TRUNCATED...' in fmt % msg
+        assert len(fmt % msg) == 527
+        assert not mock_catch.called
         assert mock_log.debug.call_count == 2
 
+    @patch('nefertari.elasticsearch.log')
+    def test_perform_request_debug_disabled(self, mock_log):
+        mock_log.isEnabledFor.return_value = False
+        conn = es.ESHttpConnection()
+        conn.pool = Mock()
+        conn.pool.urlopen.return_value = Mock(
+            data=six.b('foo'), status=200)
+        conn.perform_request('POST', 'http://localhost:9200')
+        assert not mock_log.debug.called
+
+    def test_perform_request_traced(self):
+        from nefertari.tracing import ESRequestTracer
+        conn = es.ESHttpConnection(http_compress=True)
+        conn.pool = Mock()
+        conn.pool.urlopen.return_value = Mock(
+            data=six.b('{}'), status=200)
+        tracer = Mock(spec=ESRequestTracer)
+        with patch.object(es.ES, 'tracer', tracer):
+            conn.perform_request('POST', '/_search', {'a': 1}, '{"b": 1}')
+        (method, url, params, body, duration, status), _ = \
+            tracer.record.call_args
+        assert (method, url, params, body, status) == (
+            'POST', '/_search', {'a': 1}, '{"b": 1}', 200)
+        assert duration >= 0
+
+    @patch('nefertari.elasticsearch.ESHttpConnection._catch_index_error')
+    def test_perform_request_bulk(self, mock_catch):
+        conn = es.ESHttpConnection()
+        conn.pool = Mock()
+        conn.pool.urlopen.return_value = Mock(
+            data=six.b('foo'), status=200)
+        conn.perform_request('GET', '/foondex/_search')
+        assert not mock_catch.called
+        resp = conn.perform_request('POST', '/_bulk')
+        mock_catch.assert_called_once_with(resp)
+        conn.perform_request('POST', '/foondex/Foo/_bulk', body='')
+        assert mock_catch.call_count == 2
+
+    @patch('nefertari.elasticsearch.json')
+    def test_catch_index_error_not_parsed(self, mock_json):
+        conn = es.ESHttpConnection()
+        conn._catch_index_error((
+            1, 2, '{"took":3,"errors":false,"items":[{"index": {}}]}'))
+        assert not mock_json.loads.called
+
+    def test_init_pool_options(self):
+        conn = es.ESHttpConnection(maxsize=3, pool_block=True)
+        assert conn.pool.block
+        assert not conn.http_compress
+        assert 'content-encoding' not in conn.headers
+        stats = conn.get_pool_stats()
+        assert stats['maxsize'] == 3
+        assert stats['in_use'] == 0
+        assert stats['connections_created'] == 0
+        assert stats['requests'] == 0
+
+    def test_perform_request_compressed(self):
+        import gzip
+        conn = es.ESHttpConnection(http_compress=True)
+        assert conn.headers['content-encoding'] == 'gzip'
+        assert 'gzip' in conn.headers['accept-encoding']
+        conn.pool = Mock()
+        conn.pool.urlopen.return_value = Mock(data=six.b('{}'), status=200)
+        conn.perform_request('POST', '/foo', None, '{"a": 1}')
+        body = conn.pool.urlopen.call_args[0][2]
+        assert gzip.GzipFile(fileobj=six.BytesIO(body)).read() == six.b(
+            '{"a": 1}')
+
+        conn.perform_request('POST', '/foo', body=six.b('{"a": 2}'))
+        body = conn.pool.urlopen.call_args[0][2]
+        assert gzip.GzipFile(fileobj=six.BytesIO(body)).read() == six.b(
+            '{"a": 2}')
+
+        conn.perform_request('GET', '/foo')
+        assert conn.pool.urlopen.call_args[0][2] is None
+
     def test_catch_index_error_no_data(self):
         conn = es.ESHttpConnection()
         try:
@@ -97,12 +177,15 @@ class TestHelperFunctions(object):
             '_source': True
         }
 
+    @patch('nefertari.elasticsearch.metrics')
     @patch('nefertari.elasticsearch.ES')
-    def test_includeme(self, mock_es):
+    def test_includeme(self, mock_es, mock_metrics):
         config = Mock()
         config.registry.settings = {'foo': 'bar'}
         es.includeme(config)
         mock_es.setup.assert_called_once_with({'foo': 'bar'})
+        mock_metrics.add_collector.assert_called_once_with(
+            mock_es.publish_pool_stats)
 
     def test_apply_sort(self):
         assert es.apply_sort('+foo,-bar ,zoo') == 'foo:asc,bar:desc,zoo:asc'
@@ -147,12 +230,89 @@ class TestHelperFunctions(object):
     @patch('nefertari.elasticsearch.ES')
     @patch('nefertari.elasticsearch.helpers')
     def test_bulk_body(self, mock_helpers, mock_es):
+        mock_es.search_cache = None
         mock_helpers.bulk.return_value = (1, [])
         request = Mock()
         request.params.mixed.return_value = {'_refresh_index': True}
         es._bulk_body('foo', request)
         mock_helpers.bulk.assert_called_once_with(
             client=mock_es.api, refresh=True, actions='foo')
+        mock_es.publish_pool_stats.assert_called_once_with()
+
+    @patch('nefertari.elasticsearch.ES')
+    @patch('nefertari.elasticsearch.helpers')
+    def test_bulk_body_timeout(self, mock_helpers, mock_es):
+        mock_es.search_cache = None
+        mock_es.settings = dictset(bulk_timeout='30')
+        mock_helpers.bulk.return_value = (1, [])
+        es._bulk_body('foo', None)
+        mock_helpers.bulk.assert_called_once_with(
+            client=mock_es.api, request_timeout=30.0, actions='foo')
+
+    @patch('nefertari.elasticsearch.ES')
+    @patch('nefertari.elasticsearch.helpers')
+    def test_bulk_body_invalidates_search_cache(self, mock_helpers, mock_es):
+        mock_helpers.bulk.side_effect = Exception()
+        actions = [
+            {'_index': 'foondex', '_type': 'Foo'},
+            {'_index': 'foondex', '_type': 'Bar'},
+            {'_index': 'foondex', '_type': 'Foo'},
+        ]
+        with pytest.raises(Exception):
+            es._bulk_body(actions, None)
+        mock_es.search_cache.invalidate.assert_called_once_with(
+            'foondex', {'Foo', 'Bar'})
+
+    def test_build_query_empty(self):
+        assert es.build_query(dictset({'foo': '_all'})) == {
+            'match_all': {}}
+
+    def test_build_query_raw_terms(self):
+        assert es.build_query(dictset(), _raw_terms='foo bar') == {
+            'bool': {'must': [{'query_string': {'query': 'foo bar'}}]}}
+
+    def test_build_query_exact_values(self):
+        query = es.build_query(dictset({
+            'a': 1, 'b': 'true', 'c': '-1.5', 'd': 'foo', '__e': 1}))
+        assert query == {'bool': {'filter': [
+            {'term': {'a': '1'}},
+            {'term': {'b': 'true'}},
+            {'term': {'c': '-1.5'}},
+            {'match': {'d': 'foo'}},
+        ]}}
+
+    def test_build_query_range(self):
+        query = es.build_query(dictset({
+            'a': '[1 TO 5}', 'b': '{2015-01-01 TO *]'}))
+        assert query == {'bool': {'filter': [
+            {'range': {'a': {'gte': '1', 'lt': '5'}}},
+            {'range': {'b': {'gt': '2015-01-01'}}},
+        ]}}
+
+    def test_build_query_lists(self):
+        query = es.build_query(dictset({
+            'a': [1, 2], 'b': ['foo', 3], 'c': ['foo bar', 'baz']}))
+        assert query == {'bool': {'filter': [
+            {'terms': {'a': ['1', '2']}},
+            {'bool': {'should': [
+                {'match': {'b': 'foo'}}, {'term': {'b': '3'}}],
+                'minimum_should_match': 1}},
+            {'query_string': {'query': 'c:foo bar OR c:baz'}},
+        ]}}
+
+    def test_build_query_negated(self):
+        query = es.build_query(dictset({'a': '(!foo)', 'b': '(!foo bar)'}))
+        assert query == {'bool': {
+            'filter': [{'query_string': {'query': 'b:(!foo bar)'}}],
+            'must_not': [{'match': {'a': 'foo'}}],
+        }}
+
+    def test_build_query_query_string_fallback(self):
+        query = es.build_query(dictset({'a': 'foo AND bar', 'b': 'ba*'}))
+        assert query == {'bool': {'filter': [
+            {'query_string': {'query': 'a:foo AND bar'}},
+            {'query_string': {'query': 'b:ba*'}},
+        ]}}
 
 
 class TestES(object):
@@ -189,6 +349,94 @@ class TestES(object):
         )
         assert es.ES.api == mock_es.Elasticsearch()
 
+    @patch('nefertari.elasticsearch.engine')
+    @patch('nefertari.elasticsearch.elasticsearch')
+    def test_setup_transport_params(self, mock_es, mock_engine):
+        settings = dictset({
+            'elasticsearch.hosts': '127.0.0.1:8080',
+            'elasticsearch.maxsize': '25',
+            'elasticsearch.pool_block': 'true',
+            'elasticsearch.timeout': '2.5',
+            'elasticsearch.http_compress': 'true',
+            'elasticsearch.max_retries': '5',
+            'elasticsearch.retry_on_timeout': 'true',
+            'elasticsearch.retry_on_status': '502,503',
+            'elasticsearch.dead_timeout': '30',
+        })
+        es.ES.setup(settings)
+        mock_es.Elasticsearch.assert_called_once_with(
+            hosts=[{'host': '127.0.0.1', 'port': '8080'}],
+            serializer=mock_engine.ESJSONSerializer(),
+            connection_class=es.ESHttpConnection,
+            maxsize=25, pool_block=True, timeout=2.5, http_compress=True,
+            max_retries=5, retry_on_timeout=True,
+            retry_on_status=(502, 503), dead_timeout=30.0,
+        )
+
+    def test_setup_tracer(self):
+        settings = es.ES.settings
+        try:
+            es.ES.settings = dictset(
+                slow_request_threshold='0.5', slow_request_buffer='10',
+                slow_request_sample_rate='0.1')
+            es.ES.setup_tracer()
+            tracer = es.ES.tracer
+        finally:
+            es.ES.settings = settings
+            es.ES.tracer = None
+        assert tracer.slow_threshold == 0.5
+        assert tracer._requests.maxlen == 10
+        assert tracer.sample_rate == 0.1
+        assert tracer.max_body_size == 2048
+
+    def test_get_pool_stats(self):
+        import elasticsearch
+        api = es.ES.api
+        try:
+            es.ES.api = elasticsearch.Elasticsearch(
+                hosts=[{'host': 'foo', 'port': 9200},
+                       {'host': 'bar', 'port': 9200}],
+                connection_class=es.ESHttpConnection, maxsize=4)
+            stats = es.ES.get_pool_stats()
+        finally:
+            es.ES.api = api
+        assert stats['dead'] == 0
+        assert sorted(c['host'] for c in stats['connections']) == [
+            'http://bar:9200', 'http://foo:9200']
+        assert all(c['maxsize'] == 4 for c in stats['connections'])
+
+    @patch('nefertari.elasticsearch.metrics')
+    def test_publish_pool_stats(self, mock_metrics):
+        mock_metrics.registry.enabled = True
+        stats = {
+            'connections': [{
+                'host': 'http://foo:9200', 'maxsize': 4, 'in_use': 1,
+                'connections_created': 2, 'requests': 3}],
+            'dead': 1,
+        }
+        api = es.ES.api
+        try:
+            es.ES.api = Mock()
+            with patch.object(es.ES, 'get_pool_stats', return_value=stats):
+                es.ES.publish_pool_stats()
+        finally:
+            es.ES.api = api
+        mock_metrics.set_gauge.assert_has_calls([
+            call('es_pool_maxsize', 4, host='http://foo:9200'),
+            call('es_pool_in_use', 1, host='http://foo:9200'),
+            call('es_pool_connections_created', 2, host='http://foo:9200'),
+            call('es_pool_requests', 3, host='http://foo:9200'),
+            call('es_dead_nodes', 1),
+        ])
+
+    @patch('nefertari.elasticsearch.metrics')
+    def test_publish_pool_stats_disabled(self, mock_metrics):
+        mock_metrics.registry.enabled = False
+        with patch.object(es.ES, 'get_pool_stats') as mock_stats:
+            es.ES.publish_pool_stats()
+        assert not mock_stats.called
+        assert not mock_metrics.set_gauge.called
+
     @patch('nefertari.elasticsearch.engine')
     @patch('nefertari.elasticsearch.elasticsearch')
     def test_setup_no_settings(self, mock_es, mock_engine):
@@ -221,6 +469,72 @@ class TestES(object):
         obj.process_chunks([], operation)
         assert not operation.called
 
+    @patch('nefertari.elasticsearch.ES.settings', dictset())
+    def test_process_chunks_parallel(self):
+        obj = es.ES('Foo', 'foondex', chunk_size=2, bulk_workers=3)
+        operation = Mock()
+        documents = [1, 2, 3, 4, 5]
+        obj.process_chunks(documents, operation)
+        assert operation.call_count == 3
+        operation.assert_has_calls([
+            call(documents_actions=[1, 2]),
+            call(documents_actions=[3, 4]),
+            call(documents_actions=[5]),
+        ], any_order=True)
+
+    @patch('nefertari.elasticsearch.ES.process_chunks_parallel')
+    def test_process_chunks_parallel_single_chunk(self, mock_parallel):
+        obj = es.ES('Foo', 'foondex', chunk_size=5, bulk_workers=3)
+        operation = Mock()
+        obj.process_chunks([1, 2, 3, 4, 5], operation)
+        operation.assert_called_once_with(documents_actions=[1, 2, 3, 4, 5])
+        assert not mock_parallel.called
+
+    @patch('nefertari.elasticsearch.ES.settings',
+           dictset({'bulk_queue_size': '4'}))
+    def test_process_chunks_parallel_reuses_threads(self):
+        obj = es.ES('Foo', 'foondex', chunk_size=1, bulk_workers=2)
+        obj.process_chunks([1, 2], Mock())
+        workers = es._get_bulk_workers(2, 4)
+        threads = list(workers._threads)
+        assert len(threads) == 2
+        operation = Mock()
+        obj.process_chunks([3, 4, 5], operation)
+        assert operation.call_count == 3
+        assert workers._threads == threads
+
+    def test_bulk_workers_restarted_after_fork(self):
+        workers = es._BulkWorkers(1, 2)
+        operation = Mock()
+        batch = es._BulkBatch(operation)
+        workers.submit(batch, 0, [1])
+        batch.wait()
+        parent_threads = list(workers._threads)
+        parent_tasks = workers._tasks
+        with patch('nefertari.elasticsearch.os.getpid') as mock_pid:
+            mock_pid.return_value = -1
+            batch = es._BulkBatch(operation)
+            workers.submit(batch, 1, [2])
+            batch.wait()
+        assert workers._pid == -1
+        assert len(workers._threads) == 1
+        assert workers._threads != parent_threads
+        assert workers._tasks is not parent_tasks
+        operation.assert_called_with(documents_actions=[2])
+
+    @patch('nefertari.elasticsearch.ES.settings',
+           dictset({'bulk_queue_size': '1'}))
+    def test_process_chunks_parallel_error(self):
+        obj = es.ES('Foo', 'foondex', chunk_size=1, bulk_workers=2)
+
+        def operation(documents_actions):
+            if documents_actions == [2]:
+                raise JHTTPBadRequest('bar')
+        operation = Mock(side_effect=operation)
+        with pytest.raises(JHTTPBadRequest):
+            obj.process_chunks([1, 2, 3], operation)
+        assert operation.call_count == 3
+
     def test_prep_bulk_documents_not_dict(self):
         obj = es.ES('Foo', 'foondex')
         with pytest.raises(ValueError) as ex:
@@ -302,6 +616,32 @@ class TestES(object):
         mock_prep.assert_called_once_with('myaction', ['a'])
         assert not mock_proc.called
 
+    @patch('nefertari.elasticsearch.ES.settings', dictset())
+    @patch('nefertari.elasticsearch.ES.prep_bulk_documents')
+    @patch('nefertari.elasticsearch.ES.process_chunks')
+    def test_bulk_queued(self, mock_proc, mock_prep):
+        obj = es.ES('Foo', 'foondex', chunk_size=1)
+        mock_prep.return_value = ['a']
+        with patch.object(es.ES, 'index_queue') as mock_queue:
+            obj._bulk('index', ['a'])
+        mock_queue.put.assert_called_once_with(['a'])
+        assert not mock_queue.flush.called
+        assert not mock_proc.called
+
+    @patch('nefertari.elasticsearch.ES.settings',
+           dictset({'enable_refresh_query': 'true'}))
+    @patch('nefertari.elasticsearch.ES.prep_bulk_documents')
+    @patch('nefertari.elasticsearch.ES.process_chunks')
+    def test_bulk_queued_refresh(self, mock_proc, mock_prep):
+        obj = es.ES('Foo', 'foondex', chunk_size=1)
+        mock_prep.return_value = ['a']
+        request = Mock(params={'_refresh_index': 'true'})
+        with patch.object(es.ES, 'index_queue') as mock_queue:
+            obj._bulk('index', ['a'], request=request)
+        assert not mock_queue.put.called
+        mock_queue.flush.assert_called_once_with()
+        assert mock_proc.called
+
     @patch('nefertari.elasticsearch.ES._bulk')
     def test_index(self, mock_bulk):
         obj = es.ES('Foo', 'foondex', chunk_size=4)
@@ -497,8 +837,10 @@ class TestES(object):
         )
         assert sorted(params.keys()) == sorted([
             'body', 'doc_type', 'from_', 'size', 'index'])
-        assert params['body'] == {
-            'query': {'query_string': {'query': 'foo:1 AND zoo:2 AND 5'}}}
+        assert params['body'] == {'query': {'bool': {
+            'filter': [{'term': {'foo': '1'}}, {'term': {'zoo': '2'}}],
+            'must': [{'query_string': {'query': '5'}}],
+        }}}
         assert params['index'] == 'foondex'
         assert params['doc_type'] == 'Foo'
 
@@ -514,16 +856,49 @@ class TestES(object):
     def test_build_search_params_no_limit(self):
         obj = es.ES('Foo', 'foondex')
         obj.api = Mock()
-        obj.api.count.return_value = {'count': 123}
         params = obj.build_search_params({'foo': 1})
         assert params == {
-            'body': {'query': {'query_string': {'query': 'foo:1'}}},
+            'body': {'query': {'bool': {'filter': [{'term': {'foo': '1'}}]}}},
             'doc_type': 'Foo',
-            'from_': 0,
             'index': 'foondex',
-            'size': 123
         }
-        obj.api.count.assert_called_once_with()
+        assert not obj.api.count.called
+
+    def test_build_search_params_no_limit_start(self):
+        obj = es.ES('Foo', 'foondex')
+        with pytest.raises(JHTTPBadRequest):
+            obj.build_search_params({'foo': 1, '_start': 5})
+        with pytest.raises(JHTTPBadRequest):
+            obj.build_search_params({'foo': 1, '_page': 2})
+
+    def test_build_search_params_cursor_first_page(self):
+        obj = es.ES('Foo', 'foondex')
+        params = obj.build_search_params({
+            'foo': 1, '_cursor': '', '_limit': 10, '_sort': '-a',
+            '_start': 20})
+        assert params['from_'] == 0
+        assert params['size'] == 10
+        assert params['sort'] == 'a:desc,_uid:asc'
+        assert 'search_after' not in params['body']
+
+    def test_build_search_params_cursor(self):
+        obj = es.ES('Foo', 'foondex')
+        body = {'query': {'match_all': {}}}
+        cursor = es.encode_cursor([3, 'Foo#1'])
+        params = obj.build_search_params({
+            'body': body, '_cursor': cursor, '_limit': 10})
+        assert params['body'] == {
+            'query': {'match_all': {}}, 'search_after': [3, 'Foo#1']}
+        assert 'search_after' not in body
+        assert params['sort'] == '_uid:asc'
+
+    def test_build_search_params_bad_cursor(self):
+        obj = es.ES('Foo', 'foondex')
+        with pytest.raises(JHTTPBadRequest):
+            obj.build_search_params({'_cursor': 'foo', '_limit': 1})
+        with pytest.raises(JHTTPBadRequest):
+            obj.build_search_params({
+                '_cursor': es.encode_cursor({'a': 1}), '_limit': 1})
 
     def test_build_search_params_sort(self):
         obj = es.ES('Foo', 'foondex')
@@ -532,7 +907,7 @@ class TestES(object):
         assert sorted(params.keys()) == sorted([
             'body', 'doc_type', 'index', 'sort', 'from_', 'size'])
         assert params['body'] == {
-            'query': {'query_string': {'query': 'foo:1'}}}
+            'query': {'bool': {'filter': [{'term': {'foo': '1'}}]}}}
         assert params['index'] == 'foondex'
         assert params['doc_type'] == 'Foo'
         assert params['sort'] == 'a:asc,b:desc,c:asc'
@@ -544,7 +919,7 @@ class TestES(object):
         assert sorted(params.keys()) == sorted([
             'body', 'doc_type', 'index', 'fields', 'from_', 'size'])
         assert params['body'] == {
-            'query': {'query_string': {'query': 'foo:1'}}}
+            'query': {'bool': {'filter': [{'term': {'foo': '1'}}]}}}
         assert params['index'] == 'foondex'
         assert params['doc_type'] == 'Foo'
         assert params['fields'] == ['a']
@@ -552,15 +927,32 @@ class TestES(object):
     def test_build_search_params_search_fields(self):
         obj = es.ES('Foo', 'foondex')
         params = obj.build_search_params({
-            'foo': 1, '_search_fields': 'a,b', '_limit': 10})
+            'foo': 1, 'q': 'bar', '_search_fields': 'a,b', '_limit': 10})
         assert sorted(params.keys()) == sorted([
             'body', 'doc_type', 'from_', 'size', 'index'])
-        assert params['body'] == {'query': {'query_string': {
-            'fields': ['b^1', 'a^2'],
-            'query': 'foo:1'}}}
+        assert params['body'] == {'query': {'bool': {
+            'filter': [{'term': {'foo': '1'}}],
+            'must': [{'query_string': {
+                'fields': ['b^1', 'a^2'],
+                'query': 'bar'}}],
+        }}}
         assert params['index'] == 'foondex'
         assert params['doc_type'] == 'Foo'
 
+    def test_build_search_params_search_fields_without_q(self):
+        obj = es.ES('Foo', 'foondex')
+        params = obj.build_search_params({
+            'foo': 1, 'bar': 'baz qux', '_search_fields': 'a,b',
+            '_limit': 10})
+        assert params['body'] == {'query': {'bool': {
+            'filter': [
+                {'query_string': {
+                    'fields': ['b^1', 'a^2'],
+                    'query': 'bar:baz qux'}},
+                {'term': {'foo': '1'}},
+            ],
+        }}}
+
     def test_build_search_params_with_body(self):
         obj = es.ES('Foo', 'foondex')
         params = obj.build_search_params({
@@ -669,7 +1061,7 @@ class TestES(object):
         obj.get_collection(_count=True, foo=1, body={'foo': 'bar'})
         mock_count.assert_called_once_with({
             'body': {'foo': 'bar'}, 'doc_type': 'Foo',
-            'from_': 0, 'size': 1, 'index': 'foondex'})
+            'index': 'foondex'})
 
     @patch('nefertari.elasticsearch.ES.api.search')
     def test_get_collection_fields(self, mock_search):
@@ -683,7 +1075,7 @@ class TestES(object):
             'took': 2.8,
         }
         docs = obj.get_collection(
-            _fields=['foo'], body={'foo': 'bar'}, from_=0)
+            _fields=['foo'], body={'foo': 'bar'}, _limit=1)
         mock_search.assert_called_once_with(
             body={'foo': 'bar'}, doc_type='Foo', index='foondex',
             _source_include=['foo', '_type'], _source=True,
@@ -712,7 +1104,7 @@ class TestES(object):
             },
             'took': 2.8,
         }
-        docs = obj.get_collection(body={'foo': 'bar'}, from_=0)
+        docs = obj.get_collection(body={'foo': 'bar'}, _limit=1)
         mock_search.assert_called_once_with(
             body={'foo': 'bar'}, doc_type='Foo', from_=0, size=1,
             index='foondex')
@@ -726,6 +1118,27 @@ class TestES(object):
         assert docs._nefertari_meta['fields'] == ''
         assert docs._nefertari_meta['took'] == 2.8
 
+    @patch('nefertari.elasticsearch.ES.api.search')
+    def test_get_collection_as_dicts(self, mock_search):
+        obj = es.ES('Foo', 'foondex')
+        source = {'foo': 'bar', 'id': 1}
+        mock_search.return_value = {
+            'hits': {
+                'hits': [{'_source': source, '_score': 2, '_type': 'Zoo'}],
+                'total': 4,
+            },
+            'took': 2.8,
+        }
+        docs = obj.get_collection(
+            body={'foo': 'bar'}, _limit=1, _as_dicts=True)
+        mock_search.assert_called_once_with(
+            body={'foo': 'bar'}, doc_type='Foo', from_=0, size=1,
+            index='foondex')
+        assert len(docs) == 1
+        assert docs[0] is source
+        assert docs[0] == {'foo': 'bar', 'id': 1, '_score': 2, '_type': 'Zoo'}
+        assert docs._nefertari_meta['total'] == 4
+
     @patch('nefertari.elasticsearch.ES.api.search')
     def test_get_collection_no_index_raise(self, mock_search):
         obj = es.ES('Foo', 'foondex')
@@ -733,7 +1146,7 @@ class TestES(object):
         with pytest.raises(JHTTPNotFound) as ex:
             obj.get_collection(
                 body={'foo': 'bar'}, _raise_on_empty=True,
-                from_=0)
+                _limit=1)
         assert 'resource not found (Index does not exist)' in str(ex.value)
 
     @patch('nefertari.elasticsearch.ES.api.search')
@@ -743,7 +1156,7 @@ class TestES(object):
         try:
             docs = obj.get_collection(
                 body={'foo': 'bar'}, _raise_on_empty=False,
-                from_=0)
+                _limit=1)
         except JHTTPNotFound:
             raise Exception('Unexpected error')
         assert len(docs) == 0
@@ -761,7 +1174,7 @@ class TestES(object):
         with pytest.raises(JHTTPNotFound):
             obj.get_collection(
                 body={'foo': 'bar'}, _raise_on_empty=True,
-                from_=0)
+                _limit=1)
 
     @patch('nefertari.elasticsearch.ES.api.search')
     def test_get_collection_not_found_not_raise(self, mock_search):
@@ -776,11 +1189,140 @@ class TestES(object):
         try:
             docs = obj.get_collection(
                 body={'foo': 'bar'}, _raise_on_empty=False,
-                from_=0)
+                _limit=1)
         except JHTTPNotFound:
             raise Exception('Unexpected error')
         assert len(docs) == 0
 
+    def test_get_collection_no_limit_scrolls(self):
+        obj = es.ES('Foo', 'foondex', chunk_size=2)
+        obj.api = Mock()
+
+        def page(ids, total=3):
+            return {
+                '_scroll_id': 'sid',
+                'hits': {
+                    'hits': [{'_source': {'id': i}, '_score': 1,
+                              '_type': 'Foo'} for i in ids],
+                    'total': total,
+                },
+                'took': 1,
+            }
+        obj.api.search.return_value = page([1, 2])
+        obj.api.scroll.side_effect = [page([3]), page([])]
+        docs = obj.get_collection(body={'foo': 'bar'})
+        assert [d.id for d in docs] == [1, 2, 3]
+        assert docs._nefertari_meta['total'] == 3
+        assert docs._nefertari_meta['took'] == 2
+        obj.api.search.assert_called_once_with(
+            body={'foo': 'bar'}, doc_type='Foo', index='foondex',
+            size=2, scroll='1m')
+        obj.api.scroll.assert_called_with(scroll_id='sid', scroll='1m')
+        obj.api.clear_scroll.assert_called_once_with(scroll_id='sid')
+        assert not obj.api.count.called
+
+    def test_get_collection_no_limit_start(self):
+        obj = es.ES('Foo', 'foondex', chunk_size=2)
+        obj.api = Mock()
+        with pytest.raises(JHTTPBadRequest):
+            obj.get_collection(body={'foo': 'bar'}, _start=3)
+        with pytest.raises(JHTTPBadRequest):
+            list(obj.iter_collection(body={'foo': 'bar'}, _start=3))
+        assert not obj.api.search.called
+
+    def test_get_collection_cursor(self):
+        obj = es.ES('Foo', 'foondex')
+        obj.api = Mock()
+        obj.api.search.return_value = {
+            'took': 1,
+            'hits': {'total': 3, 'hits': [
+                {'_source': {'id': i}, '_score': 1, '_type': 'Foo',
+                 'sort': ['Foo#{}'.format(i)]} for i in (1, 2)]}}
+        docs = obj.get_collection(_cursor='', _limit=2)
+        assert [d.id for d in docs] == [1, 2]
+        cursor = docs._nefertari_meta['next_cursor']
+        assert es.decode_cursor(cursor) == ['Foo#2']
+
+        obj.api.search.return_value = {
+            'took': 1,
+            'hits': {'total': 3, 'hits': [
+                {'_source': {'id': 3}, '_score': 1, '_type': 'Foo',
+                 'sort': ['Foo#3']}]}}
+        docs = obj.get_collection(_cursor=cursor, _limit=2)
+        assert obj.api.search.call_args[1]['body']['search_after'] == [
+            'Foo#2']
+        assert docs._nefertari_meta['next_cursor'] is None
+
+    def test_get_collection_cached(self):
+        from nefertari.search_cache import SearchCache, MemoryCacheBackend
+        obj = es.ES('Foo', 'foondex')
+        obj.api = Mock()
+        obj.api.search.return_value = {
+            'took': 1,
+            'hits': {'total': 1, 'hits': [
+                {'_source': {'id': 1}, '_score': 1, '_type': 'Foo'}]}}
+        obj.search_cache = SearchCache(MemoryCacheBackend())
+        docs = obj.get_collection(_limit=1, _cache_role='admin')
+        docs = obj.get_collection(_limit=1, _cache_role='admin')
+        assert docs[0].id == 1
+        assert obj.api.search.call_count == 1
+
+        obj.get_collection(_limit=1, _cache_role='anonymous')
+        assert obj.api.search.call_count == 2
+        obj.get_collection(_limit=1)
+        assert obj.api.search.call_count == 3
+
+        obj.search_cache.invalidate('foondex', ['Foo'])
+        obj.get_collection(_limit=1, _cache_role='admin')
+        assert obj.api.search.call_count == 4
+
+    @patch('nefertari.search_cache.time')
+    def test_get_collection_not_cached_before_refresh(self, mock_time):
+        from nefertari.search_cache import SearchCache, MemoryCacheBackend
+        obj = es.ES('Foo', 'foondex')
+        obj.api = Mock()
+        obj.api.search.return_value = {
+            'took': 1, 'hits': {'total': 0, 'hits': []}}
+        obj.search_cache = SearchCache(
+            MemoryCacheBackend(), refresh_interval=1)
+        mock_time.time.return_value = 100
+        obj.search_cache.invalidate('foondex', ['Foo'])
+        mock_time.time.return_value = 100.5
+        obj.get_collection(_limit=1, _cache_role='admin')
+        obj.get_collection(_limit=1, _cache_role='admin')
+        assert obj.api.search.call_count == 2
+
+        mock_time.time.return_value = 101.5
+        obj.get_collection(_limit=1, _cache_role='admin')
+        obj.get_collection(_limit=1, _cache_role='admin')
+        assert obj.api.search.call_count == 3
+
+    def test_iter_collection(self):
+        obj = es.ES('Foo', 'foondex', chunk_size=1)
+        obj.api = Mock()
+        obj.api.search.return_value = {
+            '_scroll_id': 'sid', 'took': 1,
+            'hits': {'total': 2, 'hits': [
+                {'_source': {'id': 1}, '_score': 1, '_type': 'Foo'}]}}
+        obj.api.scroll.side_effect = [
+            {'_scroll_id': 'sid', 'took': 1,
+             'hits': {'total': 2, 'hits': [
+                 {'_source': {'id': 2}, '_score': 1, '_type': 'Foo'}]}},
+            {'_scroll_id': 'sid', 'took': 1,
+             'hits': {'total': 2, 'hits': []}},
+        ]
+        docs = obj.iter_collection(foo=1, _as_dicts=True)
+        assert next(docs) == {'id': 1, '_score': 1, '_type': 'Foo'}
+        assert not obj.api.scroll.called
+        assert [d['id'] for d in docs] == [2]
+        obj.api.clear_scroll.assert_called_once_with(scroll_id='sid')
+
+    def test_iter_collection_no_index(self):
+        obj = es.ES('Foo', 'foondex')
+        obj.api = Mock()
+        obj.api.search.side_effect = es.IndexNotFoundException()
+        assert list(obj.iter_collection(_limit=10)) == []
+
     @patch('nefertari.elasticsearch.ES.api.get_source')
     def test_get_item(self, mock_get):
         obj = es.ES('Foo', 'foondex')
@@ -1,6 +1,7 @@
 from mock import patch, Mock, call
 
 from nefertari import events
+from nefertari.utils import FieldData
 
 
 class TestEvents(object):
@@ -67,6 +68,77 @@ class TestEvents(object):
         assert {'foo': 3, 'bar': 5} in event.response['data']
 
 
+class TestBatchEvents(object):
+    def test_objects(self):
+        view = Mock()
+        view.get_affected_objects.return_value = [1, 2]
+        event = events.AfterDeleteMany(model=None, view=view)
+        assert event.objects == [1, 2]
+        assert event.objects == [1, 2]
+        view.get_affected_objects.assert_called_once_with()
+        event.objects = [3]
+        assert event.objects == [3]
+
+    def test_objects_no_view(self):
+        event = events.AfterDeleteMany(model=None, view=None)
+        assert event.objects is None
+
+    def test_set_items_field_value_saved_by_view(self):
+        from pyramid.config import Configurator
+        from nefertari.view import BaseView
+
+        class StoriesView(BaseView):
+            def update_many(self):
+                return self.update_affected_objects()
+
+        def set_rank(event):
+            event.set_items_field_value('rank', lambda obj: obj.id * 10)
+
+        config = Configurator()
+        config.add_subscriber(set_rank, events.BeforeUpdateMany)
+        config.commit()
+        config.registry._model_collections = {}
+        objects = [Mock(id=1), Mock(id=2)]
+        model = Mock(__name__='Story')
+        model.pk_field.return_value = 'id'
+        model.get_field_params.return_value = {}
+        model.filter_objects.return_value = objects
+        model._update_many.side_effect = lambda items, *a: len(items)
+        request = Mock(
+            content_type='', method='', accept=[''], user=None,
+            action='update_many', registry=config.registry)
+        view = StoriesView(
+            context={}, request=request, _query_params={'id': '1,2'})
+        view.Model = model
+        view._json_params = {'name': 'foo'}
+        view.iter_collection_es = Mock()
+
+        events.trigger_before_events(view)
+        assert view.update_many() == 2
+        model._update_many.assert_has_calls([
+            call([objects[0]], {'name': 'foo', 'rank': 10}, request),
+            call([objects[1]], {'name': 'foo', 'rank': 20}, request),
+        ], any_order=True)
+        assert model._update_many.call_count == 2
+
+    def test_set_items_field_value_dict(self):
+        view = Mock(_items_json_params={1: {'name': 'a'}})
+        event = events.BeforeUpdateMany(model=None, view=view, fields={})
+        event.set_items_field_value('age', {1: 10, 2: 20})
+        assert view._items_json_params == {
+            1: {'name': 'a', 'age': 10}, 2: {'age': 20}}
+
+    def test_set_items_field_value_callable(self):
+        model = Mock()
+        model.pk_field.return_value = 'id'
+        view = Mock(_items_json_params={})
+        view.get_affected_objects.return_value = [
+            Mock(id=1, age=1), Mock(id=2, age=2)]
+        event = events.BeforeUpdateMany(model=model, view=view, fields={})
+        event.set_items_field_value('age', lambda obj: obj.age + 1)
+        assert view._items_json_params == {1: {'age': 2}, 2: {'age': 3}}
+
+
 class TestHelperFunctions(object):
     def test_get_event_kwargs_no_trigger(self):
         view = Mock(index=Mock(_silent=True), _silent=True)
@@ -101,29 +173,75 @@ class TestHelperFunctions(object):
         evt = events._get_event_cls(view, events.AFTER_EVENTS)
         assert evt is events.AfterIndex
 
-    @patch('nefertari.events._get_event_cls')
+    @patch('nefertari.events.get_triggered_event_cls')
     @patch('nefertari.events._get_event_kwargs')
-    def test_trigger_events_no_kw(self, mock_kw, mock_cls):
-        mock_cls.return_value = events.AfterIndex
+    def test_trigger_events_not_triggered(self, mock_kw, mock_cls):
+        mock_cls.return_value = None
         view = Mock()
-        mock_kw.return_value = None
-        events._trigger_events(view, events.AFTER_EVENTS)
-        assert not mock_cls.called
-        mock_kw.assert_called_once_with(view)
-
-    @patch('nefertari.events._get_event_cls')
+        res = events._trigger_events(view, events.AFTER_EVENTS)
+        assert res is None
+        mock_cls.assert_called_once_with(
+            view, view.request, events.AFTER_EVENTS)
+        assert not mock_kw.called
+        assert not view.request.registry.notify.called
+
+    @patch('nefertari.events.get_triggered_event_cls')
     @patch('nefertari.events._get_event_kwargs')
     def test_trigger_events(self, mock_kw, mock_cls):
         view = Mock()
         mock_kw.return_value = {'foo': 1}
         res = events._trigger_events(view, events.AFTER_EVENTS, {'bar': 2})
         mock_kw.assert_called_once_with(view)
-        mock_cls.assert_called_once_with(view, events.AFTER_EVENTS)
+        mock_cls.assert_called_once_with(
+            view, view.request, events.AFTER_EVENTS)
         evt = mock_cls()
         evt.assert_called_once_with(foo=1, bar=2)
         view.request.registry.notify.assert_called_once_with(evt())
         assert res == evt()
 
+    @patch('nefertari.events.metrics')
+    @patch('nefertari.events.get_triggered_event_cls')
+    @patch('nefertari.events._get_event_kwargs')
+    def test_trigger_events_metrics(self, mock_kw, mock_cls, mock_metrics):
+        mock_metrics.registry.enabled = True
+        mock_cls.return_value = events.BeforeCreate
+        view = Mock()
+        view.request.registry.adapters.subscriptions.return_value = [1, 2]
+        mock_kw.return_value = {'model': Mock(), 'view': view}
+        events._trigger_events(view, events.BEFORE_EVENTS)
+        mock_metrics.inc.assert_called_once_with(
+            'events_triggered_total', event='BeforeCreate')
+        mock_metrics.observe.assert_called_once_with(
+            'event_subscribers', 2, event='BeforeCreate')
+        mock_metrics.timer.assert_called_once_with(
+            'event_duration_seconds', event='BeforeCreate')
+        assert view.request.registry.notify.called
+
+    def test_get_triggered_event_cls_silent(self):
+        view = Mock(index=Mock(_silent=True))
+        request = Mock(action='index')
+        assert events.get_triggered_event_cls(
+            view, request, events.BEFORE_EVENTS) is None
+
+    def test_get_triggered_event_cls_no_subscribers(self):
+        view = Mock(index=Mock(_silent=False, _event_action=None),
+                    _silent=False)
+        request = Mock(action='index')
+        index = request.registry._subscriber_index
+        index.has_subscribers.return_value = False
+        assert events.get_triggered_event_cls(
+            view, request, events.BEFORE_EVENTS) is None
+        index.has_subscribers.assert_called_once_with(
+            events.BeforeIndex, view.Model)
+
+    def test_get_triggered_event_cls(self):
+        view = Mock(index=Mock(_silent=False, _event_action=None),
+                    _silent=False)
+        request = Mock(action='index')
+        request.registry._subscriber_index.has_subscribers.return_value = True
+        assert events.get_triggered_event_cls(
+            view, request, events.BEFORE_EVENTS) is events.BeforeIndex
+
     @patch('nefertari.events._trigger_events')
     def test_trigger_before_events(self, mock_trig):
         view = Mock()
@@ -131,6 +249,27 @@ class TestHelperFunctions(object):
         mock_trig.assert_called_once_with(view, events.BEFORE_EVENTS)
         assert res == mock_trig()
 
+    @patch('nefertari.events.get_triggered_event_cls')
+    @patch('nefertari.events._trigger_events')
+    def test_trigger_before_events_delete_many(self, mock_trig, mock_cls):
+        view = Mock()
+        view.request.action = 'delete_many'
+        events.trigger_before_events(view)
+        mock_cls.assert_called_once_with(
+            view, view.request, events.AFTER_EVENTS)
+        view.get_affected_objects.assert_called_once_with()
+        mock_trig.assert_called_once_with(view, events.BEFORE_EVENTS)
+
+    @patch('nefertari.events.get_triggered_event_cls')
+    @patch('nefertari.events._trigger_events')
+    def test_trigger_before_events_delete_many_no_subscribers(
+            self, mock_trig, mock_cls):
+        mock_cls.return_value = None
+        view = Mock()
+        view.request.action = 'delete_many'
+        events.trigger_before_events(view)
+        assert not view.get_affected_objects.called
+
     @patch('nefertari.events._trigger_events')
     def test_trigger_after_events(self, mock_trig):
         view = Mock()
@@ -169,33 +308,99 @@ class TestHelperFunctions(object):
         assert foo._event_action == 'foobar'
 
     def test_add_field_processors(self):
-        event = Mock()
-        event.field.new_value = 'admin'
-        config = Mock()
+        from pyramid.config import Configurator
+        config = Configurator()
         processor = Mock(return_value='user12')
 
+        class User(object):
+            pass
+
         events.add_field_processors(
             config, [processor, processor],
-            model='User', field='username')
-        assert config.add_subscriber.call_count == 5
-        assert not event.set_field_value.called
+            model=User, field='username')
+        config.commit()
+        dispatcher = events.get_field_processors(config.registry)
+        assert dispatcher.get_processors(User) == {
+            'username': [(processor, processor)]}
         assert not processor.called
 
-        last_call = config.add_subscriber.mock_calls[0]
-        wrapper = last_call[1][0]
-        wrapper(event)
-        event.set_field_value.assert_called_once_with(
-            'username', 'user12')
-        assert event.field.new_value == 'user12'
+        view = Mock(_json_params={'username': 'admin'})
+        event = events.BeforeCreate(
+            model=User, view=view,
+            fields={'username': FieldData('username', 'admin')})
+        config.registry.notify(event)
+        assert view._json_params == {'username': 'user12'}
+        assert event.fields['username'].new_value == 'user12'
+        assert event.field is event.fields['username']
 
         processor.assert_has_calls([
             call(new_value='admin', instance=event.instance,
-                 field=event.field, request=event.view.request,
-                 model=event.model, event=event),
+                 field=event.field, request=view.request,
+                 model=User, event=event),
             call(new_value='user12', instance=event.instance,
-                 field=event.field, request=event.view.request,
-                 model=event.model, event=event),
+                 field=event.field, request=view.request,
+                 model=User, event=event),
         ])
+        index = events.get_subscriber_index(config.registry)
+        assert index.has_subscribers(events.BeforeCreate, User)
+        assert not index.has_subscribers(events.BeforeCreate, object)
+
+
+class TestFieldProcessors(object):
+    def _make_event(self, model, **fields):
+        view = Mock(_json_params=dict(fields))
+        return events.BeforeUpdate(
+            model=model, view=view,
+            fields=FieldData.from_dict(fields, None))
+
+    def test_get_processors_inherited(self):
+        class A(object):
+            pass
+
+        class B(A):
+            pass
+
+        dispatcher = events.FieldProcessors()
+        dispatcher.add(B, 'name', [1])
+        dispatcher.add(A, 'name', [2])
+        dispatcher.add(A, 'age', [3])
+        assert dispatcher.get_processors(A) == {
+            'name': [(2,)], 'age': [(3,)]}
+        assert dispatcher.get_processors(B) == {
+            'name': [(1,), (2,)], 'age': [(3,)]}
+        assert dispatcher.get_processors(object) == {}
+
+    def test_call_only_present_fields(self):
+        class A(object):
+            pass
+
+        name_proc = Mock(return_value='b')
+        age_proc = Mock(return_value=2)
+        dispatcher = events.FieldProcessors()
+        dispatcher.add(A, 'name', [name_proc])
+        dispatcher.add(A, 'age', [age_proc])
+        event = self._make_event(A, name='a')
+        dispatcher(event)
+        assert name_proc.call_count == 1
+        assert not age_proc.called
+        assert event.view._json_params == {'name': 'b'}
+
+    def test_call_fields_set_by_processors(self):
+        class A(object):
+            pass
+
+        def name_proc(event, **kwargs):
+            event.set_field_value('age', 1)
+            return kwargs['new_value']
+
+        age_proc = Mock(return_value=2)
+        dispatcher = events.FieldProcessors()
+        dispatcher.add(A, 'name', [name_proc])
+        dispatcher.add(A, 'age', [age_proc])
+        event = self._make_event(A, name='a')
+        dispatcher(event)
+        assert age_proc.call_count == 1
+        assert event.view._json_params == {'name': 'a', 'age': 2}
 
 
 class TestModelClassIs(object):
@@ -245,3 +450,62 @@ class TestFieldIsChanged(object):
         assert event.field is None
         assert not predicate(event)
         assert event.field is None
+
+
+class TestSubscriberIndex(object):
+    def _make_config(self):
+        from pyramid.config import Configurator
+        config = Configurator()
+        config.add_subscriber_predicate('model', events.ModelClassIs)
+        config.add_subscriber_predicate('field', events.FieldIsChanged)
+        config.add_directive('subscribe_to_events', events.subscribe_to_events)
+        return config
+
+    def test_no_subscribers(self):
+        config = self._make_config()
+        config.commit()
+        index = events.get_subscriber_index(config.registry)
+        assert not index.has_subscribers(events.BeforeIndex, None)
+
+    def test_model_subscribers(self):
+        class A(object):
+            pass
+
+        class B(A):
+            pass
+
+        class C(object):
+            pass
+
+        config = self._make_config()
+        config.subscribe_to_events(
+            lambda e: None, [events.BeforeCreate], model=A)
+        config.commit()
+        index = events.get_subscriber_index(config.registry)
+        assert index.has_subscribers(events.BeforeCreate, A)
+        assert index.has_subscribers(events.BeforeCreate, B)
+        assert not index.has_subscribers(events.BeforeCreate, C)
+        assert not index.has_subscribers(events.BeforeUpdate, A)
+
+    def test_base_event_subscribers(self):
+        class A(object):
+            pass
+
+        config = self._make_config()
+        config.subscribe_to_events(lambda e: None, [events.BeforeEvent])
+        config.commit()
+        index = events.get_subscriber_index(config.registry)
+        assert index.has_subscribers(events.BeforeCreate, A)
+        assert not index.has_subscribers(events.AfterCreate, A)
+
+    def test_unindexed_subscribers(self):
+        class A(object):
+            pass
+
+        config = self._make_config()
+        config.subscribe_to_events(
+            lambda e: None, [events.BeforeCreate], model=A)
+        config.add_subscriber(lambda e: None, events.BeforeCreate)
+        config.commit()
+        index = events.get_subscriber_index(config.registry)
+        assert index.has_subscribers(events.BeforeCreate, object)
@@ -0,0 +1,140 @@
+import os
+import json
+
+from mock import Mock, patch
+
+from nefertari.indexing_queue import IndexingQueue
+
+
+def _action(_id, op='index', **source):
+    return {
+        '_op_type': op, '_index': 'foondex', '_type': 'Foo',
+        '_id': _id, '_source': source,
+    }
+
+
+class TestIndexingQueue(object):
+
+    def test_put_coalesces_actions(self):
+        queue = IndexingQueue(Mock())
+        queue.put([_action(1, name='a'), _action(2)])
+        queue.put([_action(1, name='b'), _action(2, op='delete')])
+        assert len(queue) == 2
+        queue.flush()
+        actions = queue.operation.call_args[0][0]
+        assert sorted(actions, key=lambda a: a['_id']) == [
+            _action(1, name='b'), _action(2, op='delete')]
+        assert len(queue) == 0
+
+    def test_put_wakes_up_on_flush_size(self):
+        queue = IndexingQueue(Mock(), flush_size=2)
+        queue.put([_action(1)])
+        assert not queue._wakeup.is_set()
+        queue.put([_action(2)])
+        assert queue._wakeup.is_set()
+
+    def test_flush_empty(self):
+        queue = IndexingQueue(Mock())
+        queue.flush()
+        assert not queue.operation.called
+
+    def test_flush_error_requeues_actions(self):
+        queue = IndexingQueue(Mock(side_effect=Exception('foo')))
+        queue.put([_action(1, name='a')])
+        queue.flush()
+        assert len(queue) == 1
+        queue.operation.side_effect = None
+        queue.flush()
+        queue.operation.assert_called_with([_action(1, name='a')])
+        assert len(queue) == 0
+
+    def test_journal(self, tmpdir):
+        journal = str(tmpdir.join('journal'))
+        queue = IndexingQueue(Mock(), journal_path=journal)
+        queue.put([_action(1), _action(2)])
+        journal_file = '{}.{}'.format(journal, os.getpid())
+        with open(journal_file) as f:
+            assert len(f.readlines()) == 2
+
+        queue.flush()
+        with open(journal_file) as f:
+            assert f.read() == ''
+
+    def test_journal_keeps_pending_actions(self, tmpdir):
+        journal = str(tmpdir.join('journal'))
+        queue = IndexingQueue(Mock(), journal_path=journal)
+        queue.put([_action(1)])
+        queue.operation.side_effect = lambda actions: queue.put(
+            [_action(2)])
+        queue.flush()
+        with open('{}.{}'.format(journal, os.getpid())) as f:
+            assert [json.loads(line)['_id'] for line in f] == [2]
+
+    @patch('nefertari.indexing_queue.pid_exists')
+    @patch('nefertari.indexing_queue.os.getpid')
+    def test_journal_multiple_queues(self, mock_pid, mock_exists, tmpdir):
+        journal = str(tmpdir.join('journal'))
+        first = IndexingQueue(Mock(), journal_path=journal)
+        second = IndexingQueue(Mock(), journal_path=journal)
+        mock_pid.return_value = 1
+        first.put([_action(1)])
+        mock_pid.return_value = 2
+        second.put([_action(2)])
+        assert sorted(os.listdir(str(tmpdir))) == ['journal.1', 'journal.2']
+
+        # Process 1 died, processes 2 and 3 are running
+        mock_exists.side_effect = lambda pid: pid in (2, 3)
+        mock_pid.return_value = 3
+        restored = IndexingQueue(Mock(), journal_path=journal)
+        restored._replay_journal()
+        assert list(restored._pending.values()) == [_action(1)]
+        assert sorted(os.listdir(str(tmpdir))) == ['journal.2', 'journal.3']
+
+        mock_pid.return_value = 4
+        other = IndexingQueue(Mock(), journal_path=journal)
+        other._replay_journal()
+        assert len(other) == 0
+
+    def test_journal_replays_unsuffixed_journal(self, tmpdir):
+        journal = tmpdir.join('journal')
+        journal.write(json.dumps(_action(1)) + '\n')
+        queue = IndexingQueue(Mock(), journal_path=str(journal))
+        queue._replay_journal()
+        assert len(queue) == 1
+        assert os.listdir(str(tmpdir)) == [
+            'journal.{}'.format(os.getpid())]
+
+    def test_start_stop(self, tmpdir):
+        queue = IndexingQueue(Mock(), flush_interval=10)
+        queue.start()
+        queue.put([_action(1)])
+        queue.stop()
+        queue.operation.assert_called_once_with([_action(1)])
+
+    def test_put_starts_thread(self):
+        queue = IndexingQueue(Mock(), flush_interval=10)
+        assert queue._thread is None
+        queue.put([_action(1)])
+        assert queue._thread.is_alive()
+        assert queue._pid == os.getpid()
+        thread = queue._thread
+        queue.put([_action(2)])
+        assert queue._thread is thread
+        queue.stop()
+        assert queue.operation.call_count == 1
+
+    def test_start_after_fork(self):
+        queue = IndexingQueue(Mock(), flush_interval=10)
+        queue.put([_action(1)])
+        parent_thread = queue._thread
+        parent_lock = queue._lock
+        with patch('nefertari.indexing_queue.os.getpid') as mock_pid:
+            mock_pid.return_value = os.getpid() + 1
+            queue.put([_action(2)])
+            assert queue._thread is not parent_thread
+            assert queue._thread.is_alive()
+            assert queue._lock is not parent_lock
+            # Actions queued by parent are left to parent
+            assert list(queue._pending.values()) == [_action(2)]
+            queue.stop()
+            queue.operation.assert_called_once_with([_action(2)])
@@ -0,0 +1,212 @@
+import os
+import json
+
+import pytest
+from mock import Mock, patch
+
+from nefertari import metrics
+
+
+@pytest.fixture
+def registry():
+    registry = metrics.MetricsRegistry()
+    registry.enabled = True
+    return registry
+
+
+class TestMetricsRegistry(object):
+
+    def test_disabled(self):
+        registry = metrics.MetricsRegistry()
+        registry.inc('es_bulk_requests_total')
+        registry.observe('es_bulk_actions', 3)
+        assert registry.snapshot() == {}
+
+    def test_inc(self, registry):
+        registry.inc('events_triggered_total', event='BeforeCreate')
+        registry.inc('events_triggered_total', 2, event='BeforeCreate')
+        registry.inc('events_triggered_total', event='AfterCreate')
+        assert registry.snapshot() == {'events_triggered_total': {
+            '[["event", "BeforeCreate"]]': 3,
+            '[["event", "AfterCreate"]]': 1,
+        }}
+
+    def test_set(self, registry):
+        registry.set('deferred_queue_depth', 3)
+        registry.set('deferred_queue_depth', 1)
+        assert registry.snapshot() == {'deferred_queue_depth': {'[]': 1}}
+        assert registry.render().splitlines()[1:] == [
+            '# TYPE nefertari_deferred_queue_depth gauge',
+            'nefertari_deferred_queue_depth 1',
+        ]
+
+    def test_observe(self, registry):
+        registry.observe('event_subscribers', 0)
+        registry.observe('event_subscribers', 3)
+        registry.observe('event_subscribers', 100)
+        value = registry.snapshot()['event_subscribers']['[]']
+        assert value == {'counts': [1, 0, 0, 1, 0, 0, 0, 1], 'sum': 103}
+
+    def test_render(self, registry):
+        registry.inc('es_bulk_requests_total')
+        registry.observe('event_subscribers', 1, event='Before"')
+        rendered = registry.render().splitlines()
+        assert rendered[:3] == [
+            '# HELP nefertari_es_bulk_requests_total '
+            'Elasticsearch bulk requests.',
+            '# TYPE nefertari_es_bulk_requests_total counter',
+            'nefertari_es_bulk_requests_total 1',
+        ]
+        assert '# TYPE nefertari_event_subscribers histogram' in rendered
+        assert ('nefertari_event_subscribers_bucket'
+                '{event="Before\\"",le="0"} 0') in rendered
+        assert ('nefertari_event_subscribers_bucket'
+                '{event="Before\\"",le="1"} 1') in rendered
+        assert ('nefertari_event_subscribers_bucket'
+                '{event="Before\\"",le="+Inf"} 1') in rendered
+        assert 'nefertari_event_subscribers_sum{event="Before\\""} 1' in (
+            rendered)
+        assert ('nefertari_event_subscribers_count{event="Before\\""} 1'
+                in rendered)
+
+    def test_collectors(self, registry):
+        def collector():
+            registry.set('deferred_queue_depth', 2)
+        failing = Mock(side_effect=ValueError)
+        registry.add_collector(failing)
+        registry.add_collector(collector)
+        registry.add_collector(collector)
+        assert len(registry._collectors) == 2
+        assert 'nefertari_deferred_queue_depth 2' in (
+            registry.render().splitlines())
+        failing.assert_called_once_with()
+
+    def test_multiprocess(self, registry, tmpdir):
+        registry.multiprocess_dir = str(tmpdir)
+        registry.inc('es_bulk_requests_total')
+        assert os.listdir(str(tmpdir)) == [
+            'nefertari_metrics_{}.json'.format(os.getpid())]
+        other = tmpdir.join('nefertari_metrics_1.json')
+        other.write(json.dumps({
+            'es_bulk_requests_total': {'[]': 2},
+            'es_bulk_actions': {'[]': {'counts': [1] * 10, 'sum': 5}},
+        }))
+        tmpdir.join('nefertari_metrics_2.json').write('invalid')
+        registry.observe('es_bulk_actions', 1)
+        collected = registry.collect()
+        assert collected['es_bulk_requests_total'] == {'[]': 3}
+        assert collected['es_bulk_actions'] == {
+            '[]': {'counts': [2] + [1] * 9, 'sum': 6}}
+
+    @patch('nefertari.metrics.pid_exists')
+    def test_collect_skips_gauges_of_dead_processes(
+            self, mock_exists, registry, tmpdir):
+        mock_exists.side_effect = lambda pid: pid == 1
+        registry.multiprocess_dir = str(tmpdir)
+        dump = json.dumps({
+            'es_bulk_requests_total': {'[]': 2},
+            'deferred_queue_depth': {'[]': 3},
+        })
+        tmpdir.join('nefertari_metrics_1.json').write(dump)
+        tmpdir.join('nefertari_metrics_2.json').write(dump)
+        collected = registry.collect()
+        assert collected['es_bulk_requests_total'] == {'[]': 4}
+        assert collected['deferred_queue_depth'] == {'[]': 3}
+
+    def test_dump_error(self, registry, tmpdir):
+        registry.multiprocess_dir = str(tmpdir.join('missing'))
+        with patch('nefertari.metrics.log') as mock_log:
+            registry.inc('es_bulk_requests_total')
+        assert mock_log.error.called
+        assert registry.snapshot() == {'es_bulk_requests_total': {'[]': 1}}
+
+    def test_dump_concurrent(self, registry, tmpdir):
+        import threading
+        registry.multiprocess_dir = str(tmpdir)
+        registry.flush_interval = 0
+
+        def record():
+            for _ in range(50):
+                registry.inc('es_bulk_requests_total')
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        registry.dump()
+        assert os.listdir(str(tmpdir)) == [
+            'nefertari_metrics_{}.json'.format(os.getpid())]
+        path = tmpdir.join('nefertari_metrics_{}.json'.format(os.getpid()))
+        assert json.loads(path.read()) == {
+            'es_bulk_requests_total': {'[]': 400}}
+
+    def test_maybe_flush_skipped_while_flushing(self, registry, tmpdir):
+        registry.multiprocess_dir = str(tmpdir)
+        registry._flush_lock.acquire()
+        try:
+            registry.inc('es_bulk_requests_total')
+        finally:
+            registry._flush_lock.release()
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_dump_throttled(self, registry, tmpdir):
+        registry.multiprocess_dir = str(tmpdir)
+        registry.flush_interval = 100
+        registry.inc('es_bulk_requests_total')
+        registry.inc('es_bulk_requests_total')
+        path = tmpdir.join('nefertari_metrics_{}.json'.format(os.getpid()))
+        assert json.loads(path.read()) == {
+            'es_bulk_requests_total': {'[]': 1}}
+        registry.dump()
+        assert json.loads(path.read()) == {
+            'es_bulk_requests_total': {'[]': 2}}
+
+
+@patch('nefertari.metrics.registry')
+class TestHelpers(object):
+
+    def test_timer(self, mock_registry):
+        mock_registry.enabled = True
+        with metrics.timer('es_bulk_duration_seconds', foo=1):
+            pass
+        name, duration = mock_registry.observe.call_args[0]
+        assert name == 'es_bulk_duration_seconds'
+        assert duration >= 0
+        assert mock_registry.observe.call_args[1] == {'foo': 1}
+
+    def test_timer_disabled(self, mock_registry):
+        mock_registry.enabled = False
+        with metrics.timer('es_bulk_duration_seconds'):
+            pass
+        assert not mock_registry.observe.called
+
+    def test_timed(self, mock_registry):
+        mock_registry.enabled = True
+
+        @metrics.timed('es_query_duration_seconds', method='foo')
+        def foo(a):
+            return a
+        assert foo(1) == 1
+        assert mock_registry.observe.call_args[1] == {'method': 'foo'}
+
+    def test_metrics_view(self, mock_registry):
+        mock_registry.render.return_value = 'foo 1\n'
+        response = metrics.metrics_view(Mock())
+        assert response.text == 'foo 1\n'
+        assert response.content_type == 'text/plain'
+
+
+@patch('nefertari.metrics.registry')
+def test_includeme(mock_registry):
+    config = Mock()
+    config.registry.settings = {
+        'metrics.enabled': 'true',
+        'metrics.route': '/_metrics',
+    }
+    metrics.includeme(config)
+    assert mock_registry.enabled
+    assert mock_registry.multiprocess_dir is None
+    config.add_route.assert_called_once_with('nef_metrics', '/_metrics')
+    config.add_view.assert_called_once_with(
+        metrics.metrics_view, route_name='nef_metrics',
+        request_method='GET')
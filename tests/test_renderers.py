@@ -89,8 +89,9 @@ class TestRenderers(unittest.TestCase):
             self._get_dummy_result(),
             {'request': request, 'context': 1, 'view': view})
 
+    @mock.patch('nefertari.renderers.get_triggered_event_cls')
     @mock.patch('nefertari.renderers.trigger_after_events')
-    def test_JsonRendererFactory_trigger_events(self, mock_trigger):
+    def test_JsonRendererFactory_trigger_events(self, mock_trigger, mock_cls):
         request = mock.MagicMock()
         request.response.default_content_type = 'text/html'
         request.response.content_type = 'text/html'
@@ -111,6 +112,47 @@ class TestRenderers(unittest.TestCase):
         mock_trigger.assert_called_once_with(view())
         assert result == mock_trigger().response
 
+    @mock.patch('nefertari.renderers.get_triggered_event_cls')
+    @mock.patch('nefertari.renderers.trigger_after_events')
+    def test_JsonRendererFactory_trigger_events_view_reused(
+            self, mock_trigger, mock_cls):
+        class View(object):
+            def __init__(self, context, request):
+                raise Exception('View must not be instantiated')
+
+        view_obj = View.__new__(View)
+        request = mock.MagicMock(view_obj=view_obj)
+        factory = renderers.JsonRendererFactory({
+            'name': 'json',
+            'package': None,
+            'registry': None
+        })
+        result = factory._trigger_events(
+            {'foo': 1}, {'request': request, 'view': View, 'context': 1})
+        mock_trigger.assert_called_once_with(view_obj)
+        assert view_obj._response == {'foo': 1}
+        assert result == mock_trigger().response
+
+    @mock.patch('nefertari.renderers.get_triggered_event_cls')
+    @mock.patch('nefertari.renderers.trigger_after_events')
+    def test_JsonRendererFactory_trigger_events_no_subscribers(
+            self, mock_trigger, mock_cls):
+        mock_cls.return_value = None
+        request = mock.MagicMock()
+        view = mock.Mock()
+        factory = renderers.JsonRendererFactory({
+            'name': 'json',
+            'package': None,
+            'registry': None
+        })
+        result = factory._trigger_events(
+            {'foo': 1}, {'request': request, 'view': view, 'context': 1})
+        assert result == {'foo': 1}
+        mock_cls.assert_called_once_with(
+            view, request, renderers.AFTER_EVENTS)
+        assert not view.called
+        assert not mock_trigger.called
+
     @mock.patch('nefertari.renderers.wrappers')
     def test_JsonRendererFactory_run_after_calls(self, mock_wrap):
         factory = renderers.JsonRendererFactory({
@@ -127,6 +169,192 @@ class TestRenderers(unittest.TestCase):
         mock_wrap.wrap_in_dict.assert_called_once_with(request)
         mock_wrap.wrap_in_dict().assert_called_once_with(result=1)
 
+    def test_JsonRendererFactory_json_backend_setting(self):
+        info = mock.Mock(settings={'nefertari.json_backend': 'json'})
+        with mock.patch.object(renderers, 'get_json_backend') as mock_get:
+            factory = renderers.JsonRendererFactory(info)
+        mock_get.assert_called_once_with('json')
+        assert factory.json_dumps == mock_get()
+
+    def _streaming_factory(self):
+        info = mock.Mock(settings={'nefertari.stream_responses': 'true'})
+        return renderers.JsonRendererFactory(info)
+
+    def test_JsonRendererFactory_stream_response(self):
+        from pyramid.response import Response
+        factory = self._streaming_factory()
+        request = mock.Mock(action='index', response=Response())
+        view = mock.Mock(_json_encoder=None)
+        value = {
+            'data': [{'id': n, 'date': self.today} for n in range(250)],
+            'count': 250,
+            'total': 1000,
+        }
+        result = factory._render_response(
+            value, {'request': request, 'view': view})
+        assert result is None
+        assert request.response.content_length is None
+        chunks = list(request.response.app_iter)
+        assert len(chunks) == 5
+        body = json.loads(b''.join(chunks).decode('utf-8'))
+        assert body['count'] == 250
+        assert body['total'] == 1000
+        assert [d['id'] for d in body['data']] == list(range(250))
+        assert body['data'][0]['date'] == self.today.strftime(
+            '%Y-%m-%dT%H:%M:%SZ')
+
+    def test_JsonRendererFactory_stream_response_empty(self):
+        factory = self._streaming_factory()
+        chunks = factory._iter_response({'data': []}, renderers._JSONEncoder)
+        assert json.loads(b''.join(chunks).decode('utf-8')) == {'data': []}
+
+    def test_JsonRendererFactory_not_streamed(self):
+        factory = self._streaming_factory()
+        view = mock.Mock(_json_encoder=None)
+        request = mock.Mock(action='show')
+        result = factory._render_response(
+            {'data': [1]}, {'request': request, 'view': view})
+        assert json.loads(result) == {'data': [1]}
+        request = mock.Mock(action='index')
+        result = factory._render_response(
+            {'foo': 1}, {'request': request, 'view': view})
+        assert json.loads(result) == {'foo': 1}
+
+    def _etag_call(self, value, action='show', if_none_match=None,
+                   backend='json'):
+        from pyramid.request import Request
+        from pyramid.response import Response
+        factory = renderers.JsonRendererFactory(mock.Mock(settings={
+            'nefertari.etags': 'true', 'nefertari.json_backend': backend}))
+        headers = {}
+        if if_none_match:
+            headers['If-None-Match'] = if_none_match
+        request = Request.blank('/', headers=headers)
+        request.action = action
+        request.user = None
+        request.response = Response()
+        view = mock.Mock(_json_encoder=None)
+        with mock.patch.object(factory, '_trigger_events') as mock_trigger:
+            mock_trigger.side_effect = lambda x, y: x
+            with mock.patch.object(factory, 'run_after_calls') as mock_run:
+                mock_run.side_effect = lambda x, y: x
+                body = factory(
+                    value, {'request': request, 'view': view, 'context': 1})
+        return body, request.response
+
+    def test_JsonRendererFactory_etag_body_hash(self):
+        value = {'_type': 'Story', '_pk': '1', '_version': 3, 'name': 'foo'}
+        body, response = self._etag_call(value)
+        assert json.loads(body) == value
+        etag = response.headers['ETag']
+        assert not etag.startswith('W/')
+
+        body, response = self._etag_call(value, if_none_match=etag)
+        assert body is None
+        assert response.status_int == 304
+        assert response.body == b''
+
+        # Fields changed by after events or hidden by wrappers change
+        # ETag even if document version is the same
+        value['name'] = 'bar'
+        body, response = self._etag_call(value, if_none_match=etag)
+        assert response.status_int == 200
+        assert response.headers['ETag'] != etag
+        del value['name']
+        body, response = self._etag_call(value, if_none_match=etag)
+        assert response.status_int == 200
+
+    def test_JsonRendererFactory_etag_volatile_meta(self):
+        value = {'data': [{'_type': 'Story', '_pk': '1'}], 'took': 1}
+        body, response = self._etag_call(value, action='index')
+        assert json.loads(body) == value
+        etag = response.headers['ETag']
+
+        value['took'] = 5
+        body, response = self._etag_call(
+            value, action='index', if_none_match=etag)
+        assert response.status_int == 304
+        assert body is None
+
+        value['data'][0]['name'] = 'foo'
+        body, response = self._etag_call(
+            value, action='index', if_none_match=etag)
+        assert response.status_int == 200
+        assert json.loads(body) == value
+
+    def test_JsonRendererFactory_etag_volatile_meta_backends(self):
+        for backend in sorted(renderers.JSON_BACKENDS):
+            value = {'data': [{'_type': 'Story', '_pk': '1'}], 'took': 1}
+            body, response = self._etag_call(
+                value, action='index', backend=backend)
+            assert json.loads(body) == value
+            value['took'] = 2
+            body, response = self._etag_call(
+                value, action='index', backend=backend,
+                if_none_match=response.headers['ETag'])
+            assert response.status_int == 304
+
+    def test_JsonRendererFactory_etag_volatile_meta_only(self):
+        body, response = self._etag_call({'took': 1})
+        assert json.loads(body) == {'took': 1}
+        assert 'ETag' in response.headers
+
+    def test_JsonRendererFactory_etag_streamed(self):
+        value = {'data': [{'_type': 'Story', '_pk': '1'}], 'total': 1}
+        factory = renderers.JsonRendererFactory(mock.Mock(settings={
+            'nefertari.etags': 'true',
+            'nefertari.stream_responses': 'true'}))
+        request = mock.Mock(action='index')
+        request.response.headers = {}
+        system = {'request': request, 'view': mock.Mock(_json_encoder=None)}
+        with mock.patch.object(factory, '_not_modified') as mock_not_mod:
+            assert factory._render(value, system) is None
+        assert not mock_not_mod.called
+
+    def test_JsonRendererFactory_etag_other_actions(self):
+        value = {'_type': 'Story', '_pk': '1', '_version': 3}
+        _, response = self._etag_call(value, action='create')
+        assert 'ETag' not in response.headers
+
+    def test_JsonRendererFactory_etag_disabled(self):
+        factory = renderers.JsonRendererFactory(mock.Mock(settings={}))
+        assert not factory._etags_enabled(
+            {'request': mock.Mock(action='show')})
+
+    def test_get_json_backend_stdlib(self):
+        dumps = renderers.get_json_backend('json')
+        result = json.loads(dumps(
+            self._get_dummy_result(), renderers._JSONEncoder))
+        self.assertDictEqual(self._get_dummy_expected(), result)
+
+    def test_get_json_backend_native(self):
+        for name in ('orjson', 'ujson', 'rapidjson'):
+            try:
+                __import__(name)
+            except ImportError:
+                continue
+            dumps = renderers.get_json_backend(name)
+            data = self._get_dummy_result()
+            data['datetime'] = self.now
+            result = json.loads(dumps(data, renderers._JSONEncoder))
+            expected = self._get_dummy_expected()
+            if name == 'ujson':
+                # ujson serializes Decimal natively
+                expected['price'] = 102.3
+            self.assertDictEqual(expected, result)
+
+    def test_get_json_backend_unknown(self):
+        with self.assertRaises(ValueError):
+            renderers.get_json_backend('foo')
+
+    def test_get_json_backend_not_installed(self):
+        def backend():
+            raise ImportError('No module named foo')
+        backends = {'foo': backend}
+        with mock.patch.dict(renderers.JSON_BACKENDS, backends):
+            dumps = renderers.get_json_backend('foo')
+        assert dumps({'a': 1}, renderers._JSONEncoder) == '{"a": 1}'
+
     def test_NefertariJsonRendererFactory_run_after_calls(self):
         factory = renderers.NefertariJsonRendererFactory(None)
         filters = {
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from mock import Mock, patch
+
+from nefertari.scripts import es
+
+
+@pytest.fixture
+def command(tmpdir):
+    command = es.ESCommand.__new__(es.ESCommand)
+    command.log = Mock()
+    command.options = Mock(
+        chunk=2, index=None, checkpoint=str(tmpdir.join('checkpoint.json')))
+    return command
+
+
+def _model(documents):
+    """ Mock model which pages :documents: by `_start` and `_limit`. """
+    def get_collection(**params):
+        start = params['_start']
+        return documents[start:start + params['_limit']]
+    model = Mock()
+    model.pk_field.return_value = 'id'
+    model.get_collection.side_effect = get_collection
+    return model
+
+
+@patch('nefertari.scripts.es.to_dicts', lambda docs: docs)
+@patch('nefertari.scripts.es.ES')
+@patch('nefertari.scripts.es.engine')
+class TestStreamModels(object):
+
+    def test_stream_models_chunks(self, mock_engine, mock_es, command):
+        model = _model([{'id': 1}, {'id': 2}, {'id': 5}])
+        mock_engine.get_document_cls.return_value = model
+        command.stream_models(['Story'], {'foo': 'bar'})
+        calls = [c[1] for c in model.get_collection.call_args_list]
+        assert calls == [
+            {'foo': 'bar', '_sort': 'id', '_limit': 2, '_start': 0},
+            {'foo': 'bar', '_sort': 'id', '_limit': 2, '_start': 2},
+        ]
+        mock_es().index_missing_documents.assert_any_call(
+            [{'id': 1}, {'id': 2}])
+        mock_es().index_missing_documents.assert_any_call([{'id': 5}])
+        with open(command.options.checkpoint) as f:
+            assert json.load(f) == {'Story': 3}
+
+    def test_stream_models_empty_last_page(
+            self, mock_engine, mock_es, command):
+        model = _model([{'id': 1}, {'id': 2}])
+        mock_engine.get_document_cls.return_value = model
+        command.stream_models(['Story'], {})
+        assert model.get_collection.call_count == 2
+        mock_es().index_missing_documents.assert_called_once_with(
+            [{'id': 1}, {'id': 2}])
+
+    def test_stream_models_resume(self, mock_engine, mock_es, command):
+        with open(command.options.checkpoint, 'w') as f:
+            json.dump({'Story': 2}, f)
+        model = _model([{'id': 1}, {'id': 2}, {'id': 3}])
+        mock_engine.get_document_cls.return_value = model
+        command.stream_models(['Story'], {})
+        model.get_collection.assert_called_once_with(
+            _sort='id', _limit=2, _start=2)
+        mock_es().index_missing_documents.assert_called_once_with(
+            [{'id': 3}])
+        with open(command.options.checkpoint) as f:
+            assert json.load(f) == {'Story': 3}
+
+    def test_stream_models_no_checkpoint(
+            self, mock_engine, mock_es, command):
+        command.options.checkpoint = None
+        model = _model([{'id': 1}])
+        mock_engine.get_document_cls.return_value = model
+        command.stream_models(['Story'], {})
+        mock_es().index_missing_documents.assert_called_once_with(
+            [{'id': 1}])
+
+    def test_stream_models_fields_without_pk(
+            self, mock_engine, mock_es, command):
+        model = _model([{'name': 'a'}, {'name': 'b'}, {'name': 'c'}])
+        mock_engine.get_document_cls.return_value = model
+        command.stream_models(['Story'], {'_fields': 'name'})
+        assert model.get_collection.call_count == 2
+        with open(command.options.checkpoint) as f:
+            assert json.load(f) == {'Story': 3}
@@ -0,0 +1,131 @@
+import pytest
+from mock import Mock, patch
+
+from nefertari import search_cache
+from nefertari.utils import dictset
+
+
+class TestMemoryCacheBackend(object):
+
+    def test_get_set(self):
+        backend = search_cache.MemoryCacheBackend(max_size=1, ttl=10)
+        backend.set('foo', '1')
+        assert backend.get('foo') == '1'
+        backend.set('bar', '2')
+        assert backend.get('foo') is None
+        assert backend.get('bar') == '2'
+
+    def test_generations(self):
+        backend = search_cache.MemoryCacheBackend()
+        assert backend.get_generation('foo') == 0
+        backend.incr_generation('foo')
+        backend.incr_generation('foo')
+        assert backend.get_generation('foo') == 2
+        assert backend.get_generation('bar') == 0
+        assert backend.get_invalidated_at('foo') is not None
+        assert backend.get_invalidated_at('bar') is None
+
+
+class TestRedisCacheBackend(object):
+
+    def _backend(self, **kwargs):
+        redis = Mock()
+        with patch.dict('sys.modules', redis=redis):
+            backend = search_cache.RedisCacheBackend(
+                url='redis://foo:1/2', **kwargs)
+        redis.StrictRedis.from_url.assert_called_once_with(
+            'redis://foo:1/2')
+        return backend
+
+    def test_get_set(self):
+        backend = self._backend(ttl=5)
+        backend.client.get.return_value = b'1'
+        assert backend.get('foo') == '1'
+        backend.client.get.assert_called_once_with('nefertari:foo')
+        backend.set('foo', '1')
+        backend.client.setex.assert_called_once_with('nefertari:foo', 5, '1')
+
+    def test_set_no_ttl(self):
+        backend = self._backend(ttl=0)
+        backend.set('foo', '1')
+        assert not backend.client.setex.called
+
+    def test_generations(self):
+        backend = self._backend()
+        backend.client.get.return_value = None
+        assert backend.get_generation('foo') == 0
+        backend.client.get.assert_called_once_with('nefertari:gen:foo')
+        backend.incr_generation('foo')
+        backend.client.incr.assert_called_once_with('nefertari:gen:foo')
+        assert backend.client.set.call_args[0][0] == 'nefertari:inv:foo'
+
+    def test_get_invalidated_at(self):
+        backend = self._backend()
+        backend.client.get.return_value = b'12.5'
+        assert backend.get_invalidated_at('foo') == 12.5
+        backend.client.get.assert_called_once_with('nefertari:inv:foo')
+        backend.client.get.return_value = None
+        assert backend.get_invalidated_at('foo') is None
+
+
+class TestSearchCache(object):
+
+    def test_make_key_canonical(self):
+        cache = search_cache.SearchCache(search_cache.MemoryCacheBackend())
+        key1 = cache.make_key('foondex', 'Foo', {'a': 1, 'b': 2}, 'admin')
+        key2 = cache.make_key('foondex', 'Foo', {'b': 2, 'a': 1}, 'admin')
+        key3 = cache.make_key('foondex', 'Foo', {'b': 2, 'a': 1}, 'user')
+        assert key1 == key2
+        assert key1 != key3
+
+    def test_invalidate(self):
+        cache = search_cache.SearchCache(search_cache.MemoryCacheBackend())
+        foo_key = cache.make_key('foondex', 'Foo', {}, 'admin')
+        both_key = cache.make_key('foondex', 'Foo,Bar', {}, 'admin')
+        bar_key = cache.make_key('foondex', 'Bar', {}, 'admin')
+        cache.set(foo_key, {'foo': 1})
+        assert cache.get(foo_key) == {'foo': 1}
+
+        cache.invalidate('foondex', ['Foo'])
+        assert cache.make_key('foondex', 'Foo', {}, 'admin') != foo_key
+        assert cache.make_key('foondex', 'Foo,Bar', {}, 'admin') != both_key
+        assert cache.make_key('foondex', 'Bar', {}, 'admin') == bar_key
+
+    @patch('nefertari.search_cache.time')
+    def test_is_refreshed(self, mock_time):
+        cache = search_cache.SearchCache(
+            search_cache.MemoryCacheBackend(), refresh_interval=2)
+        mock_time.time.return_value = 10
+        assert cache.is_refreshed('foondex', 'Foo,Bar')
+        cache.invalidate('foondex', ['Foo'])
+        mock_time.time.return_value = 11
+        assert not cache.is_refreshed('foondex', 'Foo,Bar')
+        assert cache.is_refreshed('foondex', 'Bar')
+        mock_time.time.return_value = 12
+        assert cache.is_refreshed('foondex', 'Foo,Bar')
+
+    def test_get_returns_copies(self):
+        cache = search_cache.SearchCache(search_cache.MemoryCacheBackend())
+        cache.set('foo', {'foo': 1})
+        cache.get('foo')['foo'] = 2
+        assert cache.get('foo') == {'foo': 1}
+
+
+class TestGetCacheBackend(object):
+
+    def test_memory(self):
+        backend = search_cache.get_cache_backend('memory', dictset(
+            cache_size='10', cache_ttl='5'))
+        assert backend.cache.max_size == 10
+        assert backend.cache.ttl == 5
+
+    @patch('nefertari.search_cache.RedisCacheBackend.__init__')
+    def test_redis(self, mock_init):
+        mock_init.return_value = None
+        search_cache.get_cache_backend('redis', dictset(
+            cache_redis_url='redis://foo'))
+        mock_init.assert_called_once_with(url='redis://foo', ttl=60)
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            search_cache.get_cache_backend('foo', dictset())
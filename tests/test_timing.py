@@ -0,0 +1,55 @@
+from mock import patch
+
+from nefertari import timing
+
+
+class TestRequestTimer(object):
+
+    def test_add(self):
+        timer = timing.RequestTimer()
+        timer.add('es', 0.5)
+        timer.add('render', 0.25)
+        timer.add('es', 0.25)
+        assert timer.as_dict() == {'es': 750.0, 'render': 250.0}
+        assert list(timer.as_dict().keys()) == ['es', 'render']
+
+    def test_server_timing(self):
+        timer = timing.RequestTimer()
+        timer.add('es', 0.5)
+        timer.add('render', 0.0015)
+        assert timer.server_timing() == 'es;dur=500.0, render;dur=1.5'
+        assert timer.server_timing(1) == (
+            'es;dur=500.0, render;dur=1.5, total;dur=1000')
+
+
+class TestTimed(object):
+
+    def test_no_timer(self):
+        timing.stop_timer()
+        with timing.timed('es'):
+            pass
+        assert timing.get_timer() is None
+
+    @patch('nefertari.timing.time')
+    def test_timed(self, mock_time):
+        mock_time.time.side_effect = [0, 1, 3, 4, 4.5]
+        timer = timing.start_timer()
+        try:
+            with timing.timed('es'):
+                pass
+            with timing.timed('es'):
+                pass
+        finally:
+            timing.stop_timer()
+        assert timer.phases == {'es': 2.5}
+
+    def test_timed_exception(self):
+        timer = timing.start_timer()
+        try:
+            with timing.timed('action'):
+                raise ValueError()
+        except ValueError:
+            pass
+        finally:
+            timing.stop_timer()
+        assert 'action' in timer.phases
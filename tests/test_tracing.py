@@ -0,0 +1,75 @@
+import pytest
+from mock import Mock, patch
+
+from nefertari import tracing
+from nefertari.json_httpexceptions import JHTTPForbidden
+
+
+class TestESRequestTracer(object):
+
+    def test_record_fast_request(self):
+        tracer = tracing.ESRequestTracer(slow_threshold=1)
+        tracer.record('GET', '/foo', None, None, 0.5, 200)
+        assert tracer.get_slow_requests() == []
+
+    @patch('nefertari.tracing.time')
+    def test_record_slow_request(self, mock_time):
+        mock_time.time.return_value = 123
+        tracer = tracing.ESRequestTracer(slow_threshold=1)
+        tracer.record('GET', '/foo', {'a': 1}, '{"query": 1}', 2, 200)
+        assert tracer.get_slow_requests() == [{
+            'method': 'GET', 'url': '/foo', 'params': {'a': 1},
+            'status': 200, 'duration': 2, 'timestamp': 123,
+        }]
+
+    def test_record_buffer_size(self):
+        tracer = tracing.ESRequestTracer(slow_threshold=0, buffer_size=2)
+        for url in ('/a', '/b', '/c'):
+            tracer.record('GET', url, None, None, 1, 200)
+        assert [r['url'] for r in tracer.get_slow_requests()] == [
+            '/c', '/b']
+        tracer.clear()
+        assert tracer.get_slow_requests() == []
+
+    @patch('nefertari.tracing.random')
+    def test_record_body_sampled(self, mock_random):
+        tracer = tracing.ESRequestTracer(
+            slow_threshold=0, sample_rate=0.5, max_body_size=3)
+        mock_random.random.return_value = 0.1
+        tracer.record('GET', '/a', None, b'abcdef', 1, 200)
+        mock_random.random.return_value = 0.9
+        tracer.record('GET', '/b', None, b'abcdef', 1, 200)
+        second, first = tracer.get_slow_requests()
+        assert first['body'] == 'abc...TRUNCATED...'
+        assert 'body' not in second
+
+
+class TestSlowRequestsView(object):
+
+    @patch('nefertari.tracing.wrappers')
+    def test_not_admin(self, mock_wrappers):
+        mock_wrappers.get_user_role.return_value = 'authenticated'
+        with pytest.raises(JHTTPForbidden):
+            tracing.slow_requests_view(Mock())
+
+    @patch('nefertari.tracing.wrappers')
+    def test_admin(self, mock_wrappers):
+        from nefertari.elasticsearch import ES
+        mock_wrappers.get_user_role.return_value = 'admin'
+        tracer = tracing.ESRequestTracer(slow_threshold=0)
+        tracer.record('GET', '/a', None, None, 1, 200)
+        with patch.object(ES, 'tracer', tracer):
+            response = tracing.slow_requests_view(Mock())
+        assert response.content_type == 'application/json'
+        assert response.json_body['count'] == 1
+        assert response.json_body['slow_threshold'] == 0
+        assert response.json_body['data'][0]['url'] == '/a'
+
+    def test_includeme(self):
+        config = Mock()
+        tracing.includeme(config)
+        config.add_route.assert_called_once_with(
+            'nef_es_slow_requests', '/_es/slow_requests')
+        config.add_view.assert_called_once_with(
+            tracing.slow_requests_view, route_name='nef_es_slow_requests',
+            request_method='GET')
@@ -35,7 +35,8 @@ class TestTweens(object):
         timing = tweens.request_timing(handler, registry)
         timing(request)
         mock_log.debug.assert_called_once_with(
-            'GET (http://example.com) request took 1 seconds')
+            '%s (%s) request took %s seconds', 'GET', 'http://example.com',
+            1, extra={'timings': {}, 'duration': 1})
         assert not mock_log.warning.called
 
     @patch('nefertari.tweens.time')
@@ -49,9 +50,47 @@ class TestTweens(object):
         timing = tweens.request_timing(handler, registry)
         timing(request)
         mock_log.warning.assert_called_once_with(
-            'GET (http://example.com) request took 1 seconds')
+            '%s (%s) request took %s seconds', 'GET', 'http://example.com',
+            1, extra={'timings': {}, 'duration': 1})
         assert not mock_log.debug.called
 
+    @patch('nefertari.tweens.log')
+    def test_request_timing_phases(self, mock_log):
+        from nefertari.timing import timed, get_timer
+        request = Mock(method='GET', url='http://example.com')
+        response = Mock(headers={})
+        registry = Mock()
+        registry.settings = {
+            'request_timing.server_timing': 'true',
+        }
+
+        def handler(request):
+            with timed('es'):
+                pass
+            with timed('render'):
+                pass
+            return response
+
+        timing = tweens.request_timing(handler, registry)
+        assert timing(request) is response
+        assert get_timer() is None
+        extra = mock_log.debug.call_args[1]['extra']
+        assert list(extra['timings'].keys()) == ['es', 'render']
+        header = response.headers['Server-Timing']
+        assert header.startswith('es;dur=')
+        assert ', render;dur=' in header
+        assert ', total;dur=' in header
+
+    @patch('nefertari.tweens.log')
+    def test_request_timing_no_server_timing(self, mock_log):
+        request = Mock(method='GET', url='http://example.com')
+        response = Mock(headers={})
+        registry = Mock(spec=['settings'])
+        registry.settings = {}
+        timing = tweens.request_timing(lambda r: response, registry)
+        timing(request)
+        assert 'Server-Timing' not in response.headers
+
     def test_get_tunneling(self):
         class GET(dict):
             def mixed(self):
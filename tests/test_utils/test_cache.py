@@ -0,0 +1,52 @@
+from mock import patch
+
+from nefertari.utils.cache import TTLCache
+
+
+class TestTTLCache(object):
+
+    def test_get_set(self):
+        cache = TTLCache(ttl=10)
+        assert cache.get('foo') is None
+        assert cache.get('foo', 1) == 1
+        cache.set('foo', 'bar')
+        assert cache.get('foo') == 'bar'
+        assert len(cache) == 1
+
+    def test_disabled(self):
+        cache = TTLCache(ttl=0)
+        cache.set('foo', 'bar')
+        assert cache.get('foo') is None
+        assert len(cache) == 0
+
+    @patch('nefertari.utils.cache.time.time')
+    def test_expired(self, mock_time):
+        mock_time.return_value = 100
+        cache = TTLCache(ttl=10)
+        cache.set('foo', 'bar')
+        mock_time.return_value = 109
+        assert cache.get('foo') == 'bar'
+        mock_time.return_value = 111
+        assert cache.get('foo') is None
+        assert len(cache) == 0
+
+    def test_max_size(self):
+        cache = TTLCache(max_size=2, ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_delete_clear(self):
+        cache = TTLCache(ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.delete('a')
+        cache.delete('zoo')
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+        cache.clear()
+        assert len(cache) == 0
@@ -1,3 +1,4 @@
+import pytest
 from mock import Mock
 
 from nefertari.utils import data as dutils
@@ -64,6 +65,24 @@ class TestDataUtils(object):
         assert isinstance(obj.foo[0], dutils.DataProxy)
         assert obj.foo[0].baz == 1
 
+    def test_dict2obj_proxy_cls_cached(self):
+        obj1 = dutils.dict2obj({'_type': 'Foo', 'foo': 1})
+        obj2 = dutils.dict2obj({'_type': 'Foo', 'foo': 2})
+        assert type(obj1) is type(obj2)
+        assert type(obj1).__name__ == 'Foo'
+        assert type(obj1) is not type(dutils.dict2obj({'_type': 'Bar'}))
+
+    def test_dict2obj_nested_converted_once(self):
+        obj = dutils.dict2obj({'_type': 'Foo', 'foo': {'baz': 1}})
+        assert 'foo' not in obj.__dict__
+        assert obj.foo is obj.foo
+
+    def test_dict2obj_missing_attr(self):
+        obj = dutils.dict2obj({'_type': 'Foo'})
+        with pytest.raises(AttributeError):
+            obj.foo
+        assert not hasattr(obj, 'pk_field')
+
     def test_to_objs(self):
         collection = dutils.to_objs([{'foo': 'bar', '_type': 'Foo'}])
         assert len(collection) == 1
@@ -141,5 +160,7 @@ class TestFieldData(object):
         assert isinstance(field, dutils.FieldData)
         assert field.name == 'username'
         assert field.new_value == 'admin'
+        assert not model.get_field_params.called
+        assert field.params == {'foo': 1}
         assert field.params == {'foo': 1}
         model.get_field_params.assert_called_once_with('username')
@@ -73,6 +73,7 @@ class TestViewMapper(object):
 
         assert request.filters == {'show': [bc2]}
         assert request.action == 'index'
+        assert isinstance(request.view_obj, MyView)
         assert result == ['thing']
 
         bc1.assert_called_with(request=request)
@@ -305,6 +306,7 @@ class TestBaseView(object):
 
     @patch('nefertari.elasticsearch.ES')
     def test_get_collection_es(self, mock_es):
+        mock_es.search_cache = None
         request = Mock(content_type='', method='', accept=[''])
         view = DummyBaseView(
             context={}, request=request,
@@ -317,6 +319,128 @@ class TestBaseView(object):
             foo='bar', q='movies')
         assert result == mock_es().get_collection()
 
+    @patch('nefertari.elasticsearch.ES')
+    def test_get_collection_es_passthrough(self, mock_es):
+        mock_es.settings = dictset(passthrough_source='true')
+        mock_es.search_cache = None
+        request = Mock(content_type='', method='', accept=[''])
+        view = DummyBaseView(
+            context={}, request=request,
+            _query_params={'foo': 'bar'})
+        view.Model = Mock(__name__='MyModel')
+        request.action = 'index'
+        view.get_collection_es()
+        mock_es().get_collection.assert_called_once_with(
+            foo='bar', _as_dicts=True)
+        assert '_as_dicts' not in view._query_params
+
+        request.action = 'delete_many'
+        mock_es().get_collection.reset_mock()
+        view.get_collection_es()
+        mock_es().get_collection.assert_called_once_with(foo='bar')
+
+    @patch('nefertari.elasticsearch.ES')
+    def test_get_collection_es_cache_role(self, mock_es):
+        mock_es.settings = dictset()
+        request = Mock(content_type='', method='', accept=[''], user=None)
+        view = DummyBaseView(
+            context={}, request=request,
+            _query_params={'foo': 'bar'})
+        view.Model = Mock(__name__='MyModel')
+        request.action = 'index'
+        view.get_collection_es()
+        mock_es().get_collection.assert_called_once_with(
+            foo='bar', _cache_role='anonymous')
+        assert '_cache_role' not in view._query_params
+
+        for action in ('update_many', 'delete_many'):
+            request.action = action
+            mock_es().get_collection.reset_mock()
+            view.get_collection_es()
+            mock_es().get_collection.assert_called_once_with(foo='bar')
+
+    @patch('nefertari.elasticsearch.ES')
+    def test_iter_collection_es(self, mock_es):
+        request = Mock(content_type='', method='', accept=[''])
+        view = DummyBaseView(
+            context={}, request=request,
+            _query_params={'foo': 'bar'})
+        view.Model = Mock(__name__='MyModel')
+        result = view.iter_collection_es()
+        mock_es.assert_called_once_with('MyModel')
+        mock_es().iter_collection.assert_called_once_with(foo='bar')
+        assert result == mock_es().iter_collection()
+        assert not mock_es().get_collection.called
+
+    def test_get_affected_objects(self):
+        request = Mock(content_type='', method='', accept=[''])
+        view = DummyBaseView(
+            context={}, request=request, _query_params={'foo': 'bar'})
+        view.Model = Mock()
+        view.Model.filter_objects.return_value = iter([1, 2])
+        view.iter_collection_es = Mock()
+        assert view.get_affected_objects() == [1, 2]
+        assert view.get_affected_objects() == [1, 2]
+        view.Model.filter_objects.assert_called_once_with(
+            view.iter_collection_es())
+
+    def test_update_affected_objects(self):
+        request = Mock(content_type='', method='', accept=[''])
+        view = DummyBaseView(
+            context={}, request=request, _query_params={'foo': 'bar'})
+        view.Model = Mock()
+        view._json_params = {'name': 'a'}
+        view._affected_objects = [1, 2]
+        result = view.update_affected_objects()
+        view.Model._update_many.assert_called_once_with(
+            [1, 2], {'name': 'a'}, request)
+        assert result == view.Model._update_many()
+
+    def test_update_affected_objects_items_params(self):
+        request = Mock(content_type='', method='', accept=[''])
+        view = DummyBaseView(
+            context={}, request=request, _query_params={'foo': 'bar'})
+        view.Model = Mock()
+        view.Model.pk_field.return_value = 'id'
+        view.Model._update_many.side_effect = lambda items, *a: len(items)
+        view._json_params = {'name': 'a'}
+        objects = [Mock(id=1), Mock(id=2), Mock(id=3)]
+        view._affected_objects = objects
+        view._items_json_params = {1: {'age': 1}, 3: {'age': 1}}
+        assert view.update_affected_objects() == 3
+        view.Model._update_many.assert_has_calls([
+            call([objects[0], objects[2]], {'name': 'a', 'age': 1}, request),
+            call([objects[1]], {'name': 'a'}, request),
+        ])
+
+    def test_delete_affected_objects(self):
+        request = Mock(content_type='', method='', accept=[''])
+        view = DummyBaseView(
+            context={}, request=request, _query_params={'foo': 'bar'})
+        view.Model = Mock()
+        view._affected_objects = [1]
+        result = view.delete_affected_objects()
+        view.Model._delete_many.assert_called_once_with([1], request)
+        assert result == view.Model._delete_many()
+
+    def test_get_cache_role(self):
+        request = Mock(content_type='', method='', accept=[''], user=None)
+        view = DummyBaseView(
+            context={}, request=request, _query_params={'foo': 'bar'})
+        assert view._get_cache_role() == 'anonymous'
+
+        class User(object):
+            admin = False
+
+            @classmethod
+            def is_admin(cls, user):
+                return user.admin
+
+        request.user = User()
+        assert view._get_cache_role() == 'authenticated'
+        request.user.admin = True
+        assert view._get_cache_role() == 'admin'
+
     @patch('nefertari.view.BaseView._run_init_actions')
     def test_fill_null_values(self, run):
         request = Mock(content_type='', method='', accept=[''])
@@ -654,6 +778,67 @@ class TestBaseView(object):
             view.id2obj(name='user', model=model)
         assert str(ex.value) == 'id2obj: Object 1 not found'
 
+    @patch('nefertari.view.BaseView._run_init_actions')
+    def test_id2obj_list_batched(self, run):
+        model = Mock()
+        model.pk_field.return_value = 'idname'
+        obj1, obj2 = Mock(idname=1), Mock(idname=2)
+        model.filter_objects.return_value = [obj2, obj1]
+        request = self.get_common_mock_request()
+        view = DummyBaseView(
+            context={}, request=request, _json_params={'foo': 'bar'},
+            _query_params={'foo1': 'bar1'})
+        view._json_params['users'] = ['1', None, '2']
+        view.id2obj(name='users', model=model)
+        assert view._json_params['users'] == [obj1, None, obj2]
+        queried = model.filter_objects.call_args[0][0]
+        assert [obj.idname for obj in queried] == ['1', '2']
+        assert not model.get_item.called
+
+    @patch('nefertari.view.BaseView._run_init_actions')
+    def test_id2obj_list_batched_not_found(self, run):
+        model = Mock()
+        model.pk_field.return_value = 'idname'
+        model.filter_objects.return_value = [Mock(idname=1)]
+        request = self.get_common_mock_request()
+        view = DummyBaseView(
+            context={}, request=request, _json_params={'foo': 'bar'},
+            _query_params={'foo1': 'bar1'})
+        view._json_params['users'] = ['1', '2']
+        with pytest.raises(JHTTPBadRequest) as ex:
+            view.id2obj(name='users', model=model)
+        assert str(ex.value) == 'id2obj: Object 2 not found'
+
+        view._json_params['users'] = ['1', '2']
+        view.id2obj(name='users', model=model, setdefault=123)
+        assert view._json_params['users'][1] == 123
+
+    @patch('nefertari.view.BaseView._run_init_actions')
+    def test_id2obj_list_not_batched(self, run):
+        request = self.get_common_mock_request()
+        view = DummyBaseView(
+            context={}, request=request, _json_params={'foo': 'bar'},
+            _query_params={'foo1': 'bar1'})
+
+        # Not a primary key
+        model = Mock()
+        model.pk_field.return_value = 'id'
+        model.get_item.side_effect = lambda **kw: kw['username']
+        view._json_params['users'] = ['a', 'b']
+        view.id2obj(name='users', model=model, pk_field='username')
+        assert view._json_params['users'] == ['a', 'b']
+        assert not model.filter_objects.called
+
+        # Engine does not support batched queries
+        model = Mock()
+        model.pk_field.return_value = 'id'
+        model.filter_objects.side_effect = NotImplementedError
+        model.get_item.side_effect = lambda **kw: kw['id']
+        view._json_params['users'] = ['1', '2']
+        view.id2obj(name='users', model=model)
+        assert view._json_params['users'] == ['1', '2']
+        assert model.get_item.call_count == 2
+
 
 class TestViewHelpers(object):
     def test_key_error_view(self):
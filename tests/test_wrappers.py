@@ -82,6 +82,11 @@ class TestWrappers(unittest.TestCase):
             [{'special': 'dict'}],
             wrappers.obj2dict(request=None)(result=result))
 
+    def test_obj2dict_list_of_dicts(self):
+        item = {'a': 1}
+        result = wrappers.obj2dict(request=None)(result=[item])
+        assert result[0] is item
+
     def test_obj2dict_other_type(self):
         self.assertEqual(
             'foo',
@@ -588,3 +593,47 @@ class TestApplyPrivacy(object):
             drop_hidden=False)
         assert list(sorted(filtered.keys())) == [
             '_pk', '_self', '_type', 'id', 'name']
+
+    @patch('nefertari.wrappers.engine')
+    def test_privacy_mask_cached(self, mock_eng):
+        document_cls = Mock(
+            _public_fields=['name', 'desc'],
+            _auth_fields=['id'],
+            _hidden_fields=[])
+        mock_eng.get_document_cls.return_value = document_cls
+        request = Mock(user=None)
+        wrappers.apply_privacy(request)(result=self.model_test_data)
+        document_cls._public_fields = ['name']
+        filtered = wrappers.apply_privacy(request)(result=self.model_test_data)
+        assert list(sorted(filtered.keys())) == [
+            '_pk', '_self', '_type', 'desc', 'name']
+
+
+class TestGetPrivacyMask(object):
+    def _model(self):
+        return Mock(
+            _public_fields=['name'],
+            _auth_fields=['id', 'name', 'password'],
+            _hidden_fields=['password'])
+
+    def test_public(self):
+        mask = wrappers.get_privacy_mask(self._model(), False, False, True)
+        assert mask == {'_type', '_pk', '_self', 'name'}
+
+    def test_public_not_drop_hidden(self):
+        mask = wrappers.get_privacy_mask(self._model(), False, False, False)
+        assert mask == {'_type', '_pk', '_self', 'name', 'password'}
+
+    def test_authenticated(self):
+        mask = wrappers.get_privacy_mask(self._model(), True, False, True)
+        assert mask == {'_type', '_pk', '_self', 'id', 'name'}
+
+    def test_admin(self):
+        model = self._model()
+        assert wrappers.get_privacy_mask(model, True, True, True) is None
+        assert wrappers.get_privacy_mask(model, True, True, False) is None
+
+    def test_cached(self):
+        model = self._model()
+        mask = wrappers.get_privacy_mask(model, True, False, True)
+        assert wrappers.get_privacy_mask(model, True, False, True) is mask